@@ -67,6 +67,7 @@ import machine
 import dht
 from machine import Pin
 from machine import ADC
+import ADCSAMPLER_AS as ADCSAMPLER
 from umqttsimple import MQTTClient
 
 # tuodaan parametrit tiedostosta parametrit.py
@@ -81,22 +82,15 @@ except ImportError:
 #  dht-kirjasto tukee muitakin antureita kuin dht22
 anturi = dht.DHT22(Pin(PINNI_NUMERO))
 client = MQTTClient(CLIENT_ID, MQTT_SERVERI, MQTT_PORTTI, MQTT_KAYTTAJA, MQTT_SALASANA)
-#  jännitteen mittaus
-akkujannite = ADC(Pin(AKKU_PINNI))
-# vaimennus 11 db
-akkujannite.atten(ADC.ATTN_11DB)
+#  Jännitteen mittaus: 100 lukua kerralla, 25 suurinta ja pienintä pois, keskiarvo kerrotaan AKKU_VAKIOLLA
+akkujannite = ADCSAMPLER.ADCChannel(AKKU_PINNI, ADC.ATTN_11DB, n=100, trim=25, scale=AKKU_VAKIO)
 
 
 def lue_akkujannite():
-    arvolista = []
-    #  Luetaan 100 arvoa
-    while len(arvolista) < 100:
-        try:
-            arvolista.append(akkujannite.read())
-        except OSError:
-            pass
-    #  Lasketaan keskiarvo ja kerrotaan AKKU_VAKIOLLA
-    jannite = (sum(arvolista) / len(arvolista)) * AKKU_VAKIO
+    #  ADC heittelee +-150, siksi luetaan 100 arvon sarja ja lasketaan katkaistu keskiarvo
+    jannite = akkujannite.sample()
+    if jannite is None:
+        jannite = 0
     return jannite
 
 
@@ -77,6 +77,7 @@ import machine
 import dht
 from machine import Pin
 from machine import ADC
+import ADCSAMPLER_AS as ADCSAMPLER
 from umqttsimple import MQTTClient
 
 # tuodaan parametrit tiedostosta parametrit.py
@@ -91,29 +92,20 @@ except ImportError:
 #  dht-kirjasto tukee muitakin antureita kuin dht22
 anturi = dht.DHT22(Pin(DHT_PINNI_NUMERO))
 client = MQTTClient(CLIENT_ID, MQTT_SERVERI, MQTT_PORTTI, MQTT_KAYTTAJA, MQTT_SALASANA)
-#  jännitteen mittaus
-akkujannite = ADC(Pin(AKKU_ADC_PINNI))
-# vaimennus 11 db
-akkujannite.atten(ADC.ATTN_11DB)
+#  Jännitteen mittaus: 32 lukua kerralla, 8 suurinta ja pienintä pois, keskiarvo kerrotaan AKKU_VAKIOLLA
+akkujannite = ADCSAMPLER.ADCChannel(AKKU_ADC_PINNI, ADC.ATTN_11DB, n=32, trim=8, scale=AKKU_VAKIO)
 #  Toisiopiirin aktivaatio. Tila 0 = GND.
 toisiopiiri = Pin(TOISIOPIIRI_AKTIVOINTI_PINNI, mode=Pin.OPEN_DRAIN, pull=-1)
 
 
 def lue_akkujannite():
-    arvolista = []
-    #  Luetaan 3 arvoa
-    while len(arvolista) < 3:
-        try:
-            arvolista.append(akkujannite.read())
-        except OSError:
-            arvolista.append(0)
-    #  Lasketaan keskiarvo ja kerrotaan AKKU_VAKIOLLA
-    if (sum(arvolista) > 0) and len(arvolista) > 0:
-        jannite = (sum(arvolista) / len(arvolista)) * AKKU_VAKIO
-    else:
+    #  ADC heittelee +-150, siksi luetaan 32 arvon sarja ja lasketaan katkaistu keskiarvo
+    jannite = akkujannite.sample()
+    if jannite is None:
         jannite = 0
     return jannite
 
+
 def lue_lampo_kosteus():
     """ Luetaan 2 arvoa 2s välein ja lasketaan keskiarvo, joka lähtetään mqtt:llä """
     lampo_lista = []  # keskiarvon laskentaa varten
@@ -0,0 +1,145 @@
+"""
+Heap-aware garbage collection scheduler, replaces gc.collect() and gc.threshold() calls in the application loops.
+
+Loops call mem.idle() when they have finished a piece of work (publish cycle, display page, sensor average).
+That is only a hint: the manager task collects at the idle point if enough has been allocated since the previous
+collection, if free heap is low or if max_ival seconds have passed. Collections are then done between the scheduled
+work, not inside UART frame reads or MQTT handshakes. gc.threshold() is set after each collection so that the
+automatic collection is only a fallback.
+
+    from drivers.MEMMGR_AS import mem
+    mem.collect()                       # boot, between large imports
+    loop.create_task(mem.run())
+    mem.idle()                          # instead of gc.collect() in loops
+    print(mem.stats())
+
+Largest free block can be probed with allocations (binary search) every probe_every collections, fragmentation
+is 1 - largest free block / free heap. MicroPython does not expose the largest free block directly. The probe is
+off by default (probe_every=0): each failed allocation runs a full collection inside the VM, and on split heap
+firmware (1.21 and later) the attempts can grow the heap and take IDF memory from WiFi and TLS. Enable it for
+debugging only, largest and frag are None otherwise:
+
+    if DEBUG == 1:
+        mem.probe_every = 10
+"""
+import gc
+import uasyncio as asyncio
+from utime import ticks_ms, ticks_us, ticks_diff
+
+
+class MemoryManager(object):
+
+    def __init__(self, period_ms=1000, headroom=4, budget=2, max_ival=60, low_free=8192, probe_every=0):
+        self.period_ms = period_ms  # Heap is sampled this often when there are no idle hints
+        self.headroom = headroom  # Automatic collection after 1/headroom of the free heap is allocated
+        self.budget = budget  # Idle collection after 1/(headroom * budget) of the free heap is allocated
+        self.max_ival = max_ival
+        self.low_free = low_free
+        self.probe_every = probe_every
+        self.event = asyncio.Event()
+        self.limit = 0  # Bytes allocated since the last collection before the next idle collection
+        self.base = gc.mem_alloc()
+        self.last_ms = ticks_ms()
+        self.prev_alloc = self.base
+        self.prev_ms = self.last_ms
+        # Statistics
+        self.count = 0
+        self.auto = 0  # Collections not done by the manager (threshold or allocation failure)
+        self.idle_hints = 0
+        self.forced = 0  # Collections due to low free heap or max_ival, not at an idle point
+        self.last_us = 0
+        self.max_us = 0
+        self.total_us = 0
+        self.rate = 0  # Allocation rate, bytes/s
+        self.free = gc.mem_free()
+        self.min_free = self.free
+        self.largest = None
+        self.frag = None
+
+    def idle(self):
+        """ Loop has finished its work, good moment for a collection """
+        self.idle_hints += 1
+        self.event.set()
+
+    def collect(self):
+        """ Timed collection, sets the automatic collection threshold """
+        start = ticks_us()
+        gc.collect()
+        pause = ticks_diff(ticks_us(), start)
+        self.count += 1
+        self.last_us = pause
+        self.total_us += pause
+        if pause > self.max_us:
+            self.max_us = pause
+        self.free = gc.mem_free()
+        self.base = gc.mem_alloc()
+        self.prev_alloc = self.base
+        self.last_ms = ticks_ms()
+        self.limit = self.free // (self.headroom * self.budget)
+        gc.threshold(self.free // self.headroom + self.base)
+        if self.probe_every and self.count % self.probe_every == 1:
+            self.probe()
+        return pause
+
+    def probe(self):
+        """ Largest allocatable block with binary search, costs several full collections. Debug only """
+        lo = 0
+        hi = gc.mem_free()
+        while hi - lo > 256:
+            mid = (lo + hi) // 2
+            try:
+                b = bytearray(mid)
+                lo = mid
+            except MemoryError:
+                hi = mid
+            b = None
+        self.largest = lo
+        self.frag = 1 - lo / self.free if self.free else 0
+        gc.collect()  # Last successful probe block
+        self.base = gc.mem_alloc()
+        self.prev_alloc = self.base
+        return lo
+
+    def sample(self):
+        now = ticks_ms()
+        alloc = gc.mem_alloc()
+        if alloc < self.prev_alloc:  # Collected outside the manager
+            self.auto += 1
+            self.base = alloc
+        else:
+            dt = ticks_diff(now, self.prev_ms)
+            if dt > 0:
+                self.rate = (alloc - self.prev_alloc) * 1000 // dt
+        self.prev_alloc = alloc
+        self.prev_ms = now
+        free = gc.mem_free()
+        if free < self.min_free:
+            self.min_free = free
+        return alloc - self.base, free
+
+    async def run(self):
+        self.collect()
+        while True:
+            try:
+                await asyncio.wait_for(self.event.wait(), self.period_ms / 1000)
+                hint = True
+            except asyncio.TimeoutError:
+                hint = False
+            self.event.clear()
+            grown, free = self.sample()
+            if free < self.low_free or ticks_diff(ticks_ms(), self.last_ms) > self.max_ival * 1000:
+                if not hint:
+                    self.forced += 1
+                self.collect()
+            elif hint and grown >= self.limit:
+                self.collect()
+
+    def stats(self):
+        return ("gc %s (auto %s, forced %s), pause last %s us max %s us avg %s us, alloc %s B/s, "
+                "free %s (min %s), largest %s, frag %s" %
+                (self.count, self.auto, self.forced, self.last_us, self.max_us,
+                 self.total_us // self.count if self.count else 0, self.rate, self.free, self.min_free,
+                 self.largest, "{:.2f}".format(self.frag) if self.frag is not None else None))
+
+
+mem = MemoryManager()
@@ -0,0 +1,196 @@
+"""
+Compiled runtime configuration, replaces json.load(runtimeconfig.json) at every boot.
+
+First boot (or after runtimeconfig.json is edited) JSON is parsed, validated against the schema and written as a
+compact binary snapshot (runtimeconfig.bin). Later boots read the snapshot with one read, JSON is not parsed and the
+parsed dict is not kept in the heap. Snapshot is rebuilt when mtime or size of the JSON file or the schema changes.
+
+Values are decoded only when accessed: keys are sorted in the snapshot and found with binary search over an
+offset table, so there is no dict of 60 keys in RAM, only the snapshot bytes.
+
+Schema is {type: (keys, ...)}. Listed keys are required, float accepts also int. Defaults fill optional keys:
+    schema = {str: ('SSID1', 'PASSWORD1'), int: ('MQTT_INTERVAL',), float: ('TEMP_TRESHOLD',)}
+    data = RunConfig('runtimeconfig.json', schema, {'TREND_IVAL': 60})
+    ssid = data['SSID1']                  # KeyError if missing, as with the JSON dict
+    ival = data.get_int('TREND_IVAL', 60)
+    print(data.compiled, data.load_us, data.size)
+"""
+import os
+import struct
+from json import load
+from utime import ticks_us, ticks_diff
+try:
+    from binascii import crc32
+except ImportError:
+    from ubinascii import crc32
+
+MAGIC = b'RCF1'
+HEADER = '<4sIIIH'  # magic, JSON mtime, JSON size, schema crc, number of keys
+HDR_LEN = 18
+T_NONE = 0
+T_BOOL = 1
+T_INT = 2
+T_FLOAT = 3
+T_STR = 4
+
+
+class RunConfig(object):
+
+    def __init__(self, path='runtimeconfig.json', schema=None, defaults=None, cache=None):
+        start = ticks_us()
+        self.path = path
+        self.cache = cache if cache is not None else path.rsplit('.', 1)[0] + '.bin'
+        self.schema = schema if schema is not None else {}
+        self.defaults = defaults if defaults is not None else {}
+        st = os.stat(path)  # OSError if file is missing, same as open()
+        self.stamp = (st[8], st[6], self._signature())
+        self.blob = self._read_cache()
+        self.compiled = self.blob is None
+        if self.compiled:
+            self.blob = self._compile()
+        self.n = struct.unpack_from('<H', self.blob, HDR_LEN - 2)[0]
+        self.rec0 = HDR_LEN + 2 * self.n
+        self.size = len(self.blob)
+        self.schema = None
+        self.defaults = None
+        self.load_us = ticks_diff(ticks_us(), start)
+
+    def _signature(self):
+        keys = []
+        for typ, names in self.schema.items():
+            for key in names:
+                keys.append("%s:%s" % (key, typ.__name__))
+        keys.sort()
+        for key in sorted(self.defaults):
+            keys.append(key)
+        return crc32(",".join(keys).encode())
+
+    def _read_cache(self):
+        try:
+            with open(self.cache, 'rb') as f:
+                blob = f.read()
+        except OSError:
+            return None
+        if len(blob) < HDR_LEN:
+            return None
+        magic, mtime, size, sig, _ = struct.unpack_from(HEADER, blob, 0)
+        if magic != MAGIC or (mtime, size, sig) != self.stamp:
+            return None
+        return blob
+
+    def _validate(self, data):
+        errors = []
+        for typ, names in self.schema.items():
+            for key in names:
+                if key not in data:
+                    errors.append("%s missing" % key)
+                elif not (isinstance(data[key], typ) or (typ is float and isinstance(data[key], int))):
+                    errors.append("%s not %s" % (key, typ.__name__))
+        if errors:
+            raise ValueError("%s: %s" % (self.path, ", ".join(errors)))
+        for key, value in self.defaults.items():
+            if key not in data:
+                data[key] = value
+
+    def _compile(self):
+        with open(self.path, 'r') as f:
+            data = load(f)
+        self._validate(data)
+        keys = sorted(data)
+        recs = []
+        offsets = []
+        pos = 0
+        for key in keys:
+            kb = key.encode()
+            value = data[key]
+            if value is None:
+                rec = struct.pack('<BB', len(kb), T_NONE) + kb
+            elif isinstance(value, bool):
+                rec = struct.pack('<BB', len(kb), T_BOOL) + kb + struct.pack('<B', value)
+            elif isinstance(value, int):
+                rec = struct.pack('<BB', len(kb), T_INT) + kb + struct.pack('<i', value)
+            elif isinstance(value, float):
+                rec = struct.pack('<BB', len(kb), T_FLOAT) + kb + struct.pack('<f', value)
+            else:
+                vb = str(value).encode()
+                rec = struct.pack('<BB', len(kb), T_STR) + kb + struct.pack('<H', len(vb)) + vb
+            offsets.append(pos)
+            recs.append(rec)
+            pos += len(rec)
+        mtime, size, sig = self.stamp
+        blob = (struct.pack(HEADER, MAGIC, mtime, size, sig, len(keys)) +
+                struct.pack('<%sH' % len(keys), *offsets) + b''.join(recs))
+        try:
+            with open(self.cache, 'wb') as f:
+                f.write(blob)
+        except OSError as e:
+            print("RunConfig: can not write %s: %s" % (self.cache, e))
+        return blob
+
+    def _find(self, key):
+        """ Offset of the record, None if key is not found """
+        kb = key.encode()
+        blob = self.blob
+        lo = 0
+        hi = self.n - 1
+        while lo <= hi:
+            mid = (lo + hi) // 2
+            off = self.rec0 + struct.unpack_from('<H', blob, HDR_LEN + 2 * mid)[0]
+            klen = blob[off]
+            k = blob[off + 2:off + 2 + klen]
+            if k == kb:
+                return off
+            if k < kb:
+                lo = mid + 1
+            else:
+                hi = mid - 1
+        return None
+
+    def _value(self, off):
+        blob = self.blob
+        klen = blob[off]
+        typ = blob[off + 1]
+        p = off + 2 + klen
+        if typ == T_STR:
+            vlen = struct.unpack_from('<H', blob, p)[0]
+            return blob[p + 2:p + 2 + vlen].decode()
+        if typ == T_INT:
+            return struct.unpack_from('<i', blob, p)[0]
+        if typ == T_FLOAT:
+            return struct.unpack_from('<f', blob, p)[0]
+        if typ == T_BOOL:
+            return bool(blob[p])
+        return None
+
+    def __getitem__(self, key):
+        off = self._find(key)
+        if off is None:
+            raise KeyError(key)
+        return self._value(off)
+
+    def __contains__(self, key):
+        return self._find(key) is not None
+
+    def get(self, key, default=None):
+        off = self._find(key)
+        return default if off is None else self._value(off)
+
+    def get_int(self, key, default=0):
+        value = self.get(key)
+        return default if value is None else int(value)
+
+    def get_float(self, key, default=0.0):
+        value = self.get(key)
+        return default if value is None else float(value)
+
+    def get_str(self, key, default=''):
+        value = self.get(key)
+        return default if value is None else str(value)
+
+    def get_bool(self, key, default=False):
+        value = self.get(key)
+        if value is None:
+            return default
+        if isinstance(value, str):
+            return value in ('True', 'true', '1')
+        return bool(value)
@@ -0,0 +1,216 @@
+"""
+In-process sample bus between sensor loops (producers) and display, MQTT and REPL loops (consumers).
+
+Each channel keeps the latest sample: value, utime.time() stamp, ticks_ms of the publish and a sequence number.
+publish() stores a new sample only if it differs from the current one by more than the channel's deadband
+(numbers) or is not equal (other types, a dict is always new), then sets the event of each subscriber of the
+channel. Reading the latest value is one dict lookup, consumers never see a half updated set of globals.
+
+A subscriber waits for any of its channels to change instead of polling on a timer. min_ms limits how often
+wait() returns: changes during that time are coalesced into one wakeup. changed(name) is True once per new sample,
+consumed(name) records the age of the sample (sensor to consumer latency).
+
+A steady value is not published again, to the broker a silent topic then looks the same as a dead node. With
+max_silence_ms changed(name) is True also when the value of name has not been consumed for that long but the
+producer has published since (within the deadband), and a wait() which times out returns True when such a repeat
+is due. A producer which stopped is not covered up, its topic goes silent.
+
+    from drivers.SAMPLEBUS_AS import bus
+    bus.channel('temp', deadband=0.1)
+    bus.publish('temp', 21.3)                         # producer
+    sub = bus.subscribe(('temp', 'co2'), min_ms=60000, max_silence_ms=600000)
+    while True:
+        if not await sub.wait(30000):                 # False on timeout, keep heartbeats going
+            continue
+        if sub.changed('temp'):
+            await client.publish(topic, str(bus.get('temp')))
+            sub.consumed('temp')
+    print(bus.stats(), sub.stats())
+"""
+import uasyncio as asyncio
+from utime import time, ticks_ms, ticks_diff
+
+
+class Channel(object):
+
+    def __init__(self, name, deadband=0):
+        self.name = name
+        self.deadband = deadband
+        self.value = None
+        self.stamp = None  # utime.time() of the sample
+        self.ticks = 0  # ticks_ms of the sample, for latency
+        self.seq = 0
+        self.publishes = 0
+        self.subs = []
+
+
+class Subscriber(object):
+
+    def __init__(self, bus, names, min_ms=0, max_silence_ms=0):
+        self.bus = bus
+        self.names = names
+        self.min_ms = min_ms
+        self.max_silence_ms = max_silence_ms
+        self.event = asyncio.Event()
+        self.seen = {}
+        self.sent = {}  # ticks_ms of consumed(name)
+        self.sent_pubs = {}  # Channel publishes at consumed(name)
+        self.repeats = []  # Names changed() returned for max_silence_ms, not for a new sample
+        self.last_ms = None
+        self.started = ticks_ms()
+        # Statistics
+        self.wakeups = 0
+        self.timeouts = 0
+        self.lat_ms = 0
+        self.max_lat_ms = 0
+        self.lat_total = 0
+        self.lat_count = 0
+        self.republishes = 0
+        for name in names:
+            ch = bus.channel(name)
+            ch.subs.append(self)
+            self.seen[name] = 0
+            if ch.seq:
+                self.event.set()  # Samples published before subscribing
+
+    async def wait(self, timeout_ms=None):
+        """ True when a channel has a new sample or a repeat is due, False on timeout """
+        if self.min_ms and self.last_ms is not None:
+            rest = self.min_ms - ticks_diff(ticks_ms(), self.last_ms)
+            if rest > 0:
+                await asyncio.sleep_ms(rest)
+        if not self.event.is_set():
+            if timeout_ms is None:
+                await self.event.wait()
+            else:
+                try:
+                    await asyncio.wait_for_ms(self.event.wait(), timeout_ms)
+                except asyncio.TimeoutError:
+                    self.timeouts += 1
+                    return self._silent()
+        if self.min_ms:
+            # Immediate subscribers woken by the same sample run first, derived samples (AQI) join this wakeup
+            await asyncio.sleep_ms(0)
+        self.event.clear()
+        self.wakeups += 1
+        self.last_ms = ticks_ms()
+        return True
+
+    def _due(self, name, now):
+        last = self.sent.get(name)
+        ch = self.bus.channels[name]
+        return (last is not None and ch.value is not None and ch.publishes != self.sent_pubs[name] and
+                ticks_diff(now, last) >= self.max_silence_ms)
+
+    def _silent(self):
+        """ True if a value is due for a repeat """
+        if self.max_silence_ms:
+            now = ticks_ms()
+            for name in self.names:
+                if self._due(name, now):
+                    return True
+        return False
+
+    def changed(self, name):
+        """ True once per new sample of name, again after max_silence_ms without consumed(name) """
+        seq = self.bus.channels[name].seq
+        if seq != self.seen[name]:
+            self.seen[name] = seq
+            if name in self.repeats:
+                self.repeats.remove(name)
+            return True
+        if self.max_silence_ms and self._due(name, ticks_ms()):
+            if name not in self.repeats:
+                self.repeats.append(name)
+            self.republishes += 1
+            return True
+        return False
+
+    def consumed(self, name):
+        """ Sample of name was used (sent, shown), returns its age in ms. Repeats are not in the latency """
+        now = ticks_ms()
+        ch = self.bus.channels[name]
+        self.sent[name] = now
+        self.sent_pubs[name] = ch.publishes
+        lat = ticks_diff(now, ch.ticks)
+        if name in self.repeats:
+            self.repeats.remove(name)
+            return lat
+        self.lat_ms = lat
+        if lat > self.max_lat_ms:
+            self.max_lat_ms = lat
+        self.lat_total += lat
+        self.lat_count += 1
+        return lat
+
+    def close(self):
+        for name in self.names:
+            self.bus.channels[name].subs.remove(self)
+
+    def wakeup_rate(self):
+        """ Wakeups per second since subscribing """
+        run = ticks_diff(ticks_ms(), self.started)
+        return self.wakeups * 1000 / run if run > 0 else 0
+
+    def stats(self):
+        return ("wakeups %s (%.3f/s), timeouts %s, republishes %s, latency last %s ms, max %s ms, avg %s ms" %
+                (self.wakeups, self.wakeup_rate(), self.timeouts, self.republishes, self.lat_ms, self.max_lat_ms,
+                 self.lat_total // self.lat_count if self.lat_count else 0))
+
+
+class SampleBus(object):
+
+    def __init__(self):
+        self.channels = {}
+        self.publishes = 0
+        self.changes = 0
+
+    def channel(self, name, deadband=None):
+        ch = self.channels.get(name)
+        if ch is None:
+            ch = self.channels[name] = Channel(name, deadband or 0)
+        elif deadband is not None:
+            ch.deadband = deadband
+        return ch
+
+    def publish(self, name, value):
+        """ New sample, True if it changed the channel """
+        ch = self.channels.get(name) or self.channel(name)
+        ch.publishes += 1
+        self.publishes += 1
+        old = ch.value
+        if value is None:
+            if old is None:
+                return False  # Only a lost value after a real one is a change
+        elif old is not None:
+            if isinstance(value, (int, float)) and isinstance(old, (int, float)):
+                if abs(value - old) <= ch.deadband:
+                    return False
+            elif not isinstance(value, dict) and value == old:
+                return False
+        ch.value = value
+        ch.stamp = time()
+        ch.ticks = ticks_ms()
+        ch.seq += 1
+        self.changes += 1
+        for sub in ch.subs:
+            sub.event.set()
+        return True
+
+    def get(self, name, default=None):
+        ch = self.channels.get(name)
+        return default if ch is None or ch.value is None else ch.value
+
+    def age(self, name):
+        """ Seconds since the latest sample of name, None if there is none """
+        ch = self.channels.get(name)
+        return None if ch is None or ch.stamp is None else time() - ch.stamp
+
+    def subscribe(self, names, min_ms=0, max_silence_ms=0):
+        return Subscriber(self, names, min_ms, max_silence_ms)
+
+    def stats(self):
+        return "%s channels, %s publishes, %s changes" % (len(self.channels), self.publishes, self.changes)
+
+
+bus = SampleBus()
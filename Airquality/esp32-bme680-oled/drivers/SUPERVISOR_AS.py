@@ -0,0 +1,173 @@
+"""
+Event loop lag monitor and per-task watchdog supervisor.
+
+Lag probe task sleeps probe_ms and measures how late it wakes up. Late wakeups are caused by code which blocks
+the loop (sleep_ms() in a driver, ntptime, display clear, synchronous MQTT). Lags are collected into a histogram.
+
+Long running tasks register a heartbeat and call beat(name) once per round. Hardware WDT is fed only when all
+critical heartbeats are fresh and no registered task has ended. When a heartbeat goes stale, the task name, its
+age and lag statistics are written to RTC memory, which survives the WDT reset, and read at next boot.
+
+    sup = Supervisor(wdt_timeout=30000, log_fn=log_errors)
+    print(sup.last_reset())                              # record of the previous supervised reset, or None
+    sup.register('disp', 60, task=loop.create_task(disp_l()))
+    sup.register('co2', 400, critical=False, stamp=lambda: co2s.read_ticks)   # driver loop, utime.ticks_ms()
+    loop.create_task(sup.run())
+    sup.beat('disp')                                     # in disp_l() loop
+
+Non-critical heartbeats (sensor loops) are logged when stale but do not stop feeding, a dead sensor should not
+reset the node over and over. Without wdt_timeout, stale heartbeats are only logged and recorded.
+Ages are ticks_ms() differences only: wall clock stamps would jump when SNTP sets the RTC from the 2000 epoch.
+"""
+from array import array
+import uasyncio as asyncio
+from utime import ticks_ms, ticks_diff, time
+from machine import RTC
+try:
+    from machine import WDT
+except ImportError:
+    WDT = None
+
+LAG_EDGES = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000)  # ms, last bucket is > 1000
+RTC_MAGIC = 'SUP1'
+
+
+class Supervisor(object):
+
+    def __init__(self, wdt_timeout=None, probe_ms=50, check_ms=1000, log_fn=None):
+        self.probe_ms = probe_ms
+        self.check_ms = check_ms
+        self.log_fn = log_fn
+        self.wdt = WDT(timeout=wdt_timeout) if wdt_timeout is not None and WDT is not None else None
+        self.names = []
+        self.index = {}
+        self.max_age = []  # ms
+        self.critical = []
+        self.tasks = []
+        self.stamps = []
+        self.last = array('l')
+        self.stale = bytearray(0)
+        self.hist = array('L', [0] * (len(LAG_EDGES) + 1))
+        self.probes = 0
+        self.last_lag = 0
+        self.max_lag = 0
+        self.max_lag_time = None
+        self.feeds = 0
+        self.starved = None  # Name of the task which stops feeding
+        self.rtc = RTC()
+
+    def register(self, name, max_age, critical=True, task=None, stamp=None):
+        """ max_age in seconds, stamp is a function returning utime.ticks_ms() of the last progress """
+        self.index[name] = len(self.names)
+        self.names.append(name)
+        self.max_age.append(max_age * 1000)
+        self.critical.append(critical)
+        self.tasks.append(task)
+        self.stamps.append(stamp)
+        self.last.append(ticks_ms())
+        self.stale.extend(b'\x00')
+        return task
+
+    def beat(self, name):
+        self.last[self.index[name]] = ticks_ms()
+
+    def _age(self, i, now):
+        if self.stamps[i] is not None:
+            try:
+                return ticks_diff(now, self.stamps[i]())
+            except Exception:
+                return ticks_diff(now, self.last[i])
+        return ticks_diff(now, self.last[i])
+
+    async def lag_loop(self):
+        hist = self.hist
+        edges = LAG_EDGES
+        while True:
+            start = ticks_ms()
+            await asyncio.sleep_ms(self.probe_ms)
+            lag = ticks_diff(ticks_ms(), start) - self.probe_ms
+            b = 0
+            while b < len(edges) and lag > edges[b]:
+                b += 1
+            hist[b] += 1
+            self.probes += 1
+            self.last_lag = lag
+            if lag > self.max_lag:
+                self.max_lag = lag
+                self.max_lag_time = time()
+
+    def check(self):
+        """ True if the WDT can be fed """
+        now = ticks_ms()
+        ok = True
+        for i in range(len(self.names)):
+            task = self.tasks[i]
+            dead = task is not None and task.done()
+            age = self._age(i, now)
+            if dead or age > self.max_age[i]:
+                if not self.stale[i]:
+                    self.stale[i] = 1
+                    reason = "ended" if dead else "stale %s s" % (age // 1000)
+                    if self.log_fn is not None:
+                        self.log_fn("Supervisor: %s %s, max lag %s ms" % (self.names[i], reason, self.max_lag))
+                    if self.critical[i]:
+                        self.starved = self.names[i]
+                        self.save(self.names[i], reason)
+                if self.critical[i]:
+                    ok = False
+            elif self.stale[i]:
+                self.stale[i] = 0
+                if self.critical[i] and self.starved == self.names[i]:
+                    self.starved = None
+                    self.clear()
+        return ok
+
+    async def run(self):
+        asyncio.create_task(self.lag_loop())
+        while True:
+            if self.check() and self.wdt is not None:
+                self.wdt.feed()
+                self.feeds += 1
+            await asyncio.sleep_ms(self.check_ms)
+
+    def lag_pct(self, pct):
+        """ Upper edge (ms) of the histogram bucket containing the percentile """
+        limit = self.probes * pct // 100
+        total = 0
+        for b in range(len(self.hist)):
+            total += self.hist[b]
+            if total >= limit:
+                return LAG_EDGES[b] if b < len(LAG_EDGES) else self.max_lag
+        return self.max_lag
+
+    def save(self, name, reason):
+        """ Diagnosis into RTC memory, survives WDT and soft resets """
+        rec = "%s;%s;%s;%s;%s;%s;%s" % (RTC_MAGIC, time(), name, reason, self.max_lag, self.lag_pct(99),
+                                        ",".join(str(n) for n in self.hist))
+        try:
+            self.rtc.memory(rec.encode())
+        except Exception as e:
+            print("Supervisor: can not write RTC memory: %s" % e)
+
+    def clear(self):
+        try:
+            self.rtc.memory(b'')
+        except Exception:
+            pass
+
+    def last_reset(self):
+        """ Record written before the previous reset as text, cleared after reading """
+        try:
+            rec = self.rtc.memory()
+        except Exception:
+            return None
+        if not rec or rec[:4] != RTC_MAGIC.encode():
+            return None
+        self.clear()
+        _, stamp, name, reason, max_lag, p99, hist = rec.decode().split(';')
+        return "%s %s at %s, max lag %s ms, p99 %s ms, histogram %s" % (name, reason, stamp, max_lag, p99, hist)
+
+    def stats(self):
+        return "lag last %s ms, max %s ms, p50 %s ms, p99 %s ms, stale %s, WDT feeds %s" % (
+            self.last_lag, self.max_lag, self.lag_pct(50), self.lag_pct(99),
+            [self.names[i] for i in range(len(self.names)) if self.stale[i]], self.feeds)
@@ -12,7 +12,8 @@ As default, I2C for the OLED and BME680 are connected to SDA = Pin21 and SCL (SC
 Use command i2c.scan() to check which devices respond from the I2C channel.
 
 Program read sensor values once per second, rounds them to 1 decimal with correction values, then calculates averages.
-Averages are sent to the MQTT broker defined in runtimeconfig.json.
+Averages are published on the sample bus (drivers/SAMPLEBUS_AS.py), changed averages are sent to the MQTT broker
+defined in runtimeconfig.json at most once per MQTT interval.
 
 For webrepl, remember to execute import webrepl_setup one time.
 
@@ -23,187 +24,126 @@ Updated 20.6.2023 - removed gas resistance limits from MQTT publish. Values seem
 Updated 29.1.2024 - shortened variable names and added error logging file size checkup
 """
 
+from drivers.BOOTPROF import boot_phase, boot_mark, prof
+from drivers.MEMMGR_AS import mem
+prof.begin("imports")
 from machine import SoftI2C, Pin, freq, reset
 import uasyncio as asyncio
-from utime import mktime, localtime
 import gc
 import drivers.BME680 as BSENS
 import drivers.SH1106 as ODISP
-gc.collect()
+import drivers.RUNCONF as RUNCONF
+import drivers.EVENTLOG_AS as ELOG
+import drivers.SUPERVISOR_AS as SUP
+from drivers.SAMPLEBUS_AS import bus
+import drivers.TIMEZONE as TIMEZONE
+mem.collect()
 import drivers.WIFICONN_AS as WNET
-gc.collect()
-from json import load
+mem.collect()
 import esp32
 from drivers.MQTT_AS import MQTTClient, config
-import os
-gc.collect()
+mem.collect()
+prof.end()
 # Globals
 mqtt_up = False
+first_pub = asyncio.Event()
 bro_uptime = 0
-t_ave = 0
-rh_ave = 0
-press_ave = 0
-gas_r_ave = 0
 BME680_sensor_faulty = False
 
 
-def log_errors(err_in):
-    filename = "/errors.csv"
-    max_file_size_bytes = 1024  # 1KB
+# Fixed size records in RAM ring, flush_loop() appends them to rotating /errors0-3.csv segments
+elog = ELOG.EventLog(date_fn=lambda: "%s %s" % resolve_date()[:2])
 
-    with open(filename, 'a+') as logf:
-        try:
-            logf.write("%s" % str(resolve_date()[0]))  # Date in local format
-            logf.write(",")
-            logf.write("%s" % str(err_in))
-            logf.write("\r\n")
-        except OSError:
-            print("Can not write to ", filename, "!")
-            raise OSError
-
-    logf.close()
 
-    # Check file size and shrink/delete if needed
-    try:
-        file_stat = os.stat(filename)
-        file_size_bytes = file_stat[6]  # Index 6 corresponds to file size
-
-        if file_size_bytes > max_file_size_bytes:
-            with open(filename, 'r') as file:
-                lines = file.readlines()
-                lines = lines[-1000:]  # Keep the last 1000 lines
-            with open(filename, 'w') as file:
-                file.writelines(lines)
-    except OSError as e:
-        if e.args[0] == 2:  # File not found error
-            # File doesn't exist, create it
-            with open(filename, 'w') as file:
-                pass  # Just create an empty file
-        else:
-            print("Error while checking/shrinking the log file.")
-            raise OSError
+def log_errors(err_in, level=ELOG.ERROR):
+    elog.log(err_in, level)
 
 
 try:
-    f = open('parameters.py', "r")
     from parameters import I2C_SCL_PIN, I2C_SDA_PIN, TOUCH_PIN
-    f.close()
-except OSError as err:  # open failed
-    log_errors("Parameters: %s" % err)
+except ImportError as err:
+    log_errors("Parameters: %s" % err, ELOG.CRITICAL)
     print("parameter.py-file missing! Can not continue!")
     raise
 
+# Required runtimeconfig.json keys, checked once when the binary snapshot is compiled
+CONF_SCHEMA = {
+    str: ('SSID1', 'SSID2', 'PASSWORD1', 'PASSWORD2', 'MQTT_SERVER', 'MQTT_PASSWORD', 'MQTT_USER', 'MQTT_PORT',
+          'MQTT_SSL', 'CLIENT_ID', 'TOPIC_ERRORS', 'WEBREPL_PASSWORD', 'NTPSERVER', 'DHCP_NAME', 'TOPIC_TEMP',
+          'TOPIC_RH', 'TOPIC_PRESSURE', 'TOPIC_GASR', 'TOPIC_IAQ', 'TOPIC_DP'),
+    int: ('MQTT_INTERVAL', 'START_WEBREPL', 'START_NETWORK', 'START_MQTT', 'SCREEN_UPDATE_INTERVAL',
+          'DEBUG_SCREEN_ACTIVE', 'SCREEN_TIMEOUT', 'DST_BEGIN_M', 'DST_BEGIN_DAY', 'DST_BEGIN_OCC', 'DST_BEGIN_TIME',
+          'DST_END_M', 'DST_END_DAY', 'DST_END_TIME', 'DST_END_OCC', 'DST_TIMEZONE'),
+    float: ('TEMP_TRESHOLD', 'TEMP_CORRECTION', 'RH_TRESHOLD', 'RH_CORRECTION', 'PRESSURE_TRESHOLD',
+            'PRESSURE_CORRECTION'),
+}
+
+prof.begin("config")
 try:
-    f = open('runtimeconfig.json', 'r')
-    with open('runtimeconfig.json') as config_file:
-        data = load(config_file)
-        f.close()
-        SID1 = data['SSID1']
-        SID2 = data['SSID2']
-        PWD1 = data['PASSWORD1']
-        PWD2 = data['PASSWORD2']
-        MQTT_S = data['MQTT_SERVER']
-        MQTT_P = data['MQTT_PASSWORD']
-        MQTT_U = data['MQTT_USER']
-        MQTT_PRT = data['MQTT_PORT']
-        MQTT_SSL = data['MQTT_SSL']
-        MQTT_IVAL = data['MQTT_INTERVAL']
-        CLNT_ID = data['CLIENT_ID']
-        TOPIC_ERR = data['TOPIC_ERRORS']
-        WBRPL_PWD = data['WEBREPL_PASSWORD']
-        NTPS = data['NTPSERVER']
-        DHCP_N = data['DHCP_NAME']
-        S_WBRPL = data['START_WEBREPL']
-        S_NET = data['START_NETWORK']
-        S_MQTT = data['START_MQTT']
-        SCR_UPD_IVAL = data['SCREEN_UPDATE_INTERVAL']
-        D_SCR_ACT = data['DEBUG_SCREEN_ACTIVE']
-        SCR_TOUT = data['SCREEN_TIMEOUT']
-        T_TEMP = data['TOPIC_TEMP']
-        T_RH = data['TOPIC_RH']
-        T_PRESS = data['TOPIC_PRESSURE']
-        T_GASR = data['TOPIC_GASR']
-        T_IAQ = data['TOPIC_IAQ']
-        T_DP = data['TOPIC_DP']
-        TEMP_THOLD = data['TEMP_TRESHOLD']
-        TEMP_CORR = data['TEMP_CORRECTION']
-        RH_THOLD = data['RH_TRESHOLD']
-        RH_CORR = data['RH_CORRECTION']
-        PRESS_THOLD = data['PRESSURE_TRESHOLD']
-        PRESS_CORR = data['PRESSURE_CORRECTION']
-        DST_B_M = data['DST_BEGIN_M']
-        DST_B_DAY = data['DST_BEGIN_DAY']
-        DST_B_OCC = data['DST_BEGIN_OCC']
-        DST_B_TIME = data['DST_BEGIN_TIME']
-        DST_END_M = data['DST_END_M']
-        DST_END_D = data['DST_END_DAY']
-        DST_END_TIME = data['DST_END_TIME']
-        DST_END_OCC = data['DST_END_OCC']
-        DST_TZONE = data['DST_TIMEZONE']
-except OSError as er:
-    log_errors("Runtime.json: %s" % er)
+    data = RUNCONF.RunConfig('runtimeconfig.json', CONF_SCHEMA)
+    SID1 = data['SSID1']
+    SID2 = data['SSID2']
+    PWD1 = data['PASSWORD1']
+    PWD2 = data['PASSWORD2']
+    MQTT_S = data['MQTT_SERVER']
+    MQTT_P = data['MQTT_PASSWORD']
+    MQTT_U = data['MQTT_USER']
+    MQTT_PRT = data['MQTT_PORT']
+    MQTT_SSL = data['MQTT_SSL']
+    MQTT_IVAL = data['MQTT_INTERVAL']
+    CLNT_ID = data['CLIENT_ID']
+    TOPIC_ERR = data['TOPIC_ERRORS']
+    TOPIC_BOOT = data.get('TOPIC_BOOT')
+    WBRPL_PWD = data['WEBREPL_PASSWORD']
+    NTPS = data['NTPSERVER']
+    DHCP_N = data['DHCP_NAME']
+    S_WBRPL = data['START_WEBREPL']
+    S_NET = data['START_NETWORK']
+    S_MQTT = data['START_MQTT']
+    SCR_UPD_IVAL = data['SCREEN_UPDATE_INTERVAL']
+    D_SCR_ACT = data['DEBUG_SCREEN_ACTIVE']
+    SCR_TOUT = data['SCREEN_TIMEOUT']
+    T_TEMP = data['TOPIC_TEMP']
+    T_RH = data['TOPIC_RH']
+    T_PRESS = data['TOPIC_PRESSURE']
+    T_GASR = data['TOPIC_GASR']
+    T_IAQ = data['TOPIC_IAQ']
+    T_DP = data['TOPIC_DP']
+    TEMP_THOLD = data['TEMP_TRESHOLD']
+    TEMP_CORR = data['TEMP_CORRECTION']
+    RH_THOLD = data['RH_TRESHOLD']
+    RH_CORR = data['RH_CORRECTION']
+    PRESS_THOLD = data['PRESSURE_TRESHOLD']
+    PRESS_CORR = data['PRESSURE_CORRECTION']
+    DST_B_M = data['DST_BEGIN_M']
+    DST_B_DAY = data['DST_BEGIN_DAY']
+    DST_B_OCC = data['DST_BEGIN_OCC']
+    DST_B_TIME = data['DST_BEGIN_TIME']
+    DST_END_M = data['DST_END_M']
+    DST_END_D = data['DST_END_DAY']
+    DST_END_TIME = data['DST_END_TIME']
+    DST_END_OCC = data['DST_END_OCC']
+    DST_TZONE = data['DST_TIMEZONE']
+except (OSError, ValueError) as er:
+    log_errors("Runtime.json: %s" % er, ELOG.CRITICAL)
     print("Runtime parameters missing. Can not continue!")
     raise
+prof.end()
+# MQTT is woken by new samples, at most once per MQTT_IVAL. Unchanged values are sent again after MQTT_REPUBLISH
+# intervals, a topic which stays silent longer means the node is down
+MQTT_REPUBLISH = 10
+mqtt_sub = bus.subscribe(('temp', 'rh', 'press', 'gas'), min_ms=MQTT_IVAL * 1000,
+                         max_silence_ms=MQTT_REPUBLISH * MQTT_IVAL * 1000)
 
 
-def weekday(year, month, day):
-    # Returns weekday. Thanks to 2DOF @ GitHub
-    t = [0, 3, 2, 5, 0, 3, 5, 1, 4, 6, 2, 4]
-    year -= month < 3
-    return (year + int(year / 4) - int(year / 100) + int(year / 400) + t[month - 1] + day) % 7
-
-
-def resolve_dst():
-    (year, month, mdate, hour, minute, second, wday, yday) = localtime()   # supposed to be GMT/UTC
-    match_d_begin = []
-    match_d_end = []
-    # Define the DST rules for the specified time zone
-    # Replace these rules with the actual DST rules for your time zone
-    dst_rules = {
-        "begin": (DST_B_M, DST_B_DAY, DST_B_OCC, DST_B_TIME),
-        # 3 = March, 2 = last, 6 = Sunday, 3 = 03:00
-        "end": (DST_END_M, DST_END_D, DST_END_OCC, DST_END_TIME),   # DST end  month, day, 1=first, 2=last at 04:00.
-        # 10 = October, 2 = last, 6 = Sunday, 4 = 04:00
-        "timezone": DST_TZONE,          # hours from UTC during normal (winter time)
-        "offset": 1                     # hours to be added to timezone when DST is True
-    }
-    # Iterate begin
-    if dst_rules["begin"][0] in (1, 3, 5, 7, 8, 10, 11):
-        days_in_month = 30
-    else:
-        days_in_month = 31   # February does not matter here
-    # Iterate months and find days matching criteria
-    for x in range(days_in_month):
-        if weekday(year, dst_rules["begin"][0], x) == dst_rules["begin"][1]:
-            if dst_rules["begin"][2] == 2:  # last day first in the list
-                match_d_begin.insert(0, x)
-            else:
-                match_d_begin.append(x)  # first day first in the list
-    dst_begin = mktime((year, dst_rules["begin"][0], match_d_begin[0],
-                        dst_rules["begin"][3], 0, 0, dst_rules["begin"][1], 0))
-    if dst_rules["end"][0] in (1, 3, 5, 7, 8, 10, 11):
-        days_in_month = 30
-    else:
-        days_in_month = 31   # February does not matter here
-    for x in range(days_in_month):
-        if weekday(year, dst_rules["end"][0], x) == dst_rules["end"][1]:
-            if dst_rules["end"][2] == 2:  # last day first in the list
-                match_d_end.insert(0, x)
-            else:
-                match_d_end.append(x)  # first day first in the list
-    dst_end = mktime((year, dst_rules["end"][0], match_d_end[0], dst_rules["end"][3], 0, 0, dst_rules["end"][1], 0))
-    if (mktime(localtime()) < dst_begin) or (mktime(localtime()) > dst_end):
-        return localtime(mktime(localtime()) + 3600 * dst_rules["timezone"])
-    else:
-        return localtime(mktime(localtime()) + (3600 * dst_rules["timezone"]) + (3600 * dst_rules["offset"]))
+# DST transitions are calculated once per year, date strings once per second
+tz = TIMEZONE.TimeZone(DST_TZONE, (DST_B_M, DST_B_DAY, DST_B_OCC, DST_B_TIME),
+                 (DST_END_M, DST_END_D, DST_END_OCC, DST_END_TIME),
+                 weekdays=('Ma', 'Ti', 'Ke', 'To', 'Pe', 'La', 'Su'))
 
 
 def resolve_date():
-    (year, month, mdate, hour, minute, second, wday, yday) = resolve_dst()
-    weekdays = ['Ma', 'Ti', 'Ke', 'To', 'Pe', 'La', 'Su']
-    day = "%s.%s.%s" % (mdate, month, year)
-    hours = "%s:%s:%s" % ("{:02d}".format(hour), "{:02d}".format(minute), "{:02d}".format(second))
-    return day, hours, weekdays[wday]
+    return tz.format_date()
 
 
 class Displ(object):
@@ -295,8 +235,9 @@ async def mqtt_up_loop():
     global client
 
     while net.net_ok is False:
-        gc.collect()
+        mem.idle()
         await asyncio.sleep(5)
+    boot_mark("wifi_up")
 
     if net.net_ok is True:
         config['subs_cb'] = upd_mqtt_stat
@@ -318,6 +259,7 @@ async def mqtt_up_loop():
                 await client.connect()
                 if client.isconnected() is True:
                     mqtt_up = True
+                    boot_mark("mqtt_up")
             except OSError as e:
                 log_errors("MQTT Connect: %s" % e)
                 if D_SCR_ACT == 1:
@@ -356,19 +298,24 @@ async def s_what_i_do():
         if S_MQTT == 1:
             print("   MQTT Connected: %s, broker uptime: %s" % (mqtt_up, bro_uptime))
         print("   Memory free: %s, allocated: %s" % (gc.mem_free(), gc.mem_alloc()))
+        print("   Memory: %s" % mem.stats())
+        print("   Loop: %s" % sup.stats())
+        print("   Error log: %s records, %s filtered, %s flash bytes/record, segment %s" %
+              (elog.records, elog.filtered, elog.bytes_per_record(), elog.seg))
+        print("   Config: snapshot %s bytes, compiled from JSON %s, loaded in %s us" %
+              (data.size, data.compiled, data.load_us))
         print("   Heap info %s, hall sensor %s, raw-temp %sC" % (esp32.idf_heap_info(esp32.HEAP_DATA),
                                                                  esp32.hall_sensor(),
                                                                  "{:.1f}".format(
                                                                      ((float(esp32.raw_temperature()) - 32.0)
                                                                       * 5 / 9))))
+        print("   Sample bus: %s, MQTT %s" % (bus.stats(), mqtt_sub.stats()))
         print("2 ---------SENSOR----------- 2")
         if not BME680_sensor_faulty:
-            if (t_ave is not None) and (rh_ave is not None):
-                print("   Temp: %sC, Rh: %s" % (t_ave, rh_ave))
-            if gas_r_ave is not None:
-                print("   GasR: %s" % (gas_r_ave / 1000))  # kOhms
-            if press_ave is not None:
-                print("   Pressure: %s" % press_ave)
+            print("   Temp: %sC, Rh: %s" % (bus.get('temp'), bus.get('rh')))
+            if bus.get('gas') is not None:
+                print("   GasR: %s" % (bus.get('gas') / 1000))  # kOhms
+            print("   Pressure: %s" % bus.get('press'))
         print("\n")
         await asyncio.sleep(5)
 
@@ -381,31 +328,30 @@ freq(80000000)
 net = WNET.ConnectWiFi(SID1, PWD1, SID2, PWD2, NTPS, DHCP_N, S_WBRPL, WBRPL_PWD)
 
 i2c = SoftI2C(scl=Pin(I2C_SCL_PIN), sda=Pin(I2C_SDA_PIN))
-try:
-    bmes = BSENS.BME680_I2C(i2c=i2c)
-except OSError as e:
-    log_errors("BMES init: %s" % e)
-    raise Exception("Error: %s - BME sensor init error!" % e)
+with boot_phase("bme680_init"):
+    try:
+        bmes = BSENS.BME680_I2C(i2c=i2c)
+    except OSError as e:
+        log_errors("BMES init: %s" % e, ELOG.CRITICAL)
+        raise Exception("Error: %s - BME sensor init error!" % e)
 
 #  OLED display
-try:
-    display = Displ()
-except OSError as e:
-    log_errors("OLED init: %s" % e)
-    raise Exception("Error: %s - OLED Display init error!" % e)
+with boot_phase("oled_init"):
+    try:
+        display = Displ()
+    except OSError as e:
+        log_errors("OLED init: %s" % e, ELOG.CRITICAL)
+        raise Exception("Error: %s - OLED Display init error!" % e)
 
 
 async def read_sens_loop():
-    global t_ave
-    global rh_ave
-    global press_ave
-    global gas_r_ave
     temp_list = []
     rh_list = []
     press_list = []
     gas_r_list = []
     #  Read values from sensor once per second, add them to the array, delete oldest when size 60 (seconds)
     while True:
+        sup.beat('sens')
         try:
             temp_list.append((float(bmes.temperature)) + TEMP_CORR)
             rh_list.append((float(bmes.humidity)) + RH_CORR)
@@ -423,33 +369,38 @@ async def read_sens_loop():
             if len(gas_r_list) >= 60:
                 gas_r_list.pop(0)
             if len(temp_list) > 1:
-                t_ave = round(sum(temp_list) / len(temp_list), 1)
+                bus.publish('temp', round(sum(temp_list) / len(temp_list), 1))
             if len(rh_list) > 1:
-                rh_ave = round(sum(rh_list) / len(rh_list), 1)
+                bus.publish('rh', round(sum(rh_list) / len(rh_list), 1))
             if len(press_list) > 1:
-                press_ave = round(sum(press_list) / len(press_list), 1)
+                bus.publish('press', round(sum(press_list) / len(press_list), 1))
             if len(gas_r_list) > 1:
-                gas_r_ave = round(sum(gas_r_list) / len(gas_r_list), 1)
-            gc.collect()
+                bus.publish('gas', round(sum(gas_r_list) / len(gas_r_list), 1))
+            mem.idle()
             await asyncio.sleep(1)
 
 
 async def mqtt_pub_loop():
-    #  Publish only valid average values.
+    #  Publish only valid and changed average values, wakes up at most once per MQTT_IVAL. Unchanged values are
+    #  repeated after MQTT_REPUBLISH intervals
+    values = (('temp', T_TEMP, -40, 100), ('rh', T_RH, 0, 100), ('press', T_PRESS, 0, 5000),
+              ('gas', T_GASR, -1, float('inf')))
 
     while True:
+        sup.beat('mqtt_pub')
         if mqtt_up is False:
             await asyncio.sleep(10)
-        else:
-            await asyncio.sleep(MQTT_IVAL)
-            if -40 < t_ave < 100:
-                await client.publish(T_TEMP, str(t_ave), retain=0, qos=0)
-                # float to str conversion due to MQTT_AS.py len() issue
-            if 0 < rh_ave < 100:
-                await client.publish(T_RH, str(rh_ave), retain=0, qos=0)
-            if 0 < press_ave < 5000:
-                await client.publish(T_PRESS, str(press_ave), retain=0, qos=0)
-            await client.publish(T_GASR, str(gas_r_ave), retain=0, qos=0)
+        elif await mqtt_sub.wait(30000):
+            for name, topic, min_value, max_value in values:
+                if mqtt_sub.changed(name):
+                    value = bus.get(name)
+                    if value is not None and min_value < value < max_value:
+                        # float to str conversion due to MQTT_AS.py len() issue
+                        await client.publish(topic, str(value), retain=0, qos=0)
+                    mqtt_sub.consumed(name)
+            if not first_pub.is_set():
+                boot_mark("first_publish")
+                first_pub.set()
 
 
 # For MQTT_AS
@@ -467,34 +418,69 @@ client = MQTTClient(config)
 
 async def disp_loop():
     while True:
+        sup.beat('disp')
         await display.rot_180(True)
         await display.txt_to_row("  %s %s" % (resolve_date()[2], resolve_date()[0]), 0, 5)
         await display.txt_to_row("    %s" % resolve_date()[1], 1, 5)
-        await display.txt_to_row("%sC Rh %s %%" % (t_ave, rh_ave), 2, 5)
-        await display.txt_to_row("Pressure:%s" % press_ave, 3, 5)
-        await display.txt_to_row("GasRes:%s" % gas_r_ave, 4, 5)
+        await display.txt_to_row("%sC Rh %s %%" % (bus.get('temp', 0), bus.get('rh', 0)), 2, 5)
+        await display.txt_to_row("Pressure:%s" % bus.get('press', 0), 3, 5)
+        await display.txt_to_row("GasRes:%s" % bus.get('gas', 0), 4, 5)
         await display.txt_to_row("MCU Temp:%s " % (("{:.1f}".format((
                 (float(esp32.raw_temperature()) - 32.0) * 5 / 9)))), 5, 5)
         await display.act_scr()
         await asyncio.sleep(1)
 
 
+async def fwd_errs(text):
+    # Error log forwarder, records not sent while MQTT is down are kept only on flash
+    if mqtt_up is False:
+        raise OSError("MQTT down")
+    await client.publish(TOPIC_ERR, text, retain=0, qos=0)
+
+
+async def boot_report():
+    # Boot timeline to /boottime.csv (and MQTT if TOPIC_BOOT is set) after the first publish or 2 minutes
+    try:
+        await asyncio.wait_for(first_pub.wait(), 120)
+    except asyncio.TimeoutError:
+        pass
+    prof.save()
+    if D_SCR_ACT == 1:
+        prof.dump()
+    if mqtt_up and TOPIC_BOOT is not None:
+        await prof.publish(client, TOPIC_BOOT)
+
+
+# Lag monitor and task heartbeats, this node has no hardware WDT: stale tasks are logged and kept in RTC memory
+sup = SUP.Supervisor(log_fn=log_errors)
+
+
 async def main():
     loop = asyncio.get_event_loop()
+    loop.create_task(sup.run())
+    prev = sup.last_reset()
+    if prev is not None:
+        log_errors("Previous reset: %s" % prev, ELOG.WARNING)
     if S_NET == 1:
         loop.create_task(net.net_upd_loop())
     if D_SCR_ACT == 1:
+        mem.probe_every = 10  # Largest free block in the debug output, costs collections
         loop.create_task(s_what_i_do())
     if S_MQTT == 1:
         loop.create_task(mqtt_up_loop())
-        loop.create_task(mqtt_pub_loop())
-    loop.create_task(read_sens_loop())
-    loop.create_task(disp_loop())
+        sup.register('mqtt_pub', MQTT_IVAL + 60, task=loop.create_task(mqtt_pub_loop()))
+    sup.register('sens', 30, task=loop.create_task(read_sens_loop()))
+    sup.register('disp', 60, task=loop.create_task(disp_loop()))
+    if S_MQTT == 1:
+        elog.forward = fwd_errs
+    loop.create_task(elog.flush_loop())
+    loop.create_task(mem.run())
+    loop.create_task(boot_report())
     loop.run_forever()
 
 if __name__ == "__main__":
     try:
         asyncio.run(main())
     except MemoryError as e:
-        log_errors(e)
+        log_errors(e, ELOG.CRITICAL)
         reset()
@@ -0,0 +1,124 @@
+"""
+Strip chart for ILI9341 using vertical scrolling (VSCRDEF/VSCRSADD).
+
+In landscape rotation the panel scroll lines are screen columns, so each new sample is one column block
+(display height * 2 bytes) written over the oldest column, followed by a scroll start address update.
+Full redraw happens only in show(). History is kept in array('H') rings, one per trace, 0xFFFF = no data.
+
+Each trace is stacked in its own horizontal band:
+    traces = (('red', 400, 2000, 1, 0),      # colour, min, max, scale, offset. Stored = int((value + offset) * scale)
+              ('navy', 0, 100, 1, 0),
+              ('blue', 10, 35, 10, 40))
+    chart = StripChart(display, colours, traces)
+    chart.add((co2, pm2_5, temp))
+    await chart.show() ... chart.hide()
+
+If the chart runs in the wrong direction with your panel/rotation, use mirror=True.
+"""
+from array import array
+
+NO_DATA = 0xFFFF
+
+
+class StripChart(object):
+
+    def __init__(self, display, colours, traces, bckg='black', grid='white', top=0, bottom=0, mirror=False):
+        self.d = display
+        self.cols = colours
+        self.bckg = bckg
+        self.grid = grid
+        self.traces = traces
+        self.top = top
+        self.bottom = bottom
+        self.mirror = mirror
+        self.lines = max(display.width, display.height)  # ILI9341 scrolls always 320 lines
+        self.w = self.lines - top - bottom
+        self.h = display.height
+        self.band_h = self.h // len(traces)
+        self.hist = [array('H', [NO_DATA] * self.w) for _ in traces]
+        self.head = 0  # Next slot to write
+        self.count = 0
+        self.col = bytearray(self.h * 2)  # One column of pixels
+        self.bg_col = self.cols[bckg].to_bytes(2, 'big') * self.h
+        self.active = False
+
+    def add(self, values):
+        """ Store one sample per trace, draw one column if chart is on the screen """
+        h = self.head
+        for t, value in enumerate(values):
+            if value is None:
+                self.hist[t][h] = NO_DATA
+            else:
+                _, _, _, scale, offset = self.traces[t]
+                enc = int((value + offset) * scale)
+                self.hist[t][h] = min(max(enc, 0), NO_DATA - 1)
+        if self.active:
+            self._draw_column(h, self.count > 0)
+        self.head = (h + 1) % self.w
+        if self.count < self.w:
+            self.count += 1
+        if self.active:
+            self._scroll()
+
+    async def show(self):
+        """ Define scroll area and draw whole history once, yielding as display slice_ms allows """
+        self.d.set_scroll(self.top, self.bottom)
+        self.d.begin_slice()
+        for i in range(self.w):
+            self._draw_column(i, (i != self.head) and (self.count > 1))
+            await self.d.yield_slice()
+        self.d.end_slice()
+        self._scroll()
+        self.active = True
+
+    def hide(self):
+        """ Restore normal addressing, caller repaints the screen """
+        self.active = False
+        self.d.set_scroll(0, 0)
+        self.d.scroll(0)
+
+    def _mem_line(self, i):
+        if self.mirror:
+            return self.top + self.w - 1 - i
+        return self.top + i
+
+    def _scroll(self):
+        newest = (self.head - 1) % self.w
+        if self.mirror:
+            self.d.scroll(self._mem_line(newest))
+        else:
+            self.d.scroll(self._mem_line(self.head))
+
+    def _band_y(self, t, enc):
+        _, v_min, v_max, scale, offset = self.traces[t]
+        lo = (v_min + offset) * scale
+        hi = (v_max + offset) * scale
+        enc = min(max(enc, lo), hi)
+        # Band top is max value, band bottom is min value. 1 pixel separator line on top of each band
+        return t * self.band_h + 1 + int((hi - enc) * (self.band_h - 2) / (hi - lo))
+
+    def _draw_column(self, i, use_prev):
+        buf = self.col
+        buf[:] = self.bg_col
+        g_msb, g_lsb = self.cols[self.grid].to_bytes(2, 'big')
+        prev = (i - 1) % self.w
+        for t in range(len(self.traces)):
+            y_sep = t * self.band_h
+            buf[y_sep * 2] = g_msb
+            buf[y_sep * 2 + 1] = g_lsb
+            enc = self.hist[t][i]
+            if enc == NO_DATA:
+                continue
+            y1 = y0 = self._band_y(t, enc)
+            if use_prev and self.hist[t][prev] != NO_DATA:
+                y0 = self._band_y(t, self.hist[t][prev])
+            if y0 > y1:
+                y0, y1 = y1, y0
+            msb, lsb = self.cols[self.traces[t][0]].to_bytes(2, 'big')
+            for y in range(y0, y1 + 1):
+                buf[y * 2] = msb
+                buf[y * 2 + 1] = lsb
+        x = self._mem_line(i)
+        if self.mirror:
+            x = self.lines - 1 - x
+        self.d.block(x, 0, x, self.h - 1, buf)
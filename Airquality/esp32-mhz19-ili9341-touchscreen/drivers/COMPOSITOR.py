@@ -0,0 +1,104 @@
+"""
+Dirty-rectangle compositor for ILI9341 text screens.
+
+Screen is a set of text widgets, each with a fixed bounding box. Widget is repainted only when its text or colour
+changes, and only inside its own box. The border is repainted only when the alarm state flips, the interior only
+when the screen is invalidated. Full screen fill is about 300 KB over SPI, one changed row is about 15 KB.
+Drawing uses the display's async methods, so the event loop is not blocked longer than display slice_ms.
+
+Usage:
+    comp = Compositor(display, font, colours)
+    row = comp.add(12, 25, 296, 24)
+    row.set("CO2: 650 ppm", 'blue')
+    await comp.render(all_ok)
+    print(comp.frame_bytes)   # bytes pushed to the display during last render()
+"""
+
+
+class TextWidget(object):
+    """ One text row with fixed bounding box """
+
+    def __init__(self, x, y, w, h):
+        self.x = x
+        self.y = y
+        self.w = w
+        self.h = h
+        self.text = None
+        self.colour = None
+        self.dirty = True
+        self.drawn_w = 0  # width in pixels of the text currently on the screen
+
+    def set(self, text, colour):
+        if (text != self.text) or (colour != self.colour):
+            self.text = text
+            self.colour = colour
+            self.dirty = True
+
+
+class Compositor(object):
+    """ Tracks changed widgets and repaints only their rectangles """
+
+    def __init__(self, display, font, colours, border=10, bckg='light_green', ok_col='yellow', err_col='red'):
+        self.d = display
+        self.font = font
+        self.cols = colours
+        self.border = border
+        self.bckg = bckg
+        self.ok_col = ok_col
+        self.err_col = err_col
+        self.widgets = []
+        self.all_ok = None  # unknown until first render, border drawn then
+        self.full = True
+        self.frames = 0
+        self.frame_bytes = 0
+        self.max_frame_bytes = 0
+
+    def add(self, x, y, w, h):
+        widget = TextWidget(x, y, w, h)
+        self.widgets.append(widget)
+        return widget
+
+    def invalidate(self):
+        """ Next render() repaints the whole screen """
+        self.full = True
+
+    async def render(self, all_ok=True):
+        start = self.d.tx_bytes
+        self.d.begin_slice()
+        b = self.border
+        w = self.d.width
+        h = self.d.height
+        if self.full:
+            await self.d.fill_rectangle_async(b, b, w - 2 * b, h - 2 * b, self.cols[self.bckg])
+            for widget in self.widgets:
+                widget.dirty = True
+                widget.drawn_w = 0
+        if self.full or (all_ok is not self.all_ok):
+            col = self.cols[self.ok_col] if all_ok else self.cols[self.err_col]
+            await self.d.fill_rectangle_async(0, 0, w, b, col)
+            await self.d.fill_rectangle_async(0, h - b, w, b, col)
+            await self.d.fill_rectangle_async(0, b, b, h - 2 * b, col)
+            await self.d.fill_rectangle_async(w - b, b, b, h - 2 * b, col)
+            self.all_ok = all_ok
+        for widget in self.widgets:
+            if widget.dirty:
+                await self._paint(widget)
+        self.d.end_slice()
+        self.full = False
+        self.frames += 1
+        self.frame_bytes = self.d.tx_bytes - start
+        if self.frame_bytes > self.max_frame_bytes:
+            self.max_frame_bytes = self.frame_bytes
+        return self.frame_bytes
+
+    async def _paint(self, widget):
+        bckg = self.cols[self.bckg]
+        text = widget.text if widget.text is not None else ""
+        if len(text) > 0:
+            await self.d.draw_text_async(widget.x, widget.y, text, self.font, self.cols[widget.colour], bckg)
+        new_w = min(self.font.measure_text(text), widget.w)
+        if widget.drawn_w > new_w:
+            # Erase tail of the previous, longer text
+            await self.d.fill_rectangle_async(widget.x + new_w, widget.y, widget.drawn_w - new_w, widget.h, bckg)
+        widget.drawn_w = new_w
+        widget.dirty = False
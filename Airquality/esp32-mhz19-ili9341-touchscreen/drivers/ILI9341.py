@@ -1,12 +1,17 @@
 # Source https://github.com/rdagger/micropython-ili9341/blob/master/ili9341.py
 # Jari Hiltunen 20.01.2020 from micropython import const, is more or less cosmetic change
 # Removed a few subs to save memory
+# Added async variants (clear_async, fill_*_async, block_async, draw_text_async) which transfer in
+# chunks and yield to uasyncio when slice_ms is used, so that UART readers are not starved.
 
 """ILI9341 LCD/Touch module."""
 from time import sleep
 from math import cos, sin, pi, radians
 from sys import implementation
 from micropython import const
+from array import array
+from utime import ticks_us, ticks_diff
+import uasyncio as asyncio
 import ustruct
 
 
@@ -84,7 +89,7 @@ class Display(object):
     }
 
     def __init__(self, spi, cs, dc, rst,
-                 width=240, height=320, rotation=0):
+                 width=240, height=320, rotation=0, slice_ms=5):
         """Initialize OLED.
         Args:
             spi (Class Spi):  SPI interface for OLED
@@ -94,6 +99,7 @@ class Display(object):
             width (Optional int): Screen width (default 240)
             height (Optional int): Screen height (default 320)
             rotation (Optional int): Rotation must be 0 default, 90. 180 or 270
+            slice_ms (Optional int): Max time async methods transfer before yielding (default 5)
         """
         self.spi = spi
         self.cs = cs
@@ -101,6 +107,16 @@ class Display(object):
         self.rst = rst
         self.width = width
         self.height = height
+        self.tx_bytes = 0  # Data bytes pushed to the display, used for frame cost statistics
+        self.blocks = 0  # Address window + RAM write transactions
+        self._xmin = None  # Polygon span tables, allocated on first use
+        self._xmax = None
+        # Cooperative transfers
+        self.slice_us = slice_ms * 1000
+        self.slice_start = ticks_us()
+        self.slice_depth = 0
+        self.yields = 0
+        self.max_busy_us = 0  # Longest time async methods kept the event loop
         if rotation not in self.ROTATE.keys():
             raise RuntimeError('Rotation must be 0, 90, 180 or 270.')
         else:
@@ -156,6 +172,53 @@ class Display(object):
 
         self.write_cmd(self.WRITE_RAM)
         self.write_data(data)
+        self.blocks += 1
+
+    async def block_async(self, x0, y0, x1, y1, data):
+        """Write a block of data to display in row aligned chunks, yielding between chunks.
+        Args:
+            x0 (int):  Starting X position.
+            y0 (int):  Starting Y position.
+            x1 (int):  Ending X position.
+            y1 (int):  Ending Y position.
+            data (bytes): Data buffer to write.
+        """
+        row_bytes = (x1 - x0 + 1) * 2
+        rows = max(1, 1024 // row_bytes)
+        mv = memoryview(data)
+        y = y0
+        self.begin_slice()
+        while y <= y1:
+            r = min(rows, y1 - y + 1)
+            start = (y - y0) * row_bytes
+            self.block(x0, y, x1, y + r - 1, mv[start:start + r * row_bytes])
+            y += r
+            await self.yield_slice()
+        self.end_slice()
+
+    def begin_slice(self):
+        """Start a new time slice for async methods. Nested calls continue the outer slice."""
+        if self.slice_depth == 0:
+            self.slice_start = ticks_us()
+        self.slice_depth += 1
+
+    async def yield_slice(self):
+        """Yield to the scheduler if the current time slice is used."""
+        busy = ticks_diff(ticks_us(), self.slice_start)
+        if busy >= self.slice_us:
+            if busy > self.max_busy_us:
+                self.max_busy_us = busy
+            await asyncio.sleep_ms(0)
+            self.yields += 1
+            self.slice_start = ticks_us()
+
+    def end_slice(self):
+        """Account time used after the last yield."""
+        self.slice_depth -= 1
+        if self.slice_depth == 0:
+            busy = ticks_diff(ticks_us(), self.slice_start)
+            if busy > self.max_busy_us:
+                self.max_busy_us = busy
 
     def cleanup(self):
         """Clean up resources."""
@@ -179,6 +242,23 @@ class Display(object):
         for y in range(0, h, 8):
             self.block(0, y, w - 1, y + 7, line)
 
+    async def clear_async(self, color=0):
+        """Clear display, yielding between 1024 byte blocks.
+        Args:
+            color (Optional int): RGB565 color value (Default: 0 = Black).
+        """
+        w = self.width
+        h = self.height
+        if color:
+            line = color.to_bytes(2, 'big') * (w * 8)
+        else:
+            line = bytearray(w * 16)
+        self.begin_slice()
+        for y in range(0, h, 8):
+            self.block(0, y, w - 1, y + 7, line)
+            await self.yield_slice()
+        self.end_slice()
+
     def display_off(self):
         """Turn display off."""
         self.write_cmd(self.DISPLAY_OFF)
@@ -233,7 +313,7 @@ class Display(object):
         return w, h
 
     def draw_line(self, x1, y1, x2, y2, color):
-        """Draw a line using Bresenham's algorithm.
+        """Draw a line using Bresenham's algorithm, pixels batched to runs.
         Args:
             x1, y1 (int): Starting coordinates of the line
             x2, y2 (int): Ending coordinates of the line
@@ -270,21 +350,24 @@ class Display(object):
             y1, y2 = y2, y1
         # Recalculate differentials
         dx = x2 - x1
-        dy = y2 - y1
+        dy = abs(y2 - y1)
         # Calculate error
         error = dx >> 1
         ystep = 1 if y1 < y2 else -1
         y = y1
+        run = x1  # Start of current run of pixels on the same row (column if steep)
         for x in range(x1, x2 + 1):
-            # Had to reverse HW ????
-            if not is_steep:
-                self.draw_pixel(x, y, color)
-            else:
-                self.draw_pixel(y, x, color)
-            error -= abs(dy)
-            if error < 0:
-                y += ystep
-                error += dx
+            error -= dy
+            if error < 0 or x == x2:
+                # Send whole run as one block instead of pixel by pixel
+                if is_steep:
+                    self.draw_vline(y, run, x - run + 1, color)
+                else:
+                    self.draw_hline(run, y, x - run + 1, color)
+                run = x + 1
+                if error < 0:
+                    y += ystep
+                    error += dx
 
     def draw_lines(self, coords, color):
         """Draw multiple lines.
@@ -368,6 +451,27 @@ class Display(object):
                 # # Position x for next letter
                 # x += w + spacing
 
+    async def draw_text_async(self, x, y, text, font, color, background=0,
+                              landscape=False, spacing=1):
+        """Draw text, yielding between letters. Arguments as in draw_text()."""
+        self.begin_slice()
+        for letter in text:
+            w, h = self.draw_letter(x, y, letter, font, color, background,
+                                    landscape)
+            if w == 0 or h == 0:
+                print('Invalid width {0} or height {1}'.format(w, h))
+                break
+            if landscape:
+                if spacing:
+                    self.fill_hrect(x, y - w - spacing, h, spacing, background)
+                y -= (w + spacing)
+            else:
+                if spacing:
+                    self.fill_hrect(x + w, y, spacing, h, background)
+                x += (w + spacing)
+            await self.yield_slice()
+        self.end_slice()
+
     def draw_vline(self, x, y, h, color):
         """Draw a vertical line.
         Args:
@@ -377,7 +481,7 @@ class Display(object):
             color (int): RGB565 color value.
         """
         # Confirm coordinates in boundary
-        if self.is_off_grid(x, y, x, y + h):
+        if self.is_off_grid(x, y, x, y + h - 1):
             return
         line = color.to_bytes(2, 'big') * h
         self.block(x, y, x, y + h - 1, line)
@@ -411,6 +515,47 @@ class Display(object):
                        x + w - 1, chunk_y + remainder - 1,
                        buf)
 
+    async def fill_hrect_async(self, x, y, w, h, color):
+        """Async fill_hrect(), yields between 1024 byte chunks."""
+        if self.is_off_grid(x, y, x + w - 1, y + h - 1):
+            return
+        chunk_height = max(1, 1024 // (w * 2))
+        buf = color.to_bytes(2, 'big') * (chunk_height * w)
+        mv = memoryview(buf)
+        chunk_y = y
+        end_y = y + h
+        self.begin_slice()
+        while chunk_y < end_y:
+            r = min(chunk_height, end_y - chunk_y)
+            self.block(x, chunk_y, x + w - 1, chunk_y + r - 1, mv[:r * w * 2])
+            chunk_y += r
+            await self.yield_slice()
+        self.end_slice()
+
+    async def fill_vrect_async(self, x, y, w, h, color):
+        """Async fill_vrect(), yields between 1024 byte chunks."""
+        if self.is_off_grid(x, y, x + w - 1, y + h - 1):
+            return
+        chunk_width = max(1, 1024 // (h * 2))
+        buf = color.to_bytes(2, 'big') * (chunk_width * h)
+        mv = memoryview(buf)
+        chunk_x = x
+        end_x = x + w
+        self.begin_slice()
+        while chunk_x < end_x:
+            c = min(chunk_width, end_x - chunk_x)
+            self.block(chunk_x, y, chunk_x + c - 1, y + h - 1, mv[:c * h * 2])
+            chunk_x += c
+            await self.yield_slice()
+        self.end_slice()
+
+    async def fill_rectangle_async(self, x, y, w, h, color):
+        """Async fill_rectangle()."""
+        if w > h:
+            await self.fill_hrect_async(x, y, w, h, color)
+        else:
+            await self.fill_vrect_async(x, y, w, h, color)
+
     def fill_rectangle(self, x, y, w, h, color):
         """Draw a filled rectangle.
         Args:
@@ -439,74 +584,81 @@ class Display(object):
             The center point is the center of the x0,y0 pixel.
             Since pixels are not divisible, the radius is integer rounded
             up to complete on a full pixel.  Therefore diameter = 2 x r + 1.
+            Edges are rasterised into preallocated min/max span tables,
+            rows with identical spans are sent as one rectangle block.
         """
-        # Determine side coordinates
-        coords = []
+        xmin, xmax = self._span_tables()
         theta = radians(rotate)
-        n = sides + 1
-        for s in range(n):
-            t = 2.0 * pi * s / sides + theta
-            coords.append([int(r * cos(t) + x0), int(r * sin(t) + y0)])
-        # Starting point
-        x1, y1 = coords[0]
-        # Minimum Maximum X dict
-        xdict = {y1: [x1, x1]}
-        # Iterate through coordinates
-        for row in coords[1:]:
-            x2, y2 = row
-            xprev, yprev = x2, y2
-            # Calculate perimeter
-            # Check for horizontal side
-            if y1 == y2:
-                if x1 > x2:
-                    x1, x2 = x2, x1
-                if y1 in xdict:
-                    xdict[y1] = [min(x1, xdict[y1][0]), max(x2, xdict[y1][1])]
-                else:
-                    xdict[y1] = [x1, x2]
-                x1, y1 = xprev, yprev
-                continue
-            # Non horizontal side
-            # Changes in x, y
-            dx = x2 - x1
-            dy = y2 - y1
-            # Determine how steep the line is
-            is_steep = abs(dy) > abs(dx)
-            # Rotate line
+        # Determine side coordinates, last one closes the polygon
+        px = [int(r * cos(2.0 * pi * s / sides + theta) + x0) for s in range(sides + 1)]
+        py = [int(r * sin(2.0 * pi * s / sides + theta) + y0) for s in range(sides + 1)]
+        y_lo = max(0, min(py))
+        y_hi = min(self.height - 1, max(py))
+        for y in range(y_lo, y_hi + 1):
+            xmin[y] = 32767
+            xmax[y] = -32768
+        for s in range(sides):
+            self._edge_spans(px[s], py[s], px[s + 1], py[s + 1], xmin, xmax)
+        self._fill_spans(y_lo, y_hi, xmin, xmax, color)
+
+    def _span_tables(self):
+        """Return preallocated per scanline min/max x tables."""
+        if self._xmin is None:
+            self._xmin = array('h', [0] * self.height)
+            self._xmax = array('h', [0] * self.height)
+        return self._xmin, self._xmax
+
+    def _edge_spans(self, x1, y1, x2, y2, xmin, xmax):
+        """Walk polygon edge with Bresenham and widen scanline spans."""
+        h = self.height
+        is_steep = abs(y2 - y1) > abs(x2 - x1)
+        # Rotate line
+        if is_steep:
+            x1, y1 = y1, x1
+            x2, y2 = y2, x2
+        # Swap start and end points if necessary
+        if x1 > x2:
+            x1, x2 = x2, x1
+            y1, y2 = y2, y1
+        dx = x2 - x1
+        dy = abs(y2 - y1)
+        error = dx >> 1
+        ystep = 1 if y1 < y2 else -1
+        y = y1
+        for x in range(x1, x2 + 1):
             if is_steep:
-                x1, y1 = y1, x1
-                x2, y2 = y2, x2
-            # Swap start and end points if necessary
-            if x1 > x2:
-                x1, x2 = x2, x1
-                y1, y2 = y2, y1
-            # Recalculate differentials
-            dx = x2 - x1
-            dy = y2 - y1
-            # Calculate error
-            error = dx >> 1
-            ystep = 1 if y1 < y2 else -1
-            y = y1
-            # Calcualte minimum and maximum x values
-            for x in range(x1, x2 + 1):
-                if is_steep:
-                    if x in xdict:
-                        xdict[x] = [min(y, xdict[x][0]), max(y, xdict[x][1])]
-                    else:
-                        xdict[x] = [y, y]
-                else:
-                    if y in xdict:
-                        xdict[y] = [min(x, xdict[y][0]), max(x, xdict[y][1])]
-                    else:
-                        xdict[y] = [x, x]
-                error -= abs(dy)
-                if error < 0:
-                    y += ystep
-                    error += dx
-            x1, y1 = xprev, yprev
-        # Fill polygon
-        for y, x in xdict.items():
-            self.draw_hline(x[0], y, x[1] - x[0] + 2, color)
+                if 0 <= x < h:
+                    if y < xmin[x]:
+                        xmin[x] = y
+                    if y > xmax[x]:
+                        xmax[x] = y
+            elif 0 <= y < h:
+                if x < xmin[y]:
+                    xmin[y] = x
+                if x > xmax[y]:
+                    xmax[y] = x
+            error -= dy
+            if error < 0:
+                y += ystep
+                error += dx
+
+    def _fill_spans(self, y_lo, y_hi, xmin, xmax, color):
+        """Send spans, merging consecutive rows with equal span to one block.
+        Spans reach one pixel past the right edge like the original dict based fill.
+        """
+        w = self.width
+        y = y_lo
+        while y <= y_hi:
+            a = max(0, xmin[y])
+            b = min(w - 1, xmax[y] + 1)
+            if a > b:
+                y += 1
+                continue
+            y2 = y + 1
+            while y2 <= y_hi and max(0, xmin[y2]) == a and min(w - 1, xmax[y2] + 1) == b:
+                y2 += 1
+            self.fill_rectangle(a, y, b - a + 1, y2 - y, color)
+            y = y2
 
     def fill_vrect(self, x, y, w, h, color):
         """Draw a filled rectangle (optimized for vertical drawing).
@@ -593,10 +745,12 @@ class Display(object):
         Args:
             top (int): Height of top scroll margin
             bottom (int): Height of bottom scroll margin
+        Note:
+            Scrolling is along the panel's 320 lines, which are columns in landscape rotation.
         """
-        if top + bottom <= self.height:
-            middle = self.height - (top + bottom)
-            print(top, middle, bottom)
+        lines = max(self.width, self.height)
+        if top + bottom <= lines:
+            middle = lines - (top + bottom)
             self.write_cmd(self.VSCRDEF,
                            top >> 8,
                            top & 0xFF,
@@ -646,6 +800,7 @@ class Display(object):
         self.cs(0)
         self.spi.write(data)
         self.cs(1)
+        self.tx_bytes += len(data)
 
     def write_data_cpy(self, data):
         """Write data to OLED (CircuitPython).
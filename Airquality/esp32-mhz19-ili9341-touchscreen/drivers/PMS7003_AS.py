@@ -0,0 +1,25 @@
+"""
+  19.01.2020: Jari Hiltunen
+
+  Original https://github.com/pkucmus/micropython-pms7003/blob/master/pms7003.py
+  Modified for asyncronous StreamReader  16.01.2020 by Divergentti / Jari Hiltunen
+
+  Add loop into your code loop.create_task(objectname.read_async_loop())
+
+  19.10.2026: PMS7003 uses the same Plantower protocol as PMS9103M, PSensorPMS7003 is the PMS class of
+  PMS9103M_AS with the old defaults (UART1, rx 32, tx 33). Passive mode duty cycling (duty=True) and the
+  statistics are described there, with duty=True call await objectname.init() before the loop.
+
+"""
+
+try:
+    from PMS9103M_AS import PMS
+except ImportError:
+    from drivers.PMS9103M_AS import PMS
+
+
+class PSensorPMS7003(PMS):
+
+    #  Default UART1, rx=32, tx=33. Don't use UART0 if you want to use REPL!
+    def __init__(self, rxpin=32, txpin=33, uart=1, **kwargs):
+        super().__init__(rxpin=rxpin, txpin=txpin, uart=uart, **kwargs)
@@ -1,9 +1,15 @@
 # Source https://github.com/rdagger/micropython-ili9341/blob/master/xpt2046.py
 """XPT2046 Touch module.
 Added self.pressed due to fact irq handler is too slow.
+
+Asynchronous operation: IRQ handler only sets ThreadSafeFlag. touch_loop() does SPI sampling with median and
+deviation filter, debounces with asyncio sleeps and queues events. UI awaits get_event().
+Add loop into your code loop.create_task(objectname.touch_loop())
 """
 from time import sleep
 from micropython import const
+from utime import ticks_ms, ticks_diff
+import uasyncio as asyncio
 
 
 class Touch(object):
@@ -21,7 +27,8 @@ class Touch(object):
 
     def __init__(self, spi, cs, int_pin=None, int_handler=None,
                  width=240, height=320,
-                 x_min=100, x_max=1962, y_min=100, y_max=1900):
+                 x_min=100, x_max=1962, y_min=100, y_max=1900,
+                 samples=5, debounce_ms=100, max_events=4):
         """Initialize touch screen controller.
         Args:
             spi (Class Spi):  SPI interface for OLED
@@ -34,6 +41,9 @@ class Touch(object):
             x_max (int): Maximum x coordinate
             y_min (int): Minimum Y coordinate
             y_max (int): Maximum Y coordinate
+            samples (int): Samples per touch for median filter
+            debounce_ms (int): Debounce time in milliseconds
+            max_events (int): Touch event queue length, oldest dropped
         """
         self.spi = spi
         self.cs = cs
@@ -53,14 +63,31 @@ class Touch(object):
         self.y_add = y_min * -self.y_multiplier
         # Calculate time pressed
         self.pressed = False
+        # Asynchronous pipeline
+        self.samples = samples
+        self.debounce_ms = debounce_ms
+        self.max_events = max_events
+        self.s_x = [0] * samples
+        self.s_y = [0] * samples
+        self.events = []  # (x, y, irq ticks_ms)
+        self.ev = asyncio.Event()
+        self.irq_flag = asyncio.ThreadSafeFlag()
+        self.irq_ticks = 0
+        # Statistics
+        self.wakeups = 0
+        self.touches = 0
+        self.rejected = 0
+        self.dropped = 0
+        self.last_latency = None  # IRQ to consumer, ms
+        self.max_latency = 0
+        self.int_handler = int_handler
+        self.int_pin = None
 
         if int_pin is not None:
             self.int_pin = int_pin
             self.int_pin.init(int_pin.IN)
-            self.int_handler = int_handler
             self.int_locked = False
-            int_pin.irq(trigger=int_pin.IRQ_FALLING | int_pin.IRQ_RISING,
-                        handler=self.int_press)
+            int_pin.irq(trigger=int_pin.IRQ_FALLING, handler=self.int_press)
 
     def get_touch(self):
         """Take multiple samples to get accurate touch reading."""
@@ -92,20 +119,79 @@ class Touch(object):
         return None
 
     def int_press(self, pin):
-        """Send X,Y values to passed interrupt handler."""
-        self.pressed = True
-        if not pin.value() and not self.int_locked:
+        """IRQ handler. No SPI, no sleeps, only timestamp and wake up touch_loop()."""
+        if not self.int_locked:
+            self.irq_ticks = ticks_ms()
+            self.irq_flag.set()
+
+    async def touch_loop(self):
+        """Sample, filter and queue touches. Sends X,Y values to passed interrupt handler too."""
+        while True:
+            await self.irq_flag.wait()
+            self.wakeups += 1
+            if self.int_pin.value():
+                continue  # Bounce, already released
             self.int_locked = True  # Lock Interrupt
-            buff = self.raw_touch()
-
-            if buff is not None:
-                x, y = self.normalize(*buff)
-                self.int_handler(x, y)
-            sleep(.1)  # Debounce falling edge
-        elif pin.value() and self.int_locked:
-            sleep(.1)  # Debounce rising edge
+            self.pressed = True
+            t_irq = self.irq_ticks
+            xy = await self.get_touch_async()
+            if xy is None:
+                self.rejected += 1
+            else:
+                self.touches += 1
+                if len(self.events) >= self.max_events:
+                    self.events.pop(0)
+                    self.dropped += 1
+                self.events.append((xy[0], xy[1], t_irq))
+                self.ev.set()
+                if self.int_handler is not None:
+                    self.int_handler(*xy)
+            # Debounce: wait release and settle without blocking the loop
+            while not self.int_pin.value():
+                await asyncio.sleep_ms(self.debounce_ms)
+            await asyncio.sleep_ms(self.debounce_ms)
+            self.pressed = False
             self.int_locked = False  # Unlock interrupt
 
+    async def get_event(self):
+        """Await next touch event.
+        Returns:
+            tuple(int, int): Normalized X, Y
+        """
+        while not self.events:
+            self.ev.clear()
+            await self.ev.wait()
+        x, y, t_irq = self.events.pop(0)
+        self.last_latency = ticks_diff(ticks_ms(), t_irq)
+        if self.last_latency > self.max_latency:
+            self.max_latency = self.last_latency
+        return x, y
+
+    async def get_touch_async(self, timeout_ms=500):
+        """Non-blocking get_touch(): median of samples, rejected if deviation too high.
+        Returns:
+            tuple(int, int): Normalized X, Y or None
+        """
+        n = 0
+        start = ticks_ms()
+        while (n < self.samples) and (ticks_diff(ticks_ms(), start) < timeout_ms):
+            if (self.int_pin is not None) and self.int_pin.value():
+                return None  # Released before enough samples
+            sample = self.raw_touch()
+            if sample is not None:
+                self.s_x[n], self.s_y[n] = sample
+                n += 1
+            await asyncio.sleep_ms(5)
+        if n < self.samples:
+            return None
+        med_x = sorted(self.s_x)[n // 2]
+        med_y = sorted(self.s_y)[n // 2]
+        dev = 0
+        for i in range(n):
+            dev += (self.s_x[i] - med_x) ** 2 + (self.s_y[i] - med_y) ** 2
+        if dev / n > 50:  # Deviation should be under margin of 50
+            return None
+        return self.normalize(med_x, med_y)
 
     def normalize(self, x, y):
         """Normalize mean X,Y values to match LCD screen."""
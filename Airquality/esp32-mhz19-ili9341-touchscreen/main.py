@@ -8,175 +8,146 @@ Partly asynchronous. Due to memory leakage MQTT_AS.py is not used!
 
 Updated: 8.6.2023: Jari Hiltunen
 """
+from drivers.BOOTPROF import boot_phase, boot_mark, prof
+from drivers.MEMMGR_AS import mem
+prof.begin("imports")
 from machine import SPI, SoftI2C, Pin, freq, reset, reset_cause
 import uasyncio as asyncio
-from utime import time, mktime, localtime, sleep
+from utime import time, sleep
 from drivers.XPT2046 import Touch
 from drivers.ILI9341 import Display, color565
 from drivers.XGLCD_FONT import XglcdFont
+from drivers.COMPOSITOR import Compositor
+from drivers.CHART import StripChart
 import gc
-gc.collect()
-gc.threshold(gc.mem_free() // 4 + gc.mem_alloc())
+mem.collect()
 from drivers.SIMPLE import MQTTClient
 import network
-from drivers.AQI import AQI
+from drivers.AQI import AQI, NowCast
 import drivers.PMS7003_AS as PARTICLES
 import drivers.MHZ19B_AS as CO2
 import drivers.BME280_float as BmE
-gc.collect()
-gc.threshold(gc.mem_free() // 4 + gc.mem_alloc())
-from json import load
+import drivers.TIMEZONE as TIMEZONE
+mem.collect()
 import esp
 import esp32
 import drivers.WIFICONN_AS as WIFINET
+import drivers.RUNCONF as RUNCONF
+import drivers.EVENTLOG_AS as ELOG
+import drivers.SUPERVISOR_AS as SUP
+import drivers.DEVINIT_AS as DEVINIT
+from drivers.SAMPLEBUS_AS import bus
+prof.end()
 b_upt = 0
-BME280_f = False
-temp_avg = None
-rh_avg = None
-press_avg = None
-PMS7003_f = False
-MHZ19_f = False
-scr_f = False
-last_update =  time()
-
-def log_errors(errin):
-    filename = "/errors.csv"
-    with open(filename, 'a+') as logf:
-        try:
-            logf.write("%s" % str(resolve_date()[0]))  # Date in local format
-            logf.write(",")
-            logf.write("%s" % str(errin))
-            logf.write("\r\n")
-        except OSError as e:
-            print('OSError %s' % e)
-            raise OSError
-    logf.close()
+pms = None
+aq = None
+co2s = None
+bmes = None
+first_pub = asyncio.Event()
+
+# Fixed size records in RAM ring, flush_loop() appends them to rotating /errors0-3.csv segments
+elog = ELOG.EventLog(date_fn=lambda: "%s %s" % resolve_date()[:2])
+
+
+def log_errors(err_in, level=ELOG.ERROR):
+    elog.log(err_in, level)
+
 
 try:
-    f = open('parameters.py', "r")
     from parameters import CO2_SEN_RX_PIN, CO2_SEN_TX_PIN, CO2_SEN_UART, TFT_CS_PIN, TFT_DC_PIN, \
         TS_MISO_PIN, TS_CS_PIN, TS_IRQ_PIN, TS_MOSI_PIN, TS_SCLK_PIN, TFT_CLK_PIN, \
         TFT_RST_PIN, TFT_MISO_PIN, TFT_MOSI_PIN, TFT_SPI, TS_SPI, \
         P_SEN_UART, P_SEN_TX, P_SEN_RX, I2C_SCL_PIN, I2C_SDA_PIN, BACKLIGHT_PIN
-    f.close()
-except OSError as e:  # open failed
-    log_errors("Error: %s - parameter.py-file missing! Can not continue!" % e)
+except ImportError as e:
+    log_errors("Error: %s - parameter.py-file missing! Can not continue!" % e, ELOG.CRITICAL)
     raise ValueError("Error: %s - parameter.py-file missing! Can not continue!" % e)
 
+# Required runtimeconfig.json keys, checked once when the binary snapshot is compiled
+CONF_SCHEMA = {
+    str: ('S1', 'P1', 'S2', 'P2', 'MQSRV', 'MQPW', 'MQUSR', 'MQP', 'MQSL', 'CLID', 'T_ERR', 'WBRPLPW', 'NTPS',
+          'DHCPN', 'T_TEMP', 'T_RH', 'T_PRESS', 'T_AIRQ', 'T_CO2', 'T_PM1_0', 'T_PM1_0_ATM', 'T_PM2_5',
+          'T_PM2_5_ATM', 'T_PM10_0', 'T_PM10_0_ATM', 'T_PCNT_0_3', 'T_PCNT_0_5', 'T_PCNT_1_0', 'T_PCNT_2_5',
+          'T_PCNT_5_0', 'T_PCNT_10_0'),
+    int: ('MQIVAL', 'SWEBR', 'SNET', 'SMQTT', 'S_UPDE_IVAL', 'DEBUG', 'S_TOUT', 'BLIGHT_TOUT'),
+    float: ('CO2_THOLD', 'AQ_THOLD', 'TEMP_THOLD', 'TEMP_COR', 'RH_THOLD', 'RH_COR', 'PRESS_THOLD', 'PRESS_COR'),
+}
+# Optional keys. DST keys are the same as in the other apps, without them the zone and rules of Finland are used
+CONF_DEFAULTS = {'TREND_IVAL': 60, 'DST_TIMEZONE': 2, 'DST_BEGIN_M': 3, 'DST_BEGIN_DAY': 6, 'DST_BEGIN_OCC': 2,
+                 'DST_BEGIN_TIME': 3, 'DST_END_M': 10, 'DST_END_DAY': 6, 'DST_END_OCC': 2, 'DST_END_TIME': 3}
+
+prof.begin("config")
 try:
-    f = open('runtimeconfig.json', 'r')
-    with open('runtimeconfig.json') as config_file:
-        data = load(config_file)
-        f.close()
-        S1 = data['S1']
-        P1 = data['P1']
-        S2 = data['S2']
-        P2 = data['P2']
-        MQSRV = data['MQSRV']
-        MQPW = data['MQPW']
-        MQUSR = data['MQUSR']
-        MQP = data['MQP']
-        MQSL = data['MQSL']
-        MQIVAL = data['MQIVAL']
-        CLID = data['CLID']
-        T_ERR = data['T_ERR']
-        WBRPLPW = data['WBRPLPW']
-        NTPS = data['NTPS']
-        DHCPN = data['DHCPN']
-        SWEBR = data['SWEBR']
-        SNET = data['SNET']
-        SMQTT = data['SMQTT']
-        S_UPDE_IVAL = data['S_UPDE_IVAL']
-        DEBUG = data['DEBUG']
-        S_TOUT = data['S_TOUT']
-        BLIGHT_TOUT = data['BLIGHT_TOUT']
-        T_TEMP = data['T_TEMP']
-        T_RH = data['T_RH']
-        T_PRESS = data['T_PRESS']
-        T_AIRQ = data['T_AIRQ']
-        T_CO2 = data['T_CO2']
-        T_PM1_0 = data['T_PM1_0']
-        T_PM1_0_ATM = data['T_PM1_0_ATM']
-        T_PM2_5 = data['T_PM2_5']
-        T_PM2_5_ATM = data['T_PM2_5_ATM']
-        T_PM10_0 = data['T_PM10_0']
-        T_PM10_0_ATM = data['T_PM10_0_ATM']
-        T_PCNT_0_3 = data['T_PCNT_0_3']
-        T_PCNT_0_5 = data['T_PCNT_0_5']
-        T_PCNT_1_0 = data['T_PCNT_1_0']
-        T_PCNT_2_5 = data['T_PCNT_2_5']
-        T_PCNT_5_0 = data['T_PCNT_5_0']
-        T_PCNT_10_0 = data['T_PCNT_10_0']
-        CO2_THOLD = data['CO2_THOLD']
-        AQ_THOLD = data['AQ_THOLD']
-        TEMP_THOLD = data['TEMP_THOLD']
-        TEMP_COR = data['TEMP_COR']
-        RH_THOLD = data['RH_THOLD']
-        RH_COR = data['RH_COR']
-        PRESS_THOLD = data['PRESS_THOLD']
-        PRESS_COR = data['PRESS_COR']
-except OSError as e:
-    log_errors("Error %s: Runtime parameters missing. Can not continue!" % e)
+    data = RUNCONF.RunConfig('runtimeconfig.json', CONF_SCHEMA, CONF_DEFAULTS)
+    S1 = data['S1']
+    P1 = data['P1']
+    S2 = data['S2']
+    P2 = data['P2']
+    MQSRV = data['MQSRV']
+    MQPW = data['MQPW']
+    MQUSR = data['MQUSR']
+    MQP = data['MQP']
+    MQSL = data['MQSL']
+    MQIVAL = data['MQIVAL']
+    CLID = data['CLID']
+    T_ERR = data['T_ERR']
+    WBRPLPW = data['WBRPLPW']
+    NTPS = data['NTPS']
+    DHCPN = data['DHCPN']
+    SWEBR = data['SWEBR']
+    SNET = data['SNET']
+    SMQTT = data['SMQTT']
+    S_UPDE_IVAL = data['S_UPDE_IVAL']
+    DEBUG = data['DEBUG']
+    S_TOUT = data['S_TOUT']
+    BLIGHT_TOUT = data['BLIGHT_TOUT']
+    T_TEMP = data['T_TEMP']
+    T_RH = data['T_RH']
+    T_PRESS = data['T_PRESS']
+    T_AIRQ = data['T_AIRQ']
+    T_CO2 = data['T_CO2']
+    T_PM1_0 = data['T_PM1_0']
+    T_PM1_0_ATM = data['T_PM1_0_ATM']
+    T_PM2_5 = data['T_PM2_5']
+    T_PM2_5_ATM = data['T_PM2_5_ATM']
+    T_PM10_0 = data['T_PM10_0']
+    T_PM10_0_ATM = data['T_PM10_0_ATM']
+    T_PCNT_0_3 = data['T_PCNT_0_3']
+    T_PCNT_0_5 = data['T_PCNT_0_5']
+    T_PCNT_1_0 = data['T_PCNT_1_0']
+    T_PCNT_2_5 = data['T_PCNT_2_5']
+    T_PCNT_5_0 = data['T_PCNT_5_0']
+    T_PCNT_10_0 = data['T_PCNT_10_0']
+    CO2_THOLD = data['CO2_THOLD']
+    AQ_THOLD = data['AQ_THOLD']
+    TEMP_THOLD = data['TEMP_THOLD']
+    TEMP_COR = data['TEMP_COR']
+    RH_THOLD = data['RH_THOLD']
+    RH_COR = data['RH_COR']
+    PRESS_THOLD = data['PRESS_THOLD']
+    PRESS_COR = data['PRESS_COR']
+    TREND_IVAL = data.get('TREND_IVAL', 60)
+    DST_TIMEZONE = data.get_int('DST_TIMEZONE')
+    DST_BEGIN = tuple(data.get_int(key) for key in ('DST_BEGIN_M', 'DST_BEGIN_DAY', 'DST_BEGIN_OCC', 'DST_BEGIN_TIME'))
+    DST_END = tuple(data.get_int(key) for key in ('DST_END_M', 'DST_END_DAY', 'DST_END_OCC', 'DST_END_TIME'))
+except (OSError, ValueError) as e:
+    log_errors("Error %s: Runtime parameters missing. Can not continue!" % e, ELOG.CRITICAL)
     raise ValueError("Error %s: Runtime parameters missing. Can not continue!" % e)
+prof.end()
+# Sensor samples: temp, rh, press (BME280 averages), co2 (MH-Z19B average), pms (dictionary), aqi.
+# MQTT is woken by new samples, at most once per MQIVAL. Unchanged values are sent again after MQTT_REPUBLISH
+# intervals, a topic which stays silent longer means the node is down
+MQTT_REPUBLISH = 10
+mqtt_sub = bus.subscribe(('temp', 'rh', 'press', 'co2', 'aqi', 'pms'), min_ms=MQIVAL * 1000,
+                         max_silence_ms=MQTT_REPUBLISH * MQIVAL * 1000)
 
 
-def weekday(year, month, day):
-    # Returns weekday. Thanks to 2DOF @ Github
-    t = [0, 3, 2, 5, 0, 3, 5, 1, 4, 6, 2, 4]
-    year -= month < 3
-    return (year + int(year / 4) - int(year / 100) + int(year / 400) + t[month - 1] + day) % 7
-
-def resolve_dst():
-    (year, month, mdate, hour, minute, second, wday, yday) = localtime()   # supposed to be GMT/UTC
-    match_days_begin = []
-    match_days_end = []
-    # Define the DST rules for the specified time zone
-    # Replace these rules with the actual DST rules for your time zone
-    dst_rules = {
-        "begin": (3, 6, 2, 3),
-            # 3 = March, 2 = last, 6 = Sunday, 3 = 03:00
-        "end": (10, 6, 2, 4),   # DST end  month, day, 1=first, 2=last at 04:00.
-            # 10 = October, 2 = last, 6 = Sunday, 4 = 04:00
-        "timezone": 2,          # hours from UTC during normal (winter time)
-        "offset": 1                        # hours to be added to timezone when DST is True
-    }
-    # Iterate begin
-    if dst_rules["begin"][0] in (1,3,5,7,8,10,11):
-        days_in_month = 30
-    else:
-        days_in_month = 31   # February does not matter here
-    # Iterate months and find days matching criteria
-    for x in range(days_in_month):
-        if weekday(year,dst_rules["begin"][0],x) == dst_rules["begin"][1]:
-            if dst_rules["begin"][2] == 2:  # last day first in the list
-                match_days_begin.insert(0,x)
-            else:
-                match_days_begin.append(x)  # first day first in the list
-    dst_begin = mktime((year, dst_rules["begin"][0], match_days_begin[0], dst_rules["begin"][3], 0, 0,
-                        dst_rules["begin"][1], 0))
-    if dst_rules["end"][0] in (1,3,5,7,8,10,11):
-        days_in_month = 30
-    else:
-        days_in_month = 31   # February does not matter here
-    for x in range(days_in_month):
-        if weekday(year,dst_rules["end"][0],x) == dst_rules["end"][1]:
-            if dst_rules["end"][2] == 2:  # last day first in the list
-                match_days_end.insert(0,x)
-            else:
-                match_days_end.append(x)  # first day first in the list
-    dst_end = mktime((year, dst_rules["end"][0], match_days_end[0], dst_rules["end"][3], 0, 0,
-                        dst_rules["end"][1], 0))
-    if (mktime(localtime()) < dst_begin) or (mktime(localtime()) > dst_end):
-        return localtime(mktime(localtime()) + 3600 * dst_rules["timezone"])
-    else:
-        return localtime(mktime(localtime()) + (3600 * dst_rules["timezone"]) + (3600 * dst_rules["offset"]))
+# DST transitions are calculated once per year, date strings once per second
+tz = TIMEZONE.TimeZone(DST_TIMEZONE, DST_BEGIN, DST_END,
+                 weekdays=('Ma', 'Ti', 'Ke', 'To', 'Pe', 'La', 'Su'))
+
 
 def resolve_date():
-    (year, month, mdate, hour, minute, second, wday, yday) = resolve_dst()
-    weekdays = ['Ma', 'Ti', 'Ke', 'To', 'Pe', 'La', 'Su']
-    day = "%s.%s.%s" % (mdate, month, year)
-    hours = "%s:%s:%s" % ("{:02d}".format(hour), "{:02d}".format(minute), "{:02d}".format(second))
-    return day, hours, weekdays[wday]
+    return tz.format_date()
 
 
 class TFTDisplay(object):
@@ -212,6 +183,15 @@ class TFTDisplay(object):
         self.rows = None
         self.dtl_scr_sel = None
         self.backlight_status = True
+        # Seven text rows, repainted only when changed
+        self.comp = Compositor(self.d, self.a_font, self.cols, border=10, bckg=self.col_bckg)
+        self.f_h = self.a_font.height
+        self.r_h = self.f_h + 2  # 2 pixel space between rows
+        self.row_w = [self.comp.add(self.indent_p, 25 + self.r_h * r, self.d.width - 2 * self.indent_p, self.f_h)
+                      for r in range(7)]
+        # Trend: CO2 400-2000 ppm, PM2.5 ATM 0-100 ug/m3, temperature 10-35C (stored as (t + 40) * 10)
+        self.chart = StripChart(self.d, self.cols, (('red', 400, 2000, 1, 0), ('yellow', 0, 100, 1, 0),
+                                                    ('light_green', 10, 35, 10, 40)))
 
     def first_touch(self, x, y):
         self.t_tched = True
@@ -227,34 +207,46 @@ class TFTDisplay(object):
 
 class AirQuality(object):
     def __init__(self, pmssensor):
-        self.aqinndex = None
+        self.aqinndex = None  # Instantaneous, max of the sub-indices
+        self.pm2_5_index = None
+        self.pm10_index = None
+        self.nowcast_index = None  # From 12 h NowCast, None until two hours of data
+        self.pm2_5_nc = NowCast()
+        self.pm10_nc = NowCast()
         self.pms = pmssensor
-        self.upd_ival = pms.read_interval + 1
+        self.sub = bus.subscribe(('pms',))
 
     async def upd_aq_loop(self):
+        # Woken by each new PMS reading
         while True:
-            if self.pms.pms_dictionary is not None:
-                if (self.pms.pms_dictionary['PM2_5_ATM'] != 0) and (self.pms.pms_dictionary['PM10_0_ATM'] != 0):
-                    self.aqinndex = (AQI.aqi(self.pms.pms_dictionary['PM2_5_ATM'],
-                                             self.pms.pms_dictionary['PM10_0_ATM']))
-            await asyncio.sleep(self.upd_ival)
+            await self.sub.wait()
+            pms_d = bus.get('pms')
+            # Clean air (0 ug/m3) is a reading too, only frames with the sensor error byte set are left out
+            if pms_d is not None and not pms_d['ERROR']:
+                self.pm2_5_index = AQI.PM2_5(pms_d['PM2_5_ATM'])
+                self.pm10_index = AQI.PM10_0(pms_d['PM10_0_ATM'])
+                self.aqinndex = max(self.pm2_5_index, self.pm10_index)
+                pm2_5 = self.pm2_5_nc.add(pms_d['PM2_5_ATM'])
+                pm10 = self.pm10_nc.add(pms_d['PM10_0_ATM'])
+                if pm2_5 is not None and pm10 is not None:
+                    self.nowcast_index = AQI.aqi(pm2_5, pm10)
+                bus.publish('aqi', self.aqinndex)
 
 
 async def upd_status_loop():
-    global temp_avg, rh_avg, press_avg
     pres_list = []
     temp_list = []
     rh_list = []
     while True:
+        sup.beat('status')
         disp.d_all_ok = True
-        if not MHZ19_f:
-            if co2s.co2_average is not None:
-                if co2s.co2_average > CO2_THOLD:
-                    disp.d_all_ok = False
-        if aq.aqinndex is not None:
-            if aq.aqinndex > AQ_THOLD:
-                disp.d_all_ok = False
-        if not BME280_f:
+        co2_avg = bus.get('co2')
+        if co2_avg is not None and co2_avg > CO2_THOLD:
+            disp.d_all_ok = False
+        aqindex = bus.get('aqi')
+        if aqindex is not None and aqindex > AQ_THOLD:
+            disp.d_all_ok = False
+        if not devs.fault('bme'):
             if bmes.values[0] is not None:
                 temp_list.append(round(float(bmes.values[0][:-1]), 1) + TEMP_COR)
             if bmes.values[2] is not None:
@@ -268,16 +260,18 @@ async def upd_status_loop():
             if len(pres_list) >= 20:
                 pres_list.pop(0)
             if len(temp_list) > 1:
-                temp_avg = round(sum(temp_list) / len(temp_list), 1)
+                bus.publish('temp', round(sum(temp_list) / len(temp_list), 1))
             if len(rh_list) > 1:
-                rh_avg = round(sum(rh_list) / len(rh_list), 1)
+                bus.publish('rh', round(sum(rh_list) / len(rh_list), 1))
             if len(pres_list) > 1:
-                press_avg = round(sum(pres_list) / len(pres_list), 1)
+                bus.publish('press', round(sum(pres_list) / len(pres_list), 1))
+            temp_avg = bus.get('temp')
+            rh_avg = bus.get('rh')
+            press_avg = bus.get('press')
             if (temp_avg is not None) and (rh_avg is not None) and (press_avg is not None):
                 if (temp_avg > TEMP_THOLD) or (rh_avg > RH_THOLD) or (press_avg > PRESS_THOLD):
                     disp.d_all_ok = False
-        gc.collect()
-        gc.threshold(gc.mem_free() // 4 + gc.mem_alloc())
+        mem.idle()
         await asyncio.sleep(disp.scr_upd_ival - 2)
 
 
@@ -288,33 +282,42 @@ async def show_what_i_do():
             print("   WiFi Connected %s, signal strength: %s" % (net.net_ok, net.strength))
             print("   IP-address: %s" % net.ip_a)
         print("   Memory free: %s, allocated: %s" % (gc.mem_free(), gc.mem_alloc()))
+        print("   Memory: %s" % mem.stats())
+        print("   Loop: %s" % sup.stats())
+        print("   Error log: %s records, %s filtered, %s flash bytes/record, segment %s" %
+              (elog.records, elog.filtered, elog.bytes_per_record(), elog.seg))
+        print("   Config: snapshot %s bytes, compiled from JSON %s, loaded in %s us" %
+              (data.size, data.compiled, data.load_us))
         print("   Heap info %s, hall sensor %s, raw-temp %sC" % (esp32.idf_heap_info(esp32.HEAP_DATA),
                                                                      esp32.hall_sensor(),
                                                                      "{:.1f}".format(
                                                                          ((float(esp32.raw_temperature()) - 32.0)
                                                                           * 5 / 9))))
+        print("   Sample bus: %s, MQTT %s" % (bus.stats(), mqtt_sub.stats()))
         print("2 -------SENSORDATA--------- 2")
-        if (temp_avg is not None) and (rh_avg is not None) and (press_avg is not None):
-            print("   Temp: %sC, Rh: %s, Pressure: %s" % (temp_avg, rh_avg, press_avg))
-        if co2s.co2_average is not None:
-            print("   CO2 is %s" % co2s.co2_average)
-        if aq.aqinndex is not None:
-            print("   AQ Index: %s" % ("{:.1f}".format(aq.aqinndex)))
-            print("   PM1:%s (%s) PM2.5:%s (%s)" % (pms.pms_dictionary['PM1_0'], pms.pms_dictionary['PM1_0_ATM'],
-                                             pms.pms_dictionary['PM2_5'], pms.pms_dictionary['PM2_5_ATM']))
-            print("   PM10: %s (ATM: %s)" % (pms.pms_dictionary['PM10_0'], pms.pms_dictionary['PM10_0_ATM']))
-            print("   %s < 0.3 & %s <0.5 " % (pms.pms_dictionary['PCNT_0_3'], pms.pms_dictionary['PCNT_0_5']))
-            print("   %s < 1.0 & %s < 2.5" % (pms.pms_dictionary['PCNT_1_0'], pms.pms_dictionary['PCNT_2_5']))
-            print("   %s < 5.0 & %s < 10.0" % (pms.pms_dictionary['PCNT_5_0'], pms.pms_dictionary['PCNT_10_0']))
+        print("   Temp: %sC, Rh: %s, Pressure: %s" % (bus.get('temp'), bus.get('rh'), bus.get('press')))
+        if bus.get('co2') is not None:
+            print("   CO2 is %s" % bus.get('co2'))
+        pms_d = bus.get('pms')
+        if aq is not None and aq.aqinndex is not None and pms_d is not None:
+            print("   AQ Index: %s (PM2.5 %s, PM10 %s), NowCast %s" % (aq.aqinndex, aq.pm2_5_index, aq.pm10_index,
+                                                                  aq.nowcast_index))
+            print("   PM1:%s (%s) PM2.5:%s (%s)" % (pms_d['PM1_0'], pms_d['PM1_0_ATM'], pms_d['PM2_5'],
+                                                    pms_d['PM2_5_ATM']))
+            print("   PM10: %s (ATM: %s)" % (pms_d['PM10_0'], pms_d['PM10_0_ATM']))
+            print("   %s < 0.3 & %s <0.5 " % (pms_d['PCNT_0_3'], pms_d['PCNT_0_5']))
+            print("   %s < 1.0 & %s < 2.5" % (pms_d['PCNT_1_0'], pms_d['PCNT_2_5']))
+            print("   %s < 5.0 & %s < 10.0" % (pms_d['PCNT_5_0'], pms_d['PCNT_10_0']))
+            print("   PMS %s" % pms.stats())
         print("3 ---------FAULTS------------- 3")
-        if BME280_f:
-            print("BME280 sensor faulty!")
-        if MHZ19_f:
-            print("MHZ19 sensor faulty!")
-        if PMS7003_f:
-            print("PMS7003 sensor faulty!")
-        if scr_f:
-            print("Screen faulty!")
+        for name, err in devs.faults.items():
+            print("   %s faulty: %s" % (name, err))
+        print("   Device init %s ms: %s" % (devs.stage_ms, devs.init_ms))
+        print("   Screen frames %s, last frame %s bytes, max %s bytes" % (disp.comp.frames, disp.comp.frame_bytes,
+                                                                    disp.comp.max_frame_bytes))
+        print("   Display yields %s, longest busy slice %s us" % (disp.d.yields, disp.d.max_busy_us))
+        print("   Touch wakeups %s, touches %s, rejected %s, latency %s ms (max %s)" % (
+            disp.xpt.wakeups, disp.xpt.touches, disp.xpt.rejected, disp.xpt.last_latency, disp.xpt.max_latency))
         await asyncio.sleep(5)
 
 
@@ -323,54 +326,48 @@ async def show_what_i_do():
 freq(80000000)
 
 
-# Particle sensor
-try:
-    pms = PARTICLES.PSensorPMS7003(uart=P_SEN_UART, rxpin=P_SEN_RX, txpin=P_SEN_TX)
-    aq = AirQuality(pms)
-except OSError as e:
-    log_errors("Error: %s - Particle sensor init error!" % e)
-    print("Error: %s - Particle sensor init error!" % e)
-    PMS7003_f = True
-
-# CO2 sensor
-try:
-    co2s = CO2.MHZ19bCO2(uart=CO2_SEN_UART, rxpin=CO2_SEN_RX_PIN, txpin=CO2_SEN_TX_PIN)
-except OSError as e:
-    log_errors("Error: %s - MHZ19 sensor init error!" % e)
-    print("Error: %s - MHZ19 sensor init error!" % e)
-    MHZ19_f = True
+async def pms_init():
+    # Passive mode duty cycling: fan and laser run 30 s warm up + 5 frames every 1 - 10 minutes
+    sensor = PARTICLES.PSensorPMS7003(uart=P_SEN_UART, rxpin=P_SEN_RX, txpin=P_SEN_TX, duty=True)
+    return await sensor.init()
+
+
+async def mhz19_init():
+    # Sample every 5 s, co2_average is the rolling 40 minute average
+    sensor = CO2.MHZ19bCO2(uart=CO2_SEN_UART, rxpin=CO2_SEN_RX_PIN, txpin=CO2_SEN_TX_PIN, read_interval=5)
+    #  If you use UART2, you have to delete co2 object and re-create it after power on boot!
+    if reset_cause() == 1:
+        del sensor
+        await asyncio.sleep(5)  # 2 is not enough!
+        sensor = CO2.MHZ19bCO2(uart=CO2_SEN_UART, rxpin=CO2_SEN_RX_PIN, txpin=CO2_SEN_TX_PIN, read_interval=5)
+    return sensor
+
 
-# BME280 sensor
 i2c = SoftI2C(scl=Pin(I2C_SCL_PIN), sda=Pin(I2C_SDA_PIN))
-try:
-    bmes = BmE.BME280(i2c=i2c)
-except OSError as e:
-    log_errors("Error: %s - BME sensor init error!" % e)
-    print("Error: %s - BME sensor init error!" % e)
-    BME280_f = True
-gc.collect()
-gc.threshold(gc.mem_free() // 4 + gc.mem_alloc())
-
-#  If you use UART2, you have to delete co2 object and re-create it after power on boot!
-if reset_cause() == 1:
-    del co2s
-    sleep(5)  # 2 is not enough!
-    co2s = CO2.MHZ19bCO2(uart=CO2_SEN_UART, rxpin=CO2_SEN_RX_PIN, txpin=CO2_SEN_TX_PIN)
+
+# Sensors are initialized concurrently in main(), failed or timed out ones are in devs.faults
+devs = DEVINIT.DeviceInit(timeout=10)
+devs.add('pms', pms_init)
+devs.add('aq', lambda: AirQuality(devs['pms']), after=('pms',))
+devs.add('mhz19', mhz19_init)
+devs.add('bme', lambda: BmE.BME280(i2c=i2c))
+
 #  Touchscreen and display init
 t_spi = SPI(TS_SPI)  # HSPI
 t_spi.init(baudrate=1100000, sck=Pin(TS_SCLK_PIN), mosi=Pin(TS_MOSI_PIN), miso=Pin(TS_MISO_PIN))
 d_spi = SPI(TFT_SPI)  # VSPI - baudrate 40 - 90 MHz appears to be working, screen update still slow
 d_spi.init(baudrate=50000000, sck=Pin(TFT_CLK_PIN), mosi=Pin(TFT_MOSI_PIN), miso=Pin(TFT_MISO_PIN))
-try:
-    disp = TFTDisplay(t_spi, d_spi)
-    disp.scr_actv_time = time()
-except MemoryError:
-    log_errors("Display init memory error!")
-    sleep(10)
-    reset()
-except OSError as e:
-    log_errors("Error: %s - Touchscreen or display init error!" % e)
-    raise TypeError("Error: %s - Touchscreen or display init error!" % e)
+with boot_phase("display_init"):
+    try:
+        disp = TFTDisplay(t_spi, d_spi)
+        disp.scr_actv_time = time()
+    except MemoryError:
+        log_errors("Display init memory error!", ELOG.CRITICAL)
+        sleep(10)
+        reset()
+    except OSError as e:
+        log_errors("Error: %s - Touchscreen or display init error!" % e, ELOG.CRITICAL)
+        raise TypeError("Error: %s - Touchscreen or display init error!" % e)
 
 # Network handshake
 net = WIFINET.ConnectWiFi(S1, P1, S2, P2, NTPS, DHCPN, SWEBR, WBRPLPW)
@@ -378,7 +375,7 @@ net = WIFINET.ConnectWiFi(S1, P1, S2, P2, NTPS, DHCPN, SWEBR, WBRPLPW)
 
 async def details_screen_loop():
     disp.scr_actv_time = time()
-    if not scr_f and not PMS7003_f:
+    if not devs.fault('pms'):
         r, r_c = await particle_screen()
         disp.d_scr_active = True
         try:
@@ -386,27 +383,25 @@ async def details_screen_loop():
         except TypeError:
             pass
         await asyncio.sleep(S_UPDE_IVAL)
-    if not scr_f and not BME280_f:
+    if not devs.fault('bme'):
         r, r_c = await sensor_monitor()
         try:
             await show_screen(r, r_c)
         except TypeError:
             pass
         await asyncio.sleep(S_UPDE_IVAL)
-    if not scr_f:
-        r, r_c = await sys_monitor()
-        try:
-            await show_screen(r, r_c)
-        except TypeError:
-            pass
-        await asyncio.sleep(S_UPDE_IVAL)
-    if not scr_f:
-        r, r_c = await net_monitor()
-        try:
-            await show_screen(r, r_c)
-        except TypeError:
-            pass
-        await asyncio.sleep(S_UPDE_IVAL)
+    r, r_c = await sys_monitor()
+    try:
+        await show_screen(r, r_c)
+    except TypeError:
+        pass
+    await asyncio.sleep(S_UPDE_IVAL)
+    r, r_c = await net_monitor()
+    try:
+        await show_screen(r, r_c)
+    except TypeError:
+        pass
+    await asyncio.sleep(S_UPDE_IVAL)
     disp.d_scr_active = False
     disp.t_tched = False
 
@@ -442,26 +437,23 @@ async def rot_scr():
         except TypeError:
             pass
     await asyncio.sleep(S_UPDE_IVAL)
+    await trend_screen()
     disp.d_scr_active = False
     disp.t_tched = False
 
 
 async def update_screen_loop():
     while True:
+        sup.beat('screen')
         if disp.t_tched is True:
             disp.backlight_on()
             if disp.d_scr_active is False:
                 try:
                     await rot_scr()
                 except TypeError:
-                    await error_bckg()
-                    disp.d.draw_text(disp.indent_p, 25 + disp.r_h * 2, "Please, wait!", disp.a_font, disp.cols["white"],
-                                     disp.cols[disp.col_bckg])
-                    disp.d.draw_text(disp.indent_p, 25 + disp.r_h * 3, "Sensors not ready!",
-                                     disp.a_font, disp.cols["white"], disp.cols[disp.col_bckg])
-                    disp.d.draw_text(disp.indent_p, 25 + disp.r_h * 4, "Thank you!", disp.a_font, disp.cols["white"],
-                                     disp.cols[disp.col_bckg])
-                    pass
+                    disp.d_all_ok = False
+                    await show_screen((" ", " ", "Please, wait!", "Sensors not ready!", "Thank you!", " ", " "),
+                                      ('white',) * 7)
             elif (disp.d_scr_active is True) and ((time() - disp.scr_actv_time) > disp.scr_tout):
                 # Timeout
                 disp.d_scr_active = False
@@ -475,11 +467,29 @@ async def update_screen_loop():
             await show_screen(r, r_c)
 
 
+async def trend_screen():
+    # Chart uses hardware scroll, text rows must be repainted after it
+    await disp.chart.show()
+    await asyncio.sleep(S_UPDE_IVAL)
+    disp.chart.hide()
+    disp.comp.invalidate()
+
+
+async def trend_loop():
+    while True:
+        await asyncio.sleep(TREND_IVAL)
+        pms_d = bus.get('pms')
+        disp.chart.add((bus.get('co2'), pms_d['PM2_5_ATM'] if pms_d is not None else None, bus.get('temp')))
+
+
 async def wait_timer():
-    n = 0
-    while (disp.t_tched is False) and (n <= disp.scr_upd_ival * 1000):
-        await asyncio.sleep_ms(1)
-        n += 1
+    # Sleep until touch event or screen update interval
+    if disp.t_tched is True:
+        return
+    try:
+        await asyncio.wait_for(disp.xpt.get_event(), disp.scr_upd_ival)
+    except asyncio.TimeoutError:
+        pass
 
 
 async def show_screen(rows, row_colours):
@@ -497,8 +507,6 @@ async def show_screen(rows, row_colours):
     r6_c = 'red'
     r7 = "6"
     r7_c = 'red'
-    disp.f_h = disp.a_font.height
-    disp.r_h = disp.f_h + 2  # 2 pixel space between rows
     if rows is not None:
         if len(rows) == 7:
             r1, r2, r3, r4, r5, r6, r7 = rows
@@ -513,38 +521,30 @@ async def show_screen(rows, row_colours):
     r5 = r5[:max_c]
     r6 = r6[:max_c]
     r7 = r7[:max_c]
-    if disp.d_all_ok is True:
-        await ok_bckg()
-    else:
-        await error_bckg()
-    disp.d.draw_text(disp.indent_p, 25, r1, disp.a_font, disp.cols[r1_c], disp.cols[disp.col_bckg])
-    disp.d.draw_text(disp.indent_p, 25 + disp.r_h, r2, disp.a_font, disp.cols[r2_c], disp.cols[disp.col_bckg])
-    disp.d.draw_text(disp.indent_p, 25 + disp.r_h * 2, r3, disp.a_font, disp.cols[r3_c], disp.cols[disp.col_bckg])
-    disp.d.draw_text(disp.indent_p, 25 + disp.r_h * 3, r4, disp.a_font, disp.cols[r4_c], disp.cols[disp.col_bckg])
-    disp.d.draw_text(disp.indent_p, 25 + disp.r_h * 4, r5, disp.a_font, disp.cols[r5_c], disp.cols[disp.col_bckg])
-    disp.d.draw_text(disp.indent_p, 25 + disp.r_h * 5, r6, disp.a_font, disp.cols[r6_c], disp.cols[disp.col_bckg])
-    disp.d.draw_text(disp.indent_p, 25 + disp.r_h * 6, r7, disp.a_font, disp.cols[r7_c], disp.cols[disp.col_bckg])
-    gc.collect()
+    disp.row_w[0].set(r1, r1_c)
+    disp.row_w[1].set(r2, r2_c)
+    disp.row_w[2].set(r3, r3_c)
+    disp.row_w[3].set(r4, r4_c)
+    disp.row_w[4].set(r5, r5_c)
+    disp.row_w[5].set(r6, r6_c)
+    disp.row_w[6].set(r7, r7_c)
+    # Only changed rows and, if alarm state flipped, the border are sent to the display
+    await disp.comp.render(disp.d_all_ok)
+    mem.idle()
     await wait_timer()
 
 
-async def ok_bckg():
-    disp.d.fill_rectangle(0, 0, disp.d.width, disp.d.height, disp.cols['yellow'])
-    disp.d.fill_rectangle(10, 10, disp.d.width - 20, disp.d.height - 20, disp.cols['light_green'])
-    disp.col_bckg = 'light_green'
-
-
-async def error_bckg():
-    disp.d.fill_rectangle(0, 0, disp.d.width, disp.d.height, disp.cols['red'])
-    disp.d.fill_rectangle(10, 10, disp.d.width - 20, disp.d.height - 20, disp.cols['light_green'])
-    disp.col_bckg = 'light_green'
-
-
 async def upd_welcome():
     r1 = "%s %s %s" % (resolve_date()[2], resolve_date()[0], resolve_date()[1])
     # r1 = "Ilmanlaatu (C) J.Hiltunen"
     r1_c = 'black'
-    if co2s.co2_value is None:
+    temp_avg = bus.get('temp')
+    rh_avg = bus.get('rh')
+    press_avg = bus.get('press')
+    if devs.fault('mhz19'):
+        r2 = "CO2: sensor fault"
+        r2_c = 'red'
+    elif co2s.co2_value is None:
         r2 = "CO2: waiting..."
         r2_c = 'yellow'
     elif co2s.co2_average is None:
@@ -556,7 +556,10 @@ async def upd_welcome():
             r2_c = 'red'
         else:
             r2_c = 'blue'
-    if aq.aqinndex is None:
+    if devs.fault('aq'):
+        r3 = "AirQuality: sensor fault"
+        r3_c = 'red'
+    elif aq.aqinndex is None:
         r3 = "AirQuality not ready"
         r3_c = 'yellow'
     else:
@@ -603,39 +606,40 @@ async def upd_welcome():
 
 
 async def particle_screen():
-    if (pms.pms_dictionary is not None) and ((time() - pms.startup_time) > pms.read_interval):
+    pms_d = bus.get('pms')
+    if pms_d is not None:
         r1 = "1. Konsentraatio ug/m3:"
         r1_c = 'blue'
-        if (pms.pms_dictionary['PM1_0'] is not None) and (pms.pms_dictionary['PM1_0_ATM'] is not None) and \
-                (pms.pms_dictionary['PM2_5'] is not None) and (pms.pms_dictionary['PM2_5_ATM'] is not None):
-            r2 = " PM1:%s (%s) PM2.5:%s (%s)" % (pms.pms_dictionary['PM1_0'], pms.pms_dictionary['PM1_0_ATM'],
-                                                 pms.pms_dictionary['PM2_5'], pms.pms_dictionary['PM2_5_ATM'])
+        if (pms_d['PM1_0'] is not None) and (pms_d['PM1_0_ATM'] is not None) and \
+                (pms_d['PM2_5'] is not None) and (pms_d['PM2_5_ATM'] is not None):
+            r2 = " PM1:%s (%s) PM2.5:%s (%s)" % (pms_d['PM1_0'], pms_d['PM1_0_ATM'], pms_d['PM2_5'],
+                                                 pms_d['PM2_5_ATM'])
             r2_c = 'black'
         else:
             r2 = " Waiting"
             r2_c = 'yellow'
-        if (pms.pms_dictionary['PM10_0'] is not None) and (pms.pms_dictionary['PM10_0_ATM'] is not None):
-            r3 = " PM10: %s (ATM: %s)" % (pms.pms_dictionary['PM10_0'], pms.pms_dictionary['PM10_0_ATM'])
+        if (pms_d['PM10_0'] is not None) and (pms_d['PM10_0_ATM'] is not None):
+            r3 = " PM10: %s (ATM: %s)" % (pms_d['PM10_0'], pms_d['PM10_0_ATM'])
             r3_c = 'black'
         else:
             r3 = "Waiting"
             r3_c = 'yellow'
         r4 = "2. Partikkelit/1L/um:"
         r4_c = 'blue'
-        if (pms.pms_dictionary['PCNT_0_3'] is not None) and (pms.pms_dictionary['PCNT_0_5'] is not None):
-            r5 = " %s < 0.3 & %s <0.5 " % (pms.pms_dictionary['PCNT_0_3'], pms.pms_dictionary['PCNT_0_5'])
+        if (pms_d['PCNT_0_3'] is not None) and (pms_d['PCNT_0_5'] is not None):
+            r5 = " %s < 0.3 & %s <0.5 " % (pms_d['PCNT_0_3'], pms_d['PCNT_0_5'])
             r5_c = 'navy'
         else:
             r5 = " Waiting"
             r5_c = 'yellow'
-        if (pms.pms_dictionary['PCNT_1_0'] is not None) and (pms.pms_dictionary['PCNT_2_5'] is not None):
-            r6 = " %s < 1.0 & %s < 2.5" % (pms.pms_dictionary['PCNT_1_0'], pms.pms_dictionary['PCNT_2_5'])
+        if (pms_d['PCNT_1_0'] is not None) and (pms_d['PCNT_2_5'] is not None):
+            r6 = " %s < 1.0 & %s < 2.5" % (pms_d['PCNT_1_0'], pms_d['PCNT_2_5'])
             r6_c = 'navy'
         else:
             r6 = "Waiting"
             r6_c = 'yellow'
-        if (pms.pms_dictionary['PCNT_5_0'] is not None) and (pms.pms_dictionary['PCNT_10_0'] is not None):
-            r7 = " %s < 5.0 & %s < 10.0" % (pms.pms_dictionary['PCNT_5_0'], pms.pms_dictionary['PCNT_10_0'])
+        if (pms_d['PCNT_5_0'] is not None) and (pms_d['PCNT_10_0'] is not None):
+            r7 = " %s < 5.0 & %s < 10.0" % (pms_d['PCNT_5_0'], pms_d['PCNT_10_0'])
             r7_c = 'navy'
         else:
             r7 = " Waiting"
@@ -648,14 +652,14 @@ async def particle_screen():
 
 
 async def sensor_monitor():
-    if not BME280_f and not PMS7003_f and not MHZ19_f:
+    if not devs.fault('bme') and not devs.fault('pms') and not devs.fault('mhz19'):
         row1 = "3. Sensoridata"
         row1_colour = 'black'
         row2 = "MHZ19B CRC errors: %s " % co2s.crc_errors
         row2_colour = 'blue'
-        row3 = "MHZ19B Range errors: %s" % co2s.range_errors
+        row3 = "MHZ19B Range errors: %s timeouts: %s" % (co2s.range_errors, co2s.timeouts)
         row3_colour = 'blue'
-        row4 = "PMS7003 version %s" % pms.pms_dictionary['VERSION']
+        row4 = "PMS7003 version %s" % (pms.pms_dictionary or {}).get('VERSION', '-')
         row4_colour = 'blue'
         row5 = "BME280 address %s" % bmes.address
         row5_colour = 'blue'
@@ -673,7 +677,7 @@ async def sensor_monitor():
 async def sys_monitor():
     row1 = "4. System monitor"
     row1_colour = 'black'
-    row2 = "Free"
+    row2 = "Frame: %s (max %s) B" % (disp.comp.frame_bytes, disp.comp.max_frame_bytes)
     row2_colour = 'blue'
     row3 = "Mem free: %s" % gc.mem_free()
     row3_colour = 'blue'
@@ -716,38 +720,29 @@ async def net_monitor():
         return None
 
 
+PARTICLES_T = (('PM1_0', T_PM1_0), ('PM1_0_ATM', T_PM1_0_ATM), ('PM2_5', T_PM2_5), ('PM2_5_ATM', T_PM2_5_ATM),
+               ('PM10_0', T_PM10_0), ('PM10_0_ATM', T_PM10_0_ATM), ('PCNT_0_3', T_PCNT_0_3),
+               ('PCNT_0_5', T_PCNT_0_5), ('PCNT_1_0', T_PCNT_1_0), ('PCNT_2_5', T_PCNT_2_5),
+               ('PCNT_5_0', T_PCNT_5_0), ('PCNT_10_0', T_PCNT_10_0))
+VALUES_T = (('temp', T_TEMP), ('rh', T_RH), ('press', T_PRESS), ('aqi', T_AIRQ), ('co2', T_CO2))
+
+
 def mqtt_publish():
-    global last_update
+    # Samples changed since the previous publish are sent, unchanged ones after MQTT_REPUBLISH intervals
     client = MQTTClient(CLID, MQSRV, MQP, MQUSR, MQPW,0,False)
     try:
         client.connect()
-        if not PMS7003_f and (pms.pms_dictionary is not None) and ((time() - pms.startup_time) > pms.read_interval):
-            client.publish(T_PM1_0, str(pms.pms_dictionary['PM1_0']), retain=0, qos=0)
-            client.publish(T_PM1_0_ATM, str(pms.pms_dictionary['PM1_0_ATM']), retain=0, qos=0)
-            client.publish(T_PM2_5, str(pms.pms_dictionary['PM2_5']), retain=0, qos=0)
-            client.publish(T_PM2_5_ATM, str(pms.pms_dictionary['PM2_5_ATM']), retain=0, qos=0)
-            client.publish(T_PM10_0, str(pms.pms_dictionary['PM10_0']), retain=0, qos=0)
-            client.publish(T_PM10_0_ATM, str(pms.pms_dictionary['PM10_0_ATM']), retain=0, qos=0)
-            client.publish(T_PCNT_0_3, str(pms.pms_dictionary['PCNT_0_3']), retain=0, qos=0)
-            client.publish(T_PCNT_0_5, str(pms.pms_dictionary['PCNT_0_5']), retain=0, qos=0)
-            client.publish(T_PCNT_1_0, str(pms.pms_dictionary['PCNT_1_0']), retain=0, qos=0)
-            client.publish(T_PCNT_2_5, str(pms.pms_dictionary['PCNT_2_5']), retain=0, qos=0)
-            client.publish(T_PCNT_5_0, str(pms.pms_dictionary['PCNT_5_0']), retain=0, qos=0)
-            client.publish(T_PCNT_10_0, str(pms.pms_dictionary['PCNT_10_0']), retain=0, qos=0)
-        if aq.aqinndex is not None:
-            client.publish(T_AIRQ, str(aq.aqinndex), retain=0, qos=0)
-        if not BME280_f:
-            if temp_avg is not None:
-                client.publish(T_TEMP, str(temp_avg), retain=0, qos=0)
-            if bmes.values[2][:-1] is not None:
-                client.publish(T_RH, str(rh_avg), retain=0, qos=0)
-            if bmes.values[1][:-3] is not None:
-                client.publish(T_PRESS, str(press_avg), retain=0, qos=0)
-        if not MHZ19_f and (co2s.co2_average is not None):
-            client.publish(T_CO2, str(co2s.co2_average), retain=0, qos=0)
-        last_update = time()
-        gc.collect()
-        gc.threshold(gc.mem_free() // 4 + gc.mem_alloc())
+        for name, topic in VALUES_T:
+            if mqtt_sub.changed(name) and bus.get(name) is not None:
+                client.publish(topic, str(bus.get(name)), retain=0, qos=0)
+                mqtt_sub.consumed(name)
+        if mqtt_sub.changed('pms'):
+            pms_d = bus.get('pms')
+            if pms_d is not None:
+                for key, topic in PARTICLES_T:
+                    client.publish(topic, str(pms_d[key]), retain=0, qos=0)
+                mqtt_sub.consumed('pms')
+        mem.idle()
         return True
     except OSError as e:
         log_errors("MQTT error %s:" %e)
@@ -755,29 +750,92 @@ def mqtt_publish():
 
 
 async def update_mqtt_loop():
-    global last_update
     while True:
-        if net.net_ok and ((time()-last_update) > MQIVAL):
-            try:
-                mqtt_publish()
-            except OSError as e:
-                if DEBUG == 1:
-                    print("Update loop OSError %s" %e)
-        await asyncio.sleep(1)
+        sup.beat('mqtt')
+        # Woken by new samples, at most once per MQIVAL. Timeout keeps the heartbeat going
+        if not await mqtt_sub.wait(30000) or not net.net_ok:
+            continue
+        try:
+            if mqtt_publish() and not first_pub.is_set():
+                boot_mark("first_publish")
+                first_pub.set()
+        except OSError as e:
+            if DEBUG == 1:
+                print("Update loop OSError %s" %e)
+
+
+async def init_devices():
+    global pms, aq, co2s, bmes
+    await devs.run()
+    pms = devs['pms']
+    aq = devs['aq']
+    co2s = devs['mhz19']
+    bmes = devs['bme']
+    # Drivers publish each new reading on the sample bus
+    if pms is not None:
+        pms.on_sample = lambda s: bus.publish('pms', s.pms_dictionary)
+    if co2s is not None:
+        co2s.on_sample = lambda s: bus.publish('co2', s.co2_average)
+    for name, err in devs.faults.items():
+        log_errors("Error: %s - %s init error!" % (err, name))
+        print("Error: %s - %s init error!" % (err, name))
+    mem.collect()
+
+
+async def first_reading():
+    # Boot timeline mark when the first sensor value is available
+    sub = bus.subscribe(('pms', 'co2', 'temp'))
+    await sub.wait()
+    sub.close()
+    boot_mark("first_reading")
+
+
+async def boot_report():
+    # Boot timeline to /boottime.csv after the first MQTT publish or 2 minutes
+    try:
+        await asyncio.wait_for(first_pub.wait(), 120)
+    except asyncio.TimeoutError:
+        pass
+    prof.save()
+    if DEBUG == 1:
+        prof.dump()
+
+
+# Lag monitor and task heartbeats, this node has no hardware WDT: stale tasks are logged and kept in RTC memory
+sup = SUP.Supervisor(log_fn=log_errors)
+
 
 async def main():
     loop = asyncio.get_event_loop()
-    loop.create_task(pms.read_async_loop())
-    loop.create_task(co2s.read_co2_loop())
-    loop.create_task(aq.upd_aq_loop())
-    loop.create_task(upd_status_loop())
-    if DEBUG == 1:
-        loop.create_task(show_what_i_do())
-    loop.create_task(update_screen_loop())
+    loop.create_task(sup.run())
+    prev = sup.last_reset()
+    if prev is not None:
+        log_errors("Previous reset: %s" % prev, ELOG.WARNING)
+    # WiFi association runs while the sensors are initialized
     if SNET == 1:
         loop.create_task(net.net_upd_loop())
+    await init_devices()
+    if not devs.fault('pms'):
+        sup.register('pms', 3 * pms.max_period + 60, critical=False,
+                     task=loop.create_task(pms.read_async_loop()), stamp=lambda: pms.read_ticks)
+    if not devs.fault('mhz19'):
+        sup.register('co2', co2s.preheat_time + 3 * co2s.read_interval, critical=False,
+                     task=loop.create_task(co2s.read_co2_loop()), stamp=lambda: co2s.read_ticks)
+    if not devs.fault('aq'):
+        loop.create_task(aq.upd_aq_loop())
+    sup.register('status', 120, task=loop.create_task(upd_status_loop()))
+    if DEBUG == 1:
+        mem.probe_every = 10  # Largest free block in the debug output, costs collections
+        loop.create_task(show_what_i_do())
+    loop.create_task(disp.xpt.touch_loop())
+    loop.create_task(trend_loop())
+    sup.register('screen', 300, task=loop.create_task(update_screen_loop()))
+    loop.create_task(first_reading())
     if SMQTT == 1 and SNET ==1:
-       loop.create_task(update_mqtt_loop())
+       sup.register('mqtt', MQIVAL + 60, task=loop.create_task(update_mqtt_loop()))
+    loop.create_task(elog.flush_loop())
+    loop.create_task(mem.run())
+    loop.create_task(boot_report())
     loop.run_forever()
 
 
@@ -785,5 +843,5 @@ if __name__ == "__main__":
     try:
         asyncio.run(main())
     except MemoryError:
-        log_errors("Memory Error in main!")
+        log_errors("Memory Error in main!", ELOG.CRITICAL)
         reset()
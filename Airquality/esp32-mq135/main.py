@@ -14,14 +14,24 @@
     - Bentseeni 10 - 1000 ppm
     - Alkoholi 10 - 300 ppm
     Lämpötila ja kosteus tuodaan mqtt-palvelimelta
+
+19.10.2026: Siirretty uasyncioon. MQTT-yhteys pysyy auki (MQTT_AS.py), lämpötila ja kosteus tilataan kerran
+            ja viimeisimmät (retained) arvot pidetään muistissa. Anturia luetaan kerran sekunnissa odottamatta
+            mqtt-viestejä, ja minuutin 60 lukemasta lasketaan korjattu ppm yhdellä kertaa (MQ135.ppm_ikkuna).
+19.10.2026: Arvot näytteiden väylällä (SAMPLEBUS_AS). Tilatut lämpötila ja kosteus julkaistaan väylälle
+            globaalien muuttujien sijaan, minuutin ppm samoin. mqtt_raportoi herää uudesta ppm-arvosta ja lähettää
+            muuttumattoman arvon uudelleen MQTT_TOISTO minuutin välein, jotta hiljainen aihe tarkoittaa
+            pysähtynyttä laitetta.
 """
 import math  # tarvitaan laskennassa
-import time
+from array import array
 import utime
 import machine # tuodaan koko kirjasto
 from machine import Pin
-from machine import ADC
-from umqttsimple import MQTTClient
+import ADCSAMPLER_AS as ADCSAMPLER
+from MQTT_AS import MQTTClient, config
+from SAMPLEBUS_AS import bus
+import uasyncio as asyncio
 import network
 import gc
 
@@ -31,18 +41,18 @@ gc.enable()  # aktivoidaan automaattinen roskankeruu
 machine.freq(80000000)
 print ("Prosessorin nopeus asetettu: %s" %machine.freq())
 
-# Globaalit
-lampo = 0
-kosteus = 0
+# Väylällä: lampo ja kosteus (mqtt:llä tulleet viimeisimmät), ppm (minuutin keskiarvo)
+IKKUNA = 60  # lukemaa keskiarvoon, yksi sekunnissa
+MQTT_TOISTO = 10  # muuttumaton ppm lähetetään uudelleen näin monen ikkunan jälkeen
+mqtt_tilaus = bus.subscribe(('ppm',), max_silence_ms=MQTT_TOISTO * IKKUNA * 1000)
 
 # Raspberry WiFi on huono ja lisaksi raspin pitaa pingata ESP32 jotta yhteys toimii!
 sta_if = network.WLAN(network.STA_IF)
 
 # tuodaan parametrit tiedostosta parametrit.py
 from parametrit import CLIENT_ID, MQTT_SERVERI, MQTT_PORTTI, MQTT_KAYTTAJA, \
-    MQTT_SALASANA, SISA_LAMPO, SISA_KOSTEUS, SISA_PPM, MQ135_PINNI
+    MQTT_SALASANA, SISA_LAMPO, SISA_KOSTEUS, SISA_PPM, MQ135_PINNI, SSID1, SALASANA1, SALASANA2
 
-client = MQTTClient(CLIENT_ID, MQTT_SERVERI, MQTT_PORTTI, MQTT_KAYTTAJA, MQTT_SALASANA)
 
 class MQ135(object):
     """
@@ -80,8 +90,10 @@ class MQ135(object):
     # Atmospheric CO2 level for calibration purposes
     ATMOCO2 = 397.13
 
-    def __init__(self, pin):
+    def __init__(self, pin, n=16):
         self.pin = pin
+        # ADC luodaan kerran, lukema on 16 luvun sarjan mediaani
+        self.adc = ADCSAMPLER.ADCChannel(pin, n=n)
 
     def get_correction_factor(self, temperature, humidity):
         """Calculates the correction factor for ambient air temperature and relative humidity
@@ -98,9 +110,8 @@ class MQ135(object):
 
     def get_resistance(self):
         """Returns the resistance of the sensor in kOhms // -1 if not value got in pin"""
-        adc = ADC(self.pin)
-        value = adc.read()
-        if value == 0:
+        value = self.adc.sample()
+        if not value:
             return -1
 
         return (4095./value - 1.) * self.RLOAD  # ESP32 maksimi, ESP8266:lle arvo on 1023
@@ -118,6 +129,28 @@ class MQ135(object):
         corrected for temperature/humidity"""
         return self.PARA * math.pow((self.get_corrected_resistance(temperature, humidity)/ self.RZERO), -self.PARB)
 
+    def ppm_ikkuna(self, lukemat, maara, temperature=None, humidity=None):
+        """Mean ppm of CO2 over maara ADC readings (filtered counts), corrected for temperature/humidity if given.
+
+        ppm = PARA * (R / (cf * RZERO)) ^ -PARB, constant part k = PARA * (cf * RZERO) ^ PARB is calculated once
+        per batch and each reading needs only one pow(). Zero (no value) and saturated (4095) readings are skipped.
+        None if no readings.
+        """
+        cf = 1.0 if temperature is None or humidity is None else self.get_correction_factor(temperature, humidity)
+        k = self.PARA * math.pow(cf * self.RZERO, self.PARB)
+        parb = -self.PARB
+        rload = self.RLOAD
+        summa = 0.0
+        n = 0
+        for i in range(maara):
+            value = lukemat[i]
+            if 0 < value < 4095:  # 4095 is saturated (over 1.0 V), R would be 0
+                summa += math.pow((4095. / value - 1.) * rload, parb)
+                n += 1
+        if n == 0:
+            return None
+        return k * summa / n
+
     def get_rzero(self):
         """Returns the resistance RZero of the sensor (in kOhms) for calibratioin purposes"""
         return self.get_resistance() * math.pow((self.ATMOCO2/self.PARA), (1./self.PARB))
@@ -137,131 +170,107 @@ def ratkaise_aika():
            vuosi, "{:02d}".format(tunti), "{:02d}".format(minuutti), "{:02d}".format(sekunti))
     return aika
 
-def mqtt_palvelin_yhdista():
-    aika = ratkaise_aika()
-    if sta_if.isconnected():
-        try:
-            client.set_callback(palauta_lampo_ja_rh)
-            client.connect()
-            client.subscribe(SISA_LAMPO)  # lampotila C
-            client.subscribe(SISA_KOSTEUS)  # suhteellinen kosteus %
-
-        except OSError as e:
-            print("% s:  Ei voida yhdistaa! " % aika)
-            client.disconnect()
-            time.sleep(10)
-            restart_and_reconnect()
-            return False
-        return True
-    else:
-        print("%s: Yhteys on poikki! " % aika)
-        # client.disconnect()
-        restart_and_reconnect()
-        return False
-
-def palauta_lampo_ja_rh(topic, msg):
-    global lampo
-    global kosteus
+def palauta_lampo_ja_rh(topic, msg, retained):
     # print("Aihe %s, viesti %s" %(topic, msg))
-    if topic == SISA_LAMPO:
-        lampo = msg  # uusi lampotila
-    if topic == SISA_KOSTEUS:
-        kosteus = msg  # uusi kosteus
-    return lampo, kosteus
-
-def laheta_ppm_mqtt(ppm):
-    aika = ratkaise_aika()
-    if sta_if.isconnected():
-        try:
-            client.connect()
-            client.publish(SISA_PPM, str(ppm))  # julkaistaan ppm arvo
-        except OSError as e:
-            print("% s:  Ei voida yhdistaa! " % aika)
-            client.disconnect()
-            time.sleep(10)
-            restart_and_reconnect()
-            return False
-        return True
-    else:
-        print("%s: Yhteys on poikki! " % aika)
-        # client.disconnect()
-        restart_and_reconnect()
-        return False
-
-
-def vilkuta_ledi(kertaa):
+    try:
+        if topic == SISA_LAMPO:
+            bus.publish('lampo', float(msg))  # uusi lampotila
+        elif topic == SISA_KOSTEUS:
+            bus.publish('kosteus', float(msg))  # uusi kosteus
+    except ValueError:
+        print("%s: virheellinen arvo %s aiheessa %s" % (ratkaise_aika(), msg, topic))
+
+
+async def tilaa_aiheet(client):
+    # Kutsutaan jokaisen (uudelleen)yhdistämisen jälkeen, retained-arvot tulevat heti
+    await client.subscribe(SISA_LAMPO, 0)
+    await client.subscribe(SISA_KOSTEUS, 0)
+
+
+config['server'] = MQTT_SERVERI
+config['port'] = MQTT_PORTTI
+config['user'] = MQTT_KAYTTAJA
+config['password'] = MQTT_SALASANA
+config['client_id'] = CLIENT_ID
+config['ssid'] = sta_if.config('essid')
+config['wifi_pw'] = SALASANA1 if sta_if.config('essid') == SSID1 else SALASANA2
+config['subs_cb'] = palauta_lampo_ja_rh
+config['connect_coro'] = tilaa_aiheet
+client = MQTTClient(config)
+
+
+async def vilkuta_ledi(kertaa):
     ledipinni = machine.Pin(2, machine.Pin.OUT)
     for i in range(kertaa):
         ledipinni.on()
-        utime.sleep_ms(100)
+        await asyncio.sleep_ms(100)
         ledipinni.off()
-        utime.sleep_ms(100)
+        await asyncio.sleep_ms(100)
+
 
 def restart_and_reconnect():
     aika = ratkaise_aika()
     print('%s: Ongelmia. Boottaillaan 5s kuluttua.' % aika)
-    vilkuta_ledi(10)
-    time.sleep(5)
+    utime.sleep(5)
     machine.reset()
     # resetoidaan
 
-def uusi_lampo_ja_kosteus():
-    # jostain syysta client.connect() ei toimi funktion sisalla kuin pari kertaa
-    # siksi otetaan aina uusi yhteys ja katkaistaan yhteys
-    global kosteus
-    global lampo
-    aika = ratkaise_aika()
-    print("%s Odotetaan uutta lampoa ja kosteutta..." %aika)
-    mqtt_palvelin_yhdista()
-    client.wait_msg()
-    aika = ratkaise_aika()
-    print("%s Uusi lampo %s ja kosteus %s" % (aika, lampo, kosteus))
-    client.disconnect()
 
-def palauta_PPM():
-    global lampo
-    global kosteus
-    aika = ratkaise_aika()
-    """Lukee viimeisimmän temp- ja Rh arvot mtqq:lta ja luo mq135-sensoriobjektin"""
-    # setup
-    mqtt_palvelin_yhdista()   # lampo ja kosteus pitaisi olla muuttunut oletuksesta
-    print("%s Odotellaan ensimmaista arvoa mqtt:lle..." %aika)
-    client.wait_msg()
-    temperature = float(lampo)
-    humidity = float(kosteus)
-    client.disconnect()
-    print ("Lampo %s, kosteus %s" %(temperature, humidity))
-    mq135 = MQ135(Pin(MQ135_PINNI))  # objektin luonti, analogi PIN 0 ESP32 ADC0
-    ppm_lista = []  # keskiarvon laskentaa varten
-    aika = ratkaise_aika()
-    print("%s Luetaan ensimmaiset 60 arvoa listalle kerran sekunnissa ... odota" %aika)
-    # looppi
+async def mqtt_raportoi():
+    """Lähettää uuden ppm-arvon kun se julkaistaan väylällä, muuttumattoman MQTT_TOISTO ikkunan välein"""
     while True:
+        #  Aikakatkaisu vain jotta muuttumaton arvo toistetaan
+        if not await mqtt_tilaus.wait(30000) or not mqtt_tilaus.changed('ppm'):
+            continue
         try:
-            # luetaan sensorilta uusi tieto
-            ppm_lista.append(mq135.get_corrected_ppm(temperature, humidity))
-            vilkuta_ledi(1)
-        except ValueError:
-            pass
-
-        #print("MQ135 RZero: " + str(rzero) + "\t Corrected RZero: " + str(corrected_rzero) +
-        #        "\t Resistance: " + str(resistance) + "\t PPM: " + str(ppm) +
-        #        "\t Corrected PPM: " + str(corrected_ppm) + "ppm")
-        # lasketaan minuutin keskiarvo PPM:lle
-        if len(ppm_lista) == 60:
-            keskiarvo = sum(ppm_lista) / len(ppm_lista)
-            print("Tallennettava keskiarvo on: %s " %keskiarvo)
-            # julkaistaan keskiarvo mqtt
-            laheta_ppm_mqtt(keskiarvo)
-            vilkuta_ledi(2)
-            ppm_lista.clear() # nollataan lista
-            # Odotetaan uutta lampo ja kosteus
-            uusi_lampo_ja_kosteus()
-            temperature = float(lampo)
-            humidity = float(kosteus)
-            aika = ratkaise_aika()
-            print ("%s Luetaan seuraavat 60 arvoa listalle... odota" %aika)
-        time.sleep(1)  # lukuvali 1s.
+            await client.publish(SISA_PPM, str(bus.get('ppm')), retain=False, qos=0)  # julkaistaan ppm arvo
+        except OSError as e:
+            print("%s: Ei voida julkaista! %s" % (ratkaise_aika(), e))
+            continue
+        mqtt_tilaus.consumed('ppm')
+        asyncio.create_task(vilkuta_ledi(2))
+
+
+async def palauta_PPM():
+    """Lukee sensoria kerran sekunnissa, minuutin keskiarvo korjataan viimeisimmillä temp- ja Rh-arvoilla"""
+    mq135 = MQ135(Pin(MQ135_PINNI))  # objektin luonti, analogi PIN 0 ESP32 ADC0
+    lukemat = array('f', bytes(4 * IKKUNA))  # suodatetut ADC-lukemat
+    n = 0
+    print("%s Luetaan ensimmaiset %s arvoa listalle kerran sekunnissa ... odota" % (ratkaise_aika(), IKKUNA))
+    while True:
+        arvo = mq135.adc.sample()
+        lukemat[n] = arvo if arvo else 0
+        n += 1
+        if n == IKKUNA:
+            n = 0
+            lampo = bus.get('lampo')
+            kosteus = bus.get('kosteus')
+            if lampo is None or kosteus is None:
+                print("%s Lampoa ja kosteutta ei viela saatu, ppm ilman korjausta" % ratkaise_aika())
+            keskiarvo = mq135.ppm_ikkuna(lukemat, IKKUNA, lampo, kosteus)
+            if keskiarvo is not None:
+                print("Tallennettava keskiarvo on: %s (lampo %s, kosteus %s, %s s sitten)" %
+                      (keskiarvo, lampo, kosteus, bus.age('lampo')))
+                # julkaistaan keskiarvo väylälle, mqtt_raportoi lähettää sen
+                bus.publish('ppm', round(keskiarvo, 1))
+            gc.collect()
+        await asyncio.sleep(1)  # lukuvali 1s.
+
+
+async def main():
+    try:
+        await client.connect()
+    except OSError as e:
+        print("%s:  Ei voida yhdistaa! %s" % (ratkaise_aika(), e))
+        restart_and_reconnect()
+    asyncio.create_task(palauta_PPM())
+    asyncio.create_task(mqtt_raportoi())
+    while True:
+        await asyncio.sleep(60)
+
 
 if __name__ == "__main__":
-    palauta_PPM()
+    try:
+        asyncio.run(main())
+    finally:
+        asyncio.new_event_loop()
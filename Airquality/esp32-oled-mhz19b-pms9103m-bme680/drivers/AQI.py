@@ -1,56 +1,151 @@
+"""
+US EPA Air Quality Index for PM2.5 and PM10.
+
+Breakpoint tables are rows (C_low, C_high, I_low, I_high). The row is found by bisecting C_high, the slope of
+each row is precomputed, so one sub-index is a few comparisons and one multiply. PM2.5 uses the 2024 revision
+(0 - 9.0 ug/m3 is Good, 301 - 500 is one Hazardous row), the 2012 table is kept in _PM2_5_2012. Concentrations
+are truncated like EPA does (PM2.5 to 0.1, PM10 to 1 ug/m3), above the table the last row is extrapolated.
+
+    AQI.PM2_5(12.0)      # 56
+    AQI.PM10_0(155)      # 101
+    AQI.aqi(12.0, 155)   # 101, the larger sub-index
+
+NowCast averages the last 12 complete hours with weight w ** age, w = min / max of the hours but at least 0.5.
+add() accumulates the current hour, the weighting is calculated once when the hour changes. Two of the three
+latest hours must have data, otherwise value is None.
+
+    nc = NowCast()
+    pm = nc.add(pms_dictionary['PM2_5_ATM'])     # NowCast ug/m3 or None
+"""
+from array import array
+import utime
+
+
+def _prep(rows):
+    return tuple((c_low, c_high, i_low, (i_high - i_low) / (c_high - c_low)) for c_low, c_high, i_low, i_high in rows)
+
+
 class AQI:
-    #  Source https://github.com/pkucmus/micropython-pms7003/blob/master/aqi.py
-
-    AQI = (
-        (0, 50),
-        (51, 100),
-        (101, 150),
-        (151, 200),
-        (201, 300),
-        (301, 400),
-        (401, 500),
-    )
-
-    _PM2_5 = (
-        (0, 12),
-        (12.1, 35.4),
-        (35.5, 55.4),
-        (55.5, 150.4),
-        (150.5, 250.4),
-        (250.5, 350.4),
-        (350.5, 500.4),
-    )
-
-    _PM10_0 = (
-        (0, 54),
-        (55, 154),
-        (155, 254),
-        (255, 354),
-        (355, 424),
-        (425, 504),
-        (505, 604),
-    )
+    #  Original source https://github.com/pkucmus/micropython-pms7003/blob/master/aqi.py, tables from EPA
 
-    @classmethod
-    def PM2_5(cls, data):
-        return cls._calculate_aqi(cls._PM2_5, data)
+    _PM2_5 = _prep((
+        (0.0, 9.0, 0, 50),
+        (9.1, 35.4, 51, 100),
+        (35.5, 55.4, 101, 150),
+        (55.5, 125.4, 151, 200),
+        (125.5, 225.4, 201, 300),
+        (225.5, 325.4, 301, 500),
+    ))
+
+    _PM2_5_2012 = _prep((
+        (0.0, 12.0, 0, 50),
+        (12.1, 35.4, 51, 100),
+        (35.5, 55.4, 101, 150),
+        (55.5, 150.4, 151, 200),
+        (150.5, 250.4, 201, 300),
+        (250.5, 350.4, 301, 400),
+        (350.5, 500.4, 401, 500),
+    ))
+
+    _PM10_0 = _prep((
+        (0, 54, 0, 50),
+        (55, 154, 51, 100),
+        (155, 254, 101, 150),
+        (255, 354, 151, 200),
+        (355, 424, 201, 300),
+        (425, 604, 301, 500),
+    ))
 
     @classmethod
-    def PM10_0(cls, data):
-        return cls._calculate_aqi(cls._PM10_0, data)
+    def PM2_5(cls, data, table=None):
+        return cls._calculate_aqi(table or cls._PM2_5, int(data * 10 + 1e-6) / 10)
 
     @classmethod
-    def _calculate_aqi(cls, breakpoints, data):
-        for index, data_range in enumerate(breakpoints):
-            if data <= data_range[0]:
-                break
+    def PM10_0(cls, data):
+        return cls._calculate_aqi(cls._PM10_0, int(data + 1e-6))
 
-        i_low, i_high = cls.AQI[index]
-        C_low, c_high = data_range
-        return (i_high - i_low) / (c_high - C_low) * (data - C_low) + i_low
+    @staticmethod
+    def _calculate_aqi(breakpoints, data):
+        if data < 0:
+            return None
+        lo = 0
+        hi = len(breakpoints) - 1
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if data > breakpoints[mid][1]:
+                lo = mid + 1
+            else:
+                hi = mid
+        c_low, _, i_low, slope = breakpoints[lo]
+        return int(slope * (data - c_low) + i_low + 0.5)
 
     @classmethod
     def aqi(cls, pm2_5_atm, pm10_0_atm):
         pm2_5 = cls.PM2_5(pm2_5_atm)
         pm10_0 = cls.PM10_0(pm10_0_atm)
-        return max(pm2_5, pm10_0)
\ No newline at end of file
+        return max(pm2_5, pm10_0)
+
+
+class NowCast(object):
+
+    def __init__(self, hours=12):
+        self.ring = array('f', [-1.0] * hours)  # Hourly averages, -1 = no data, newest at head
+        self.head = 0
+        self.hour = None
+        self.acc = 0.0
+        self.n = 0
+        self.value = None
+
+    def add(self, data, now=None):
+        """ One reading (ug/m3) into the current hour, returns the NowCast of the complete hours """
+        hour = (utime.time() if now is None else now) // 3600
+        if self.hour is None:
+            self.hour = hour
+        elif hour != self.hour:
+            self._close(hour - self.hour)
+            self.hour = hour
+        self.acc += data
+        self.n += 1
+        return self.value
+
+    def _push(self, data):
+        self.head = (self.head + 1) % len(self.ring)
+        self.ring[self.head] = data
+
+    def _close(self, elapsed):
+        self._push(self.acc / self.n if self.n else -1.0)
+        for _ in range(min(elapsed, len(self.ring)) - 1):
+            self._push(-1.0)  # Hours without readings
+        self.acc = 0.0
+        self.n = 0
+        self.value = self._calculate()
+
+    def _calculate(self):
+        ring = self.ring
+        size = len(ring)
+        recent = 0
+        for i in range(3):
+            if ring[(self.head - i) % size] >= 0:
+                recent += 1
+        if recent < 2:
+            return None
+        c_min = c_max = None
+        for c in ring:
+            if c >= 0:
+                if c_min is None or c < c_min:
+                    c_min = c
+                if c_max is None or c > c_max:
+                    c_max = c
+        w = c_min / c_max if c_max > 0 else 1.0
+        if w < 0.5:
+            w = 0.5
+        total = 0.0
+        weights = 0.0
+        f = 1.0
+        for i in range(size):
+            c = ring[(self.head - i) % size]
+            if c >= 0:
+                total += f * c
+                weights += f
+            f *= w
+        return total / weights
@@ -418,4 +418,4 @@ class BME680_SPI(Adafruit_BME680):
         spi_mem_page = 0x00
         if register < 0x80:
             spi_mem_page = 0x10
-        self._write(_BME680_REG_PAGE_SELECT, [spi_mem_page])
\ No newline at end of file
+        self._write(_BME680_REG_PAGE_SELECT, [spi_mem_page])
@@ -0,0 +1,195 @@
+"""
+Bounded error/event log, replaces log_errors() append + readlines() + rewrite.
+
+Records are fixed size (rec_size bytes, padded, ends with \\r\\n) and collected into a RAM ring. Async flusher
+appends the pending records to segment files /errors0.csv ... /errors<N-1>.csv. When a segment is full, the next
+one is truncated and used. Flash is only appended to, there is no read-modify-write, and the log never uses more
+than segments * seg_size bytes. The segment in use is kept in <path>.seg (written at rotation only), so after a
+reboot with all segments full the oldest one is overwritten next. Long messages are cut on a UTF-8 character
+boundary.
+
+CRITICAL records are written immediately (typically logged just before reset()). Records below level are
+dropped. Optional forwarder, for example MQTT publish, receives records at or above fwd_level.
+
+Usage:
+    elog = EventLog(date_fn=lambda: "%s %s" % resolve_date()[:2])
+    elog.log("MQTT connect error", ERROR)
+    elog.forward = forward_coro           # async def forward_coro(text)
+    loop.create_task(elog.flush_loop())
+    elog.dump()                           # print oldest to newest
+"""
+import os
+import uasyncio as asyncio
+from utime import time
+
+DEBUG = 10
+INFO = 20
+WARNING = 30
+ERROR = 40
+CRITICAL = 50
+LEVELS = {DEBUG: 'D', INFO: 'I', WARNING: 'W', ERROR: 'E', CRITICAL: 'C'}
+
+
+class EventLog(object):
+
+    def __init__(self, path='/errors', segments=4, seg_size=1024, rec_size=64, ring=16, level=WARNING,
+                 flush_ms=5000, date_fn=None, fwd_level=ERROR, fwd_timeout=5):
+        self.path = path
+        self.segments = segments
+        self.rec_size = rec_size
+        self.per_seg = seg_size // rec_size
+        self.ring_len = ring
+        self.ring = bytearray(ring * rec_size)
+        self.lvls = bytearray(ring)
+        self.mv = memoryview(self.ring)
+        self.pad = memoryview(b' ' * rec_size)
+        self.head = 0  # Next slot to write
+        self.pending = 0  # Records not yet on flash
+        self.level = level
+        self.flush_ms = flush_ms
+        self.date_fn = date_fn
+        self.forward = None
+        self.fwd_level = fwd_level
+        self.fwd_timeout = fwd_timeout
+        self.fwd_pending = 0
+        self.event = asyncio.Event()
+        self.last_error = None
+        self.seg, self.seg_recs = self._find_segment()
+        # Statistics
+        self.records = 0
+        self.filtered = 0
+        self.overwritten = 0  # Ring overflow before flush
+        self.flushes = 0
+        self.bytes_written = 0
+        self.write_errors = 0
+        self.forwarded = 0
+        self.fwd_errors = 0
+
+    def _name(self, seg):
+        return "%s%s.csv" % (self.path, seg)
+
+    def _find_segment(self):
+        """ Current segment is the first one which is not full. After rotation only one is not full """
+        for seg in range(self.segments):
+            try:
+                size = os.stat(self._name(seg))[6]
+            except OSError:
+                size = 0
+            recs = size // self.rec_size
+            if recs < self.per_seg:
+                return seg, recs
+        # All full: the saved segment was written last, next write rotates to the oldest one after it
+        try:
+            with open("%s.seg" % self.path, 'r') as f:
+                seg = int(f.read())
+        except (OSError, ValueError):
+            seg = self.segments - 1
+        return seg % self.segments, self.per_seg
+
+    def log(self, msg, level=ERROR):
+        if level < self.level:
+            self.filtered += 1
+            return
+        if level >= ERROR:
+            self.last_error = msg
+        try:
+            stamp = self.date_fn() if self.date_fn is not None else time()
+        except Exception:
+            stamp = time()  # Clock or timezone not ready yet
+        text = "%s,%s,%s" % (stamp, LEVELS.get(level, 'E'), msg)
+        rec = text.encode()
+        if len(rec) > self.rec_size - 2:
+            cut = self.rec_size - 2
+            while cut > 0 and rec[cut] & 0xC0 == 0x80:
+                cut -= 1  # Continuation byte, do not split the character
+            rec = rec[:cut]
+        start = self.head * self.rec_size
+        end = start + self.rec_size
+        self.ring[start:start + len(rec)] = rec
+        self.ring[start + len(rec):end - 2] = self.pad[:self.rec_size - 2 - len(rec)]
+        self.ring[end - 2] = 0x0D
+        self.ring[end - 1] = 0x0A
+        self.lvls[self.head] = level
+        self.head = (self.head + 1) % self.ring_len
+        self.records += 1
+        if self.pending == self.ring_len:
+            self.overwritten += 1
+        else:
+            self.pending += 1
+        if self.fwd_pending < self.ring_len:
+            self.fwd_pending += 1
+        if level >= CRITICAL:
+            self.flush()
+        else:
+            self.event.set()
+
+    def flush(self):
+        """ Append pending records to flash, rotate segments when full """
+        if self.pending == 0:
+            return 0
+        written = 0
+        first = (self.head - self.pending) % self.ring_len
+        try:
+            while self.pending > 0:
+                if self.seg_recs >= self.per_seg:
+                    self.seg = (self.seg + 1) % self.segments
+                    self.seg_recs = 0
+                    mode = 'wb'
+                    with open("%s.seg" % self.path, 'w') as f:
+                        f.write(str(self.seg))
+                else:
+                    mode = 'ab'
+                n = min(self.pending, self.per_seg - self.seg_recs, self.ring_len - first)
+                with open(self._name(self.seg), mode) as f:
+                    f.write(self.mv[first * self.rec_size:(first + n) * self.rec_size])
+                written += n * self.rec_size
+                self.seg_recs += n
+                self.pending -= n
+                first = (first + n) % self.ring_len
+        except OSError as e:
+            self.write_errors += 1
+            print("EventLog: can not write %s: %s" % (self._name(self.seg), e))
+        self.flushes += 1
+        self.bytes_written += written
+        return written
+
+    async def _forward(self):
+        first = (self.head - self.fwd_pending) % self.ring_len
+        while self.fwd_pending > 0:
+            i = first
+            first = (first + 1) % self.ring_len
+            self.fwd_pending -= 1
+            if self.lvls[i] < self.fwd_level:
+                continue
+            try:
+                text = bytes(self.mv[i * self.rec_size:(i + 1) * self.rec_size]).decode().rstrip()
+                await asyncio.wait_for(self.forward(text), self.fwd_timeout)
+                self.forwarded += 1
+            except Exception:
+                self.fwd_errors += 1
+
+    async def flush_loop(self):
+        """ Batches records: waits for the first one, then flush_ms for more """
+        while True:
+            await self.event.wait()
+            self.event.clear()
+            await asyncio.sleep_ms(self.flush_ms)
+            self.flush()
+            if self.forward is not None:
+                await self._forward()
+            else:
+                self.fwd_pending = 0
+
+    def bytes_per_record(self):
+        written = self.records - self.overwritten - self.pending
+        return self.bytes_written / written if written > 0 else 0
+
+    def dump(self):
+        """ Print segments oldest to newest """
+        for i in range(1, self.segments + 1):
+            try:
+                with open(self._name((self.seg + i) % self.segments), 'r') as f:
+                    for line in f:
+                        print(line.rstrip())
+            except OSError:
+                pass
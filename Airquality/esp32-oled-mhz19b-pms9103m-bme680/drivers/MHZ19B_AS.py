@@ -15,115 +15,223 @@ if reset_cause() == 1:
 
 20.01.2020: Added crc_errors and range_error counters. CRC error increase if bytearray is wrong, range error
             increase if read value is over sensor's set range.
+
+19.10.2026: Request / response rework.
+            - command() owns one StreamReader / StreamWriter pair. Stale input is flushed before the request and
+              the reply is awaited with timeout_ms, a missed reply counts in timeouts instead of hanging the task.
+              Reply is searched from the byte stream: bytes before 0xFF are dropped (sync_drops), a 9 byte frame
+              with wrong command byte or checksum is shifted to the next 0xFF inside it (crc_errors).
+            - ABC, zero point, span and range commands are awaited coroutines and really send.
+              measuring_range is an int (ppm).
+            - read_interval is the sampling cadence (minimum 2 s, for example 5 s), average_time (s) the length of
+              the rolling average. Average is a ring buffer with a running sum, O(1) per sample.
+            - First value is read right after preheat_time, not one read_interval later.
+            - on_sample(sensor) is called after each new reading, for example to publish it on SAMPLEBUS_AS.
+            - read_ticks is the ticks_ms() of the last reading (of the start before the first one), for supervision.
+
+    co2 = MHZ19bCO2(uart=2, rxpin=25, txpin=27, read_interval=5)
+    asyncio.create_task(co2.read_co2_loop())
+    await co2.set_abc(False)
+    await co2.set_range(2000)
+    print(co2.co2_value, co2.co2_average, co2.timeouts, co2.crc_errors, co2.sync_drops)
 """
 
+from array import array
 import utime
 from machine import UART
 import uasyncio as asyncio
 
+CMD_READ = 0x86
+CMD_ZERO = 0x87
+CMD_SPAN = 0x88
+CMD_ABC = 0x79
+CMD_RANGE = 0x99
+RANGES = (2000, 5000, 10000)
+MIN_IVAL = 2  # Datasheet: minimum read frequency 2 seconds
+ZERO_HEAT = 20 * 60  # Sensor must be heated 20 minutes before zero point calibration
+
 
 class MHZ19bCO2:
 
     # Default UART2, rx=16, tx=17, you shall change these in the call
-    def __init__(self, uart=2, rxpin=25, txpin=27):
-        self.sensor = UART(uart)
-        self.sensor.init(baudrate=9600, bits=8, parity=None, stop=1, tx=txpin, rx=rxpin)
+    def __init__(self, uart=2, rxpin=25, txpin=27, read_interval=120, average_time=2400, preheat_time=180,
+                 timeout_ms=500):
+        self.sensor = UART(uart, baudrate=9600, bits=8, parity=None, stop=1, rx=rxpin, tx=txpin)
+        self.port_r = asyncio.StreamReader(self.sensor)
+        self.port_w = asyncio.StreamWriter(self.sensor, {})
+        self.lock = asyncio.Lock()  # One request on the wire at a time
+        self.tx = bytearray(9)
+        self.rx = bytearray(9)
+        self.timeout_ms = timeout_ms
         self.zeropoint_calibrated = False
         self.co2_value = None
-        self.co2_averages = []
-        self.co2_average_values = 20
         self.co2_average = None
+        self.read_interval = max(MIN_IVAL, read_interval)
+        self.co2_average_values = max(1, average_time // self.read_interval)
+        self.co2_averages = array('H', bytes(2 * self.co2_average_values))  # Ring buffer
+        self.avg_count = 0
+        self.avg_index = 0
+        self.avg_sum = 0
         self.sensor_activation_time = utime.time()
         self.value_read_time = utime.time()
+        self.read_ticks = utime.ticks_ms()  # Supervisor stamp, last progress. Not moved by RTC sync
         self.crc_errors = 0
         self.range_errors = 0
-        self.measuring_range = '0_5000'  # default
-        self.preheat_time = 10   # shall be 180 or more, during testing you can use 10 sec
-        self.read_interval = 120  # shall be 120 or more
-        self.READ_COMMAND = bytearray(b'\xFF\x01\x86\x00\x00\x00\x00\x00\x79')
-        self.CALIBRATE_ZEROPOINT = bytearray(b'\xFF\x01\x87\x00\x00\x00\x00\x00\x78')
-        self.CALIBRATE_SPAN = bytearray(b'\xFF\x01\x88\x07\xD0\x00\x00\x00\xA0')
-        self.SELF_CALIBRATION_ON = bytearray(b'\xFF\x01\x79\xA0\x00\x00\x00\x00\xE6')
-        self.SELF_CALIBRATION_OFF = bytearray(b'\xFF\x01\x79\x00\x00\x00\x00\x00\x86')
-        self.MEASURING_RANGE_0_2000PPM = bytearray(b'\xFF\x01\x99\x00\x00\x00\x07\xD0\x8F')
-        self.MEASURING_RANGE_0_5000PPM = bytearray(b'\xFF\x01\x99\x00\x00\x00\x13\x88\xCB')
-        self.MEASURING_RANGE_0_10000PPM = bytearray(b'\xFF\x01\x99\x00\x00\x00\x27\x10\x2F')
+        self.timeouts = 0
+        self.sync_drops = 0
+        self.requests = 0
+        self.request_ms = 0  # Last reply time
+        self.measuring_range = 5000  # default
+        self.preheat_time = preheat_time   # shall be 180 or more, during testing you can use 10 sec
+        self.abc = None  # Unknown until set_abc()
+        self.on_sample = None
         self.debug = False
 
-    async def writer(self, data):
-        port = asyncio.StreamWriter(self.sensor, {})
-        port.write(data)
-        await port.drain()    # Transmit begins
-        await asyncio.sleep(2)   # Minimum read frequency 2 seconds
-
-    async def reader(self, chars):
-        port = asyncio.StreamReader(self.sensor)
-        data = await port.readexactly(chars)
-        if self.debug is True:
-            print("MHZ reader data %s" % data)
-        return data
+    def _frame(self, cmd, b3=0, b4=0, b5=0, b6=0, b7=0):
+        tx = self.tx
+        tx[0] = 0xFF
+        tx[1] = 0x01
+        tx[2] = cmd
+        tx[3] = b3
+        tx[4] = b4
+        tx[5] = b5
+        tx[6] = b6
+        tx[7] = b7
+        tx[8] = self._calculate_crc(tx)
+        return tx
+
+    async def _reply(self, cmd):
+        """ Feeds bytes into rx until a valid reply to cmd, resynchronises on 0xFF """
+        rx = self.rx
+        n = 0
+        while True:
+            data = await self.port_r.read(9 - n)
+            for b in data:
+                if n == 0 and b != 0xFF:
+                    self.sync_drops += 1
+                    continue
+                rx[n] = b
+                n += 1
+                if n < 9:
+                    continue
+                if rx[1] == cmd and self._calculate_crc(rx) == rx[8]:
+                    return rx
+                self.crc_errors += 1
+                # Next frame may start inside the rejected one
+                n = 0
+                for i in range(1, 9):
+                    if rx[i] == 0xFF:
+                        n = 9 - i
+                        rx[:n] = rx[i:]
+                        break
+                self.sync_drops += 9 - n
+
+    async def command(self, cmd, b3=0, b4=0, b5=0, b6=0, b7=0, reply=False, timeout_ms=None):
+        """ Sends one command. With reply=True returns the 9 byte reply or None on timeout """
+        async with self.lock:
+            while self.sensor.any():
+                self.sync_drops += len(self.sensor.read() or b'')
+            self.port_w.write(self._frame(cmd, b3, b4, b5, b6, b7))
+            await self.port_w.drain()    # Transmit begins
+            self.requests += 1
+            if not reply:
+                return None
+            start = utime.ticks_ms()
+            try:
+                data = await asyncio.wait_for_ms(self._reply(cmd), timeout_ms or self.timeout_ms)
+            except asyncio.TimeoutError:
+                self.timeouts += 1
+                return None
+            self.request_ms = utime.ticks_diff(utime.ticks_ms(), start)
+            if self.debug is True:
+                print("MHZ reply %s in %s ms" % (bytes(data), self.request_ms))
+            return data
+
+    async def read_co2(self):
+        """ One reading into co2_value and the rolling average, None on timeout or out of range """
+        data = await self.command(CMD_READ, reply=True)
+        if data is None:
+            return None
+        co2 = self._data_to_co2_level(data)
+        if co2 > self.measuring_range:
+            self.co2_value = None
+            self.range_errors += 1
+            return None
+        self.co2_value = co2
+        self.calculate_average(co2)
+        self.value_read_time = utime.time()
+        self.read_ticks = utime.ticks_ms()
+        if self.on_sample is not None:
+            self.on_sample(self)
+        return co2
 
     async def read_co2_loop(self):
+        #  By the datasheet, preheat shall be 3 minutes. First reading is done as soon as it ends
+        heat = self.preheat_time - (utime.time() - self.sensor_activation_time)
+        if heat > 0:
+            await asyncio.sleep(heat)
         while True:
-            if (utime.time() - self.sensor_activation_time) < self.preheat_time:
-                #  By the datasheet, preheat shall be 3 minutes
-                await asyncio.sleep(self.read_interval)
-            elif (utime.time() - self.value_read_time) > self.read_interval:
-                try:
-                    await self.writer(self.READ_COMMAND)
-                    readbuffer = bytearray(await self.reader(9))
-                    if readbuffer[0] == 0xff and self._calculate_crc(readbuffer) == readbuffer[8]:
-                        self.co2_value = self._data_to_co2_level(readbuffer)
-                        if self.co2_value > int(self.measuring_range):
-                            self.co2_value = None
-                            self.range_errors += 1
-                        else:
-                            self.calculate_average(self.co2_value)
-                            self.value_read_time = utime.time()
-                    else:
-                        self.crc_errors += 1
-                except TypeError:
-                    pass
+            await self.read_co2()
             await asyncio.sleep(self.read_interval)
 
     def calculate_average(self, co2):
-        if co2 is not None:
-            self.co2_averages.append(co2)
-            self.co2_average = (sum(self.co2_averages) / len(self.co2_averages))
-            #  read 20 values, delete oldest
-        if len(self.co2_averages) == self.co2_average_values:
-            self.co2_averages.pop(0)
-
-    def calibrate_zeropoint(self):
-        if utime.time() - self.sensor_activation_time > (20 * 60):
-            self.writer(self.CALIBRATE_ZEROPOINT)
+        if co2 is None:
+            return
+        ring = self.co2_averages
+        i = self.avg_index
+        if self.avg_count == self.co2_average_values:
+            self.avg_sum -= ring[i]
+        else:
+            self.avg_count += 1
+        ring[i] = co2
+        self.avg_sum += co2
+        self.avg_index = (i + 1) % self.co2_average_values
+        self.co2_average = self.avg_sum / self.avg_count
+
+    async def calibrate_zeropoint(self):
+        """ Sensor must be in 400 ppm (outdoor) air """
+        if utime.time() - self.sensor_activation_time > ZERO_HEAT:
+            await self.command(CMD_ZERO)
             self.zeropoint_calibrated = True
         else:
             print("Prior calibration sensor must be heated at least 20 minutes!")
 
-    def calibrate_span(self):
+    async def calibrate_span(self, ppm=2000):
         if self.zeropoint_calibrated is True:
-            self.writer(self.CALIBRATE_SPAN)
+            await self.command(CMD_SPAN, ppm >> 8, ppm & 0xFF)
         else:
             print("Zeropoint must be calibrated first!")
 
-    def selfcalibration_on(self):
-        self.writer(self.SELF_CALIBRATION_ON)
+    async def set_abc(self, on):
+        """ Automatic baseline correction (24 h cycle), on by default in the sensor """
+        await self.command(CMD_ABC, 0xA0 if on else 0x00)
+        self.abc = bool(on)
+
+    async def set_range(self, ppm):
+        if ppm not in RANGES:
+            raise ValueError("range %s, supported %s" % (ppm, RANGES))
+        await self.command(CMD_RANGE, b6=ppm >> 8, b7=ppm & 0xFF)
+        self.measuring_range = ppm
+
+    async def selfcalibration_on(self):
+        await self.set_abc(True)
+
+    async def selfcalibration_off(self):
+        await self.set_abc(False)
 
-    def selfcalibration_off(self):
-        self.writer(self.SELF_CALIBRATION_OFF)
+    async def measuring_range_0_2000_ppm(self):
+        await self.set_range(2000)
 
-    def measuring_range_0_2000_ppm(self):
-        self.writer(self.MEASURING_RANGE_0_2000PPM)
-        self.measuring_range = '0_2000'
+    async def measuring_range_0_5000_ppm(self):
+        await self.set_range(5000)
 
-    def measuring_range_0_5000_ppm(self):
-        self.writer(self.MEASURING_RANGE_0_5000PPM)
-        self.measuring_range = '0_5000'
+    async def measuring_range_0_10000_ppm(self):
+        await self.set_range(10000)
 
-    def measuring_range_0_10000_ppm(self):
-        self.writer(self.MEASURING_RANGE_0_10000PPM)
-        self.measuring_range = '0_10000'
+    def stats(self):
+        return ("requests %s, timeouts %s, crc errors %s, sync drops %s, range errors %s, last reply %s ms" %
+                (self.requests, self.timeouts, self.crc_errors, self.sync_drops, self.range_errors,
+                 self.request_ms))
 
     @staticmethod
     # Borrowed from https://github.com/dr-mod/co2-monitoring-station/blob/master/mhz19b.py
@@ -131,7 +239,7 @@ class MHZ19bCO2:
         if len(readbuffer) != 9:
             return None
         crc = sum(readbuffer[1:8])
-        return (~(crc & 0xff) & 0xff) + 1
+        return ((~(crc & 0xff) & 0xff) + 1) & 0xff
 
     @staticmethod
     def _data_to_co2_level(data):
@@ -642,4 +642,4 @@ class MQTTClient(MQTT_base):
                 return await super().publish(topic, msg, retain, qos)
             except OSError:
                 pass
-            self._reconnect()  # Broker or WiFi fail
\ No newline at end of file
+            self._reconnect()  # Broker or WiFi fail
@@ -224,4 +224,4 @@ class SH1106_SPI(SH1106):
             self.spi.write(buf)
 
     def reset(self):
-        super().reset(self.res)
\ No newline at end of file
+        super().reset(self.res)
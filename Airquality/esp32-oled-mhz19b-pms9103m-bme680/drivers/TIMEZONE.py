@@ -0,0 +1,103 @@
+"""
+Timezone and DST engine.
+
+DST transition epochs are computed once per year and cached until the year rolls over, local time and formatted
+date strings are cached per second. Calling format_date() several times per screen refresh costs one lookup.
+
+Rules are (month, weekday, occurrence, hour) as in runtimeconfig.json:
+    weekday 0 = Monday ... 6 = Sunday, occurrence 2 = last, otherwise nth occurrence in the month,
+    hour is in local standard (winter) time. EU rules for Finland: (3, 6, 2, 3) and (10, 6, 2, 3), timezone 2.
+
+Usage:
+    tz = TimeZone(2, (3, 6, 2, 3), (10, 6, 2, 3))
+    day, hours, wday = tz.format_date()   # '19.10.2026', '14:05:09', 'Mo'
+    tz.local_now()                        # localtime() tuple in local time
+"""
+from utime import time, localtime, mktime
+
+
+def weekday(year, month, day):
+    """ Weekday of the date, Monday is 0 and Sunday is 6 """
+    t = (0, 3, 2, 5, 0, 3, 5, 1, 4, 6, 2, 4)
+    if month < 3:
+        year -= 1
+    return (year + year // 4 - year // 100 + year // 400 + t[month - 1] + day + 6) % 7
+
+
+def days_in_month(year, month):
+    if month == 2:
+        return 29 if (year % 4 == 0 and (year % 100 != 0 or year % 400 == 0)) else 28
+    return 30 if month in (4, 6, 9, 11) else 31
+
+
+def rule_day(year, month, wday, occurrence):
+    """ Day of month of the rule, no iteration over the month """
+    if occurrence == 2:
+        last = days_in_month(year, month)
+        return last - (weekday(year, month, last) - wday) % 7
+    return 1 + (wday - weekday(year, month, 1)) % 7 + 7 * (occurrence - 1)
+
+
+class TimeZone(object):
+
+    def __init__(self, timezone=2, begin=(3, 6, 2, 3), end=(10, 6, 2, 3), offset=1,
+                 weekdays=('Mo', 'Tu', 'We', 'Th', 'Fr', 'Sa', 'Su')):
+        self.std = timezone * 3600
+        self.dst = (timezone + offset) * 3600
+        self.begin = begin
+        self.end = end
+        self.weekdays = weekdays
+        self.year = None
+        self.y_start = 0
+        self.y_end = -1
+        self.dst_b = 0
+        self.dst_e = 0
+        self._t = None
+        self._lt = None
+        self._ft = None
+        self._fd = None
+
+    def _set_year(self, year):
+        """ Transition epochs (UTC) for the year """
+        self.year = year
+        self.y_start = mktime((year, 1, 1, 0, 0, 0, 0, 0))
+        self.y_end = mktime((year + 1, 1, 1, 0, 0, 0, 0, 0))
+        m, wd, occ, h = self.begin
+        self.dst_b = mktime((year, m, rule_day(year, m, wd, occ), h, 0, 0, 0, 0)) - self.std
+        m, wd, occ, h = self.end
+        self.dst_e = mktime((year, m, rule_day(year, m, wd, occ), h, 0, 0, 0, 0)) - self.std
+
+    def transitions(self, year):
+        """ (DST begin, DST end) as UTC epochs """
+        if year != self.year:
+            self._set_year(year)
+        return self.dst_b, self.dst_e
+
+    def is_dst(self, t):
+        if not (self.y_start <= t < self.y_end):
+            self._set_year(localtime(t)[0])
+        if self.dst_b < self.dst_e:
+            return self.dst_b <= t < self.dst_e
+        return (t >= self.dst_b) or (t < self.dst_e)  # Southern hemisphere
+
+    def utc_offset(self, t=None):
+        if t is None:
+            t = time()
+        return self.dst if self.is_dst(t) else self.std
+
+    def local_now(self):
+        t = time()
+        if t != self._t:
+            self._lt = localtime(t + self.utc_offset(t))
+            self._t = t
+        return self._lt
+
+    def format_date(self):
+        """ Returns (date, time, weekday) strings, same format as old resolve_date() """
+        t = time()
+        if t != self._ft:
+            year, month, mdate, hour, minute, second, wday = self.local_now()[:7]
+            self._fd = ("%s.%s.%s" % (mdate, month, year), "%02d:%02d:%02d" % (hour, minute, second),
+                        self.weekdays[wday])
+            self._ft = t
+        return self._fd
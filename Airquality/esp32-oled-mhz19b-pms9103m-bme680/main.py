@@ -10,162 +10,155 @@ For webrepl, remember to execute import webrepl_setup one time.
 
 Version 0.4 Jari Hiltunen -  6.9.2024
 """
+from drivers.BOOTPROF import boot_mark, prof
+from drivers.MEMMGR_AS import mem
+prof.begin("imports")
 import json
 from machine import SoftI2C, Pin, freq, reset, ADC, TouchPad
 import uasyncio as asyncio
-from utime import time, mktime, localtime, sleep
+from utime import time, sleep
 import gc
-import os
 import drivers.WIFICONN_AS as WIFINET
 import drivers.BME680 as BMES
 import drivers.SH1106 as DP
 import drivers.PMS9103M_AS as PARTS
 import drivers.MHZ19B_AS as CO2
-from drivers.AQI import AQI
-from json import load
+import drivers.RUNCONF as RUNCONF
+import drivers.EVENTLOG_AS as ELOG
+import drivers.SUPERVISOR_AS as SUP
+import drivers.TIMEZONE as TIMEZONE
+import drivers.DEVINIT_AS as DEVINIT
+from drivers.SAMPLEBUS_AS import bus
+from drivers.AQI import AQI, NowCast
 from drivers.MQTT_AS import MQTTClient, config
 from machine import reset_cause
-from machine import WDT
-gc.collect()
+mem.collect()
+prof.end()
 last_error = None
 
 if reset_cause() == 1:  # we do this for some UART issues
     reset()
 
-def log_errors(err_in):
-    global last_error
-    last_error = err_in
-
-    filename = "/errors.csv"
-    max_file_size_bytes = 1024  # 1KB
-
-    try:
-        # Open file in append mode and write the error
-        with open(filename, 'a+') as logf:
-            logf.write(f"{resolve_date()[0]},{str(err_in)}\r\n")
-    except OSError as e:
-        print(f"Cannot write to {filename}: {e}")
-        raise
-
-    # Check the file size and shrink/delete if needed
-    try:
-        file_stat = os.stat(filename)
-        file_size_bytes = file_stat[6]  # Index 6 corresponds to file size
-
-        if file_size_bytes > max_file_size_bytes:
-            with open(filename, 'r') as file:
-                lines = file.readlines()
-                # Keep only the last 1000 lines
-                lines = lines[-1000:]
-
-            with open(filename, 'w') as file:
-                file.writelines(lines)
+# Fixed size records in RAM ring, flush_loop() appends them to rotating /errors0-3.csv segments
+elog = ELOG.EventLog(date_fn=lambda: "%s %s" % resolve_date()[:2])
 
-    except OSError as e:
-        if e.args[0] == 2:  # File not found error
-            # File doesn't exist, create it
-            with open(filename, 'w') as file:
-                pass  # Just create an empty file
-        else:
-            print(f"Error while checking/shrinking the log file: {e}")
-            raise
 
+def log_errors(err_in, level=ELOG.ERROR):
+    global last_error
+    if level >= ELOG.ERROR:
+        last_error = err_in
+    elog.log(err_in, level)
 
 
 try:
-    f = open('parameters.py', "r")
     from parameters import I2C_SCL_PIN, I2C_SDA_PIN, MH_UART, MH_RX, MH_TX, PMS_UART, PMS_RX, PMS_TX
-    f.close()
-except OSError as err:  # open failed
-    log_errors("Parameters: %s" % err)
+except ImportError as err:
+    log_errors("Parameters: %s" % err, ELOG.CRITICAL)
     print("Error with parameters.py: ", err)
     raise OSError
 
+# Required runtimeconfig.json keys, checked once when the binary snapshot is compiled
+CONF_SCHEMA = {
+    str: ('SSID1', 'SSID2', 'PASSWORD1', 'PASSWORD2', 'MQTT_SERVER', 'MQTT_PASSWORD', 'MQTT_USER', 'MQTT_PORT',
+          'MQTT_SSL', 'CLIENT_ID', 'TOPIC_ERRORS', 'WEBREPL_PASSWORD', 'NTPSERVER', 'DHCP_NAME', 'TOPIC_TEMP',
+          'TOPIC_RH', 'TOPIC_PRESSURE', 'TOPIC_RGAS', 'TOPIC_CO2', 'T_AIRQ', 'T_PM1_0', 'T_PM1_0_ATM', 'T_PM2_5',
+          'T_PM2_5_ATM', 'T_PM10_0', 'T_PM10_0_ATM', 'T_PCNT_0_3', 'T_PCNT_0_5', 'T_PCNT_1_0', 'T_PCNT_2_5',
+          'T_PCNT_5_0', 'T_PCNT_10_0'),
+    int: ('MQTT_INTERVAL', 'START_WEBREPL', 'START_NETWORK', 'START_MQTT', 'SCREEN_UPDATE_INTERVAL',
+          'DEBUG_SCREEN_ACTIVE', 'SCREEN_TIMEOUT', 'DST_BEGIN_M', 'DST_BEGIN_DAY', 'DST_BEGIN_OCC', 'DST_BEGIN_TIME',
+          'DST_END_M', 'DST_END_DAY', 'DST_END_TIME', 'DST_END_OCC', 'DST_TIMEZONE'),
+    float: ('TEMP_TRESHOLD', 'TEMP_CORRECTION', 'RH_TRESHOLD', 'RH_CORRECTION', 'PRESSURE_CORRECTION',
+            'PRESSURE_TRESHOLD', 'RGAS_CORRECTION', 'RGAS_TRESHOLD', 'CO2_CORRECTION', 'CO2_TRESHOLD', 'AQ_THOLD'),
+}
+
+prof.begin("config")
 try:
-    f = open('runtimeconfig.json', 'r')
-    with open('runtimeconfig.json') as config_file:
-        data = load(config_file)
-        f.close()
-        sid1 = data['SSID1']
-        sid2 = data['SSID2']
-        pw1 = data['PASSWORD1']
-        pw2 = data['PASSWORD2']
-        mqtt_s = data['MQTT_SERVER']
-        mqtt_pwd = data['MQTT_PASSWORD']
-        mqtt_u = data['MQTT_USER']
-        mqtt_p = data['MQTT_PORT']
-        mqtt_ssl = data['MQTT_SSL']
-        mqtt_ival = data['MQTT_INTERVAL']
-        client_id = data['CLIENT_ID']
-        t_err = data['TOPIC_ERRORS']
-        webrepl_pwd = data['WEBREPL_PASSWORD']
-        ntp_s = data['NTPSERVER']
-        dhcp_n = data['DHCP_NAME']
-        start_wbl = data['START_WEBREPL']
-        start_net = data['START_NETWORK']
-        start_mqtt = data['START_MQTT']
-        s_upd_ival = data['SCREEN_UPDATE_INTERVAL']
-        deb_scr_a = data['DEBUG_SCREEN_ACTIVE']
-        scr_tout = data['SCREEN_TIMEOUT']
-        t_temp = data['TOPIC_TEMP']
-        temp_thold = data['TEMP_TRESHOLD']
-        temp_corr = data['TEMP_CORRECTION']
-        t_rh = data['TOPIC_RH']
-        rh_thold = data['RH_TRESHOLD']
-        rh_corr = data['RH_CORRECTION']
-        t_press = data['TOPIC_PRESSURE']
-        press_corr = data['PRESSURE_CORRECTION']
-        press_thold = data['PRESSURE_TRESHOLD']
-        t_gasr = data['TOPIC_RGAS']
-        gasr_corr = data['RGAS_CORRECTION']
-        gasr_thold = data['RGAS_TRESHOLD']
-        t_co2 = data['TOPIC_CO2']
-        co2_corr = data['CO2_CORRECTION']
-        co2_thold = data['CO2_TRESHOLD']
-        t_airq = data['T_AIRQ']
-        t_pm1_0 = data['T_PM1_0']
-        t_pm1_0_atm = data['T_PM1_0_ATM']
-        t_pm2_5 = data['T_PM2_5']
-        t_pm2_5_atm = data['T_PM2_5_ATM']
-        t_pm10_0 = data['T_PM10_0']
-        t_pm10_0_atm = data['T_PM10_0_ATM']
-        t_pcnt_0_3 = data['T_PCNT_0_3']
-        t_pcnt_0_5 = data['T_PCNT_0_5']
-        t_pcnt_1_0 = data['T_PCNT_1_0']
-        t_pcnt_2_5 = data['T_PCNT_2_5']
-        t_pcnt_5_0 = data['T_PCNT_5_0']
-        t_pcnt_10_0 = data['T_PCNT_10_0']
-        aq_thold = data['AQ_THOLD']
-        dst_b_M = data['DST_BEGIN_M']
-        dst_b_D = data['DST_BEGIN_DAY']
-        dst_b_OCC = data['DST_BEGIN_OCC']
-        dst_b_time = data['DST_BEGIN_TIME']
-        dst_e_M = data['DST_END_M']
-        dst_e_D = data['DST_END_DAY']
-        dst_e_time = data['DST_END_TIME']
-        dst_e_OCC = data['DST_END_OCC']
-        dst_tzone = data['DST_TIMEZONE']
-
-except OSError as err:
-    log_errors("Runtime.json: %s" % err)
+    data = RUNCONF.RunConfig('runtimeconfig.json', CONF_SCHEMA)
+    sid1 = data['SSID1']
+    sid2 = data['SSID2']
+    pw1 = data['PASSWORD1']
+    pw2 = data['PASSWORD2']
+    mqtt_s = data['MQTT_SERVER']
+    mqtt_pwd = data['MQTT_PASSWORD']
+    mqtt_u = data['MQTT_USER']
+    mqtt_p = data['MQTT_PORT']
+    mqtt_ssl = data['MQTT_SSL']
+    mqtt_ival = data['MQTT_INTERVAL']
+    client_id = data['CLIENT_ID']
+    t_err = data['TOPIC_ERRORS']
+    t_boot = data.get('TOPIC_BOOT')
+    webrepl_pwd = data['WEBREPL_PASSWORD']
+    ntp_s = data['NTPSERVER']
+    dhcp_n = data['DHCP_NAME']
+    start_wbl = data['START_WEBREPL']
+    start_net = data['START_NETWORK']
+    start_mqtt = data['START_MQTT']
+    s_upd_ival = data['SCREEN_UPDATE_INTERVAL']
+    deb_scr_a = data['DEBUG_SCREEN_ACTIVE']
+    scr_tout = data['SCREEN_TIMEOUT']
+    t_temp = data['TOPIC_TEMP']
+    temp_thold = data['TEMP_TRESHOLD']
+    temp_corr = data['TEMP_CORRECTION']
+    t_rh = data['TOPIC_RH']
+    rh_thold = data['RH_TRESHOLD']
+    rh_corr = data['RH_CORRECTION']
+    t_press = data['TOPIC_PRESSURE']
+    press_corr = data['PRESSURE_CORRECTION']
+    press_thold = data['PRESSURE_TRESHOLD']
+    t_gasr = data['TOPIC_RGAS']
+    gasr_corr = data['RGAS_CORRECTION']
+    gasr_thold = data['RGAS_TRESHOLD']
+    t_co2 = data['TOPIC_CO2']
+    co2_corr = data['CO2_CORRECTION']
+    co2_thold = data['CO2_TRESHOLD']
+    t_airq = data['T_AIRQ']
+    t_pm1_0 = data['T_PM1_0']
+    t_pm1_0_atm = data['T_PM1_0_ATM']
+    t_pm2_5 = data['T_PM2_5']
+    t_pm2_5_atm = data['T_PM2_5_ATM']
+    t_pm10_0 = data['T_PM10_0']
+    t_pm10_0_atm = data['T_PM10_0_ATM']
+    t_pcnt_0_3 = data['T_PCNT_0_3']
+    t_pcnt_0_5 = data['T_PCNT_0_5']
+    t_pcnt_1_0 = data['T_PCNT_1_0']
+    t_pcnt_2_5 = data['T_PCNT_2_5']
+    t_pcnt_5_0 = data['T_PCNT_5_0']
+    t_pcnt_10_0 = data['T_PCNT_10_0']
+    aq_thold = data['AQ_THOLD']
+    dst_b_M = data['DST_BEGIN_M']
+    dst_b_D = data['DST_BEGIN_DAY']
+    dst_b_OCC = data['DST_BEGIN_OCC']
+    dst_b_time = data['DST_BEGIN_TIME']
+    dst_e_M = data['DST_END_M']
+    dst_e_D = data['DST_END_DAY']
+    dst_e_time = data['DST_END_TIME']
+    dst_e_OCC = data['DST_END_OCC']
+    dst_tzone = data['DST_TIMEZONE']
+except (OSError, ValueError) as err:
+    log_errors("Runtime.json: %s" % err, ELOG.CRITICAL)
     print("Error with runtime.json: ", err)
     raise OSError
+prof.end()
 
 # Globals
 mqtt_up = False
 broker_uptime = 0
-temp_average = 0
-rh_average = 0
-pressure_average = 0
-gas_average = 0
-bmes_f = False
-mhz19_f = False
-pms_f = False
-scr_f = False
+pms = None
+aq = None
+bmes = None
+co2s = None
+display = None
 mqtt_last_update = 0
+first_pub = asyncio.Event()
 pms_read_errors = 0
 mhz_read_errors = 0
 bme_read_errors = 0
+# Sensor samples: temp, rh, press, gas (BME680 averages), co2 (MH-Z19B average), pms (dictionary), aqi.
+# MQTT is woken by new samples, at most once per mqtt_ival. Unchanged values are sent again after MQTT_REPUBLISH
+# intervals, a topic which stays silent longer means the node is down
+MQTT_REPUBLISH = 10
+mqtt_sub = bus.subscribe(('temp', 'rh', 'press', 'gas', 'co2', 'aqi', 'pms'), min_ms=mqtt_ival * 1000,
+                         max_silence_ms=MQTT_REPUBLISH * mqtt_ival * 1000)
 
 
 # For MQTT_AS
@@ -181,81 +174,13 @@ else:
 mq_clnt = MQTTClient(config)
 
 
-def weekday(year, month, day):
-    """Calculates the weekday for a given date. Monday is 0 and Sunday is 6."""
-    t = [0, 3, 2, 5, 0, 3, 5, 1, 4, 6, 2, 4]
-    year -= month < 3
-    return (year + int(year / 4) - int(year / 100) + int(year / 400) + t[month - 1] + day) % 7
-
-
-def find_last_weekday(year, month, target_weekday):
-    """Finds the last occurrence of a specific weekday in a given month."""
-    days_in_month = 30 if month in [4, 6, 9, 11] else 31
-    if month == 2:
-        # Simple leap year calculation
-        days_in_month = 29 if year % 4 == 0 and (year % 100 != 0 or year % 400 == 0) else 28
-
-    # Iterate backwards from the last day of the month
-    for day in range(days_in_month, 0, -1):
-        if weekday(year, month, day) == target_weekday:
-            return day
-    return None
-
-
-def find_nth_weekday(year, month, target_weekday, occurrence):
-    """Finds the nth occurrence of a specific weekday in a given month."""
-    count = 0
-    for day in range(1, 32):  # Assume at most 31 days
-        if weekday(year, month, day) == target_weekday:
-            count += 1
-            if count == occurrence:
-                return day
-    return None
-
-
-def resolve_dst():
-    """Calculates the local time considering DST."""
-    year, month, day, hour, minute, second, wday, yday = localtime()[:8]
-
-    # Define the DST rules for the time zone
-    dst_rules = {
-        "begin": (dst_b_M, dst_b_D, dst_b_OCC, dst_b_time),  # (month, weekday, occurrence, time)
-        "end": (dst_e_M, dst_e_D, dst_e_OCC, dst_e_time),  # (month, weekday, occurrence, time)
-        "timezone": dst_tzone,  # hours from UTC during normal (winter) time
-        "offset": 1  # hours to be added when DST is active
-    }
-
-    # Find the start and end of DST
-    if dst_rules["begin"][2] == 2:  # If the occurrence is "last"
-        dst_begin_day = find_last_weekday(year, dst_rules["begin"][0], dst_rules["begin"][1])
-    else:
-        dst_begin_day = find_nth_weekday(year, dst_rules["begin"][0], dst_rules["begin"][1], dst_rules["begin"][2])
-
-    if dst_rules["end"][2] == 2:  # If the occurrence is "last"
-        dst_end_day = find_last_weekday(year, dst_rules["end"][0], dst_rules["end"][1])
-    else:
-        dst_end_day = find_nth_weekday(year, dst_rules["end"][0], dst_rules["end"][1], dst_rules["end"][2])
-
-    # Calculate mktime for DST start and end times
-    dst_begin = mktime((year, dst_rules["begin"][0], dst_begin_day, dst_rules["begin"][3], 0, 0, 0, 0))
-    dst_end = mktime((year, dst_rules["end"][0], dst_end_day, dst_rules["end"][3], 0, 0, 0, 0))
-
-    current_time = mktime(localtime())
-
-    # Check if DST is active
-    if dst_begin <= current_time <= dst_end:
-        return localtime(current_time + 3600 * (dst_rules["timezone"] + dst_rules["offset"]))  # DST active
-    else:
-        return localtime(current_time + 3600 * dst_rules["timezone"])  # Standard time
+# DST transitions are calculated once per year, date strings once per second
+tz = TIMEZONE.TimeZone(dst_tzone, (dst_b_M, dst_b_D, dst_b_OCC, dst_b_time),
+                 (dst_e_M, dst_e_D, dst_e_OCC, dst_e_time))
 
 
 def resolve_date():
-    """Calculates the current date and time considering DST."""
-    (year, month, mdate, hour, minute, second, wday, yday) = resolve_dst()
-    weekdays = ['Mo', 'Tu', 'We', 'Th', 'Fr', 'Sa', 'Su']
-    day = f"{mdate}.{month}.{year}"
-    hours = f"{hour:02d}:{minute:02d}:{second:02d}"
-    return day, hours, weekdays[wday]
+    return tz.format_date()
 
 
 class DisplayMe(object):
@@ -339,17 +264,30 @@ class DisplayMe(object):
 
 class AirQuality(object):
     def __init__(self, pmssensor):
-        self.aqinndex = None
+        self.aqinndex = None  # Instantaneous, max of the sub-indices
+        self.pm2_5_index = None
+        self.pm10_index = None
+        self.nowcast_index = None  # From 12 h NowCast, None until two hours of data
+        self.pm2_5_nc = NowCast()
+        self.pm10_nc = NowCast()
         self.pms = pmssensor
-        self.upd_ival = pms.read_interval + 1
+        self.sub = bus.subscribe(('pms',))
 
     async def upd_aq_loop(self):
+        # Woken by each new PMS reading
         while True:
-            if self.pms.pms_dictionary is not None:
-                if (self.pms.pms_dictionary['PM2_5_ATM'] != 0) and (self.pms.pms_dictionary['PM10_0_ATM'] != 0):
-                    self.aqinndex = (AQI.aqi(self.pms.pms_dictionary['PM2_5_ATM'],
-                                             self.pms.pms_dictionary['PM10_0_ATM']))
-            await asyncio.sleep(self.upd_ival)
+            await self.sub.wait()
+            pms_d = bus.get('pms')
+            # Clean air (0 ug/m3) is a reading too, only frames with the sensor error byte set are left out
+            if pms_d is not None and not pms_d['ERROR']:
+                self.pm2_5_index = AQI.PM2_5(pms_d['PM2_5_ATM'])
+                self.pm10_index = AQI.PM10_0(pms_d['PM10_0_ATM'])
+                self.aqinndex = max(self.pm2_5_index, self.pm10_index)
+                pm2_5 = self.pm2_5_nc.add(pms_d['PM2_5_ATM'])
+                pm10 = self.pm10_nc.add(pms_d['PM10_0_ATM'])
+                if pm2_5 is not None and pm10 is not None:
+                    self.nowcast_index = AQI.aqi(pm2_5, pm10)
+                bus.publish('aqi', self.aqinndex)
 
 
 async def mqtt_up_loop():
@@ -357,7 +295,7 @@ async def mqtt_up_loop():
     global mq_clnt
 
     while net.net_ok is False:
-        gc.collect()
+        mem.idle()
         await asyncio.sleep(5)
 
     if net.net_ok is True:
@@ -387,15 +325,6 @@ async def mqtt_up_loop():
                 if deb_scr_a == 1:
                     print("MQTT error: %s" % err)
 
-    n = 0
-    while True:
-        # await self.mqtt_subscribe()
-        await asyncio.sleep(5)
-        if deb_scr_a == 1:
-            print('mqtt-publish', n)
-        await mq_clnt.publish('result', '{}'.format(n), qos=1)
-        n += 1
-
 
 async def mqtt_subscribe(client):
     # If "client" is missing, you get error from line 538 in MQTT_AS.py (1 given, expected 0)
@@ -424,33 +353,39 @@ async def show_what_i_do():
             if mqtt_up is True:
                 print("   MQTT messages sent %s seconds ago. " % (time() - mqtt_last_update))
         print("   Memory free: %s, allocated: %s" % (gc.mem_free(), gc.mem_alloc()))
+        print("   Memory: %s" % mem.stats())
+        print("   Loop: %s" % sup.stats())
+        print("   Error log: %s records, %s filtered, %s flash bytes/record, segment %s" %
+              (elog.records, elog.filtered, elog.bytes_per_record(), elog.seg))
+        print("   Config: snapshot %s bytes, compiled from JSON %s, loaded in %s us" %
+              (data.size, data.compiled, data.load_us))
+        print("   Sample bus: %s, MQTT %s" % (bus.stats(), mqtt_sub.stats()))
         print("2 -------SENSORDATA--------- 2")
-        if (temp_average is not None) and (rh_average is not None) and (gas_average is not None):
-            print("   Temp: %sC, Rh: %s, GasR: %s" % (temp_average, rh_average, gas_average))
-        if co2s.co2_average is not None:
-            print("   CO2 is %s" % co2s.co2_average)
-        if aq.aqinndex is not None:
-            print("   AQ Index: %s" % ("{:.1f}".format(aq.aqinndex)))
-        if isinstance(pms.pms_dictionary, dict):
-            print("   PM1:%s (%s) PM2.5:%s (%s)" % (pms.pms_dictionary['PM1_0'], pms.pms_dictionary['PM1_0_ATM'],
-                                                    pms.pms_dictionary['PM2_5'], pms.pms_dictionary['PM2_5_ATM']))
-            print("   PM10: %s (ATM: %s)" % (pms.pms_dictionary['PM10_0'], pms.pms_dictionary['PM10_0_ATM']))
-            print("   %s < 0.3 & %s <0.5 " % (pms.pms_dictionary['PCNT_0_3'], pms.pms_dictionary['PCNT_0_5']))
-            print("   %s < 1.0 & %s < 2.5" % (pms.pms_dictionary['PCNT_1_0'], pms.pms_dictionary['PCNT_2_5']))
-            print("   %s < 5.0 & %s < 10.0" % (pms.pms_dictionary['PCNT_5_0'], pms.pms_dictionary['PCNT_10_0']))
+        print("   Temp: %sC, Rh: %s, GasR: %s" % (bus.get('temp'), bus.get('rh'), bus.get('gas')))
+        if bus.get('co2') is not None:
+            print("   CO2 is %s" % bus.get('co2'))
+        if aq is not None and aq.aqinndex is not None:
+            print("   AQ Index: %s (PM2.5 %s, PM10 %s), NowCast %s" % (aq.aqinndex, aq.pm2_5_index, aq.pm10_index,
+                                                                  aq.nowcast_index))
+        pms_d = bus.get('pms')
+        if pms_d is not None:
+            print("   PM1:%s (%s) PM2.5:%s (%s)" % (pms_d['PM1_0'], pms_d['PM1_0_ATM'], pms_d['PM2_5'],
+                                                    pms_d['PM2_5_ATM']))
+            print("   PM10: %s (ATM: %s)" % (pms_d['PM10_0'], pms_d['PM10_0_ATM']))
+            print("   %s < 0.3 & %s <0.5 " % (pms_d['PCNT_0_3'], pms_d['PCNT_0_5']))
+            print("   %s < 1.0 & %s < 2.5" % (pms_d['PCNT_1_0'], pms_d['PCNT_2_5']))
+            print("   %s < 5.0 & %s < 10.0" % (pms_d['PCNT_5_0'], pms_d['PCNT_10_0']))
+            print("   PMS %s" % pms.stats())
         print("3 ---------FAULTS------------- 3")
         print("   Last error : %s " % last_error)
         print("   BME read errors: %s" % bme_read_errors)
         print("   MHZ read errors: %s" % mhz_read_errors)
+        if co2s is not None:
+            print("   MHZ19B %s" % co2s.stats())
         print("   PMS read errors: %s" % pms_read_errors)
-        if bmes_f:
-            print("BME680 sensor faulty!")
-        if mhz19_f:
-            print("MHZ19 sensor faulty!")
-        if pms_f:
-            print("PMS9103M sensor faulty!")
-        if scr_f:
-            print("Screen faulty!")
+        for name, err in devs.faults.items():
+            print("   %s faulty: %s" % (name, err))
+        print("   Device init %s ms: %s" % (devs.stage_ms, devs.init_ms))
 
         print("\n")
         await asyncio.sleep(5)
@@ -461,51 +396,25 @@ async def show_what_i_do():
 # freq(80000000)
 freq(160000000)
 
-def init_sensor(sensor_func, sensor_name, fault_flag):
-    try:
-        sensor = sensor_func()
-        log_errors(f"{sensor_name} initialized successfully.")
-        return sensor, False
-    except OSError as err:
-        log_errors(f"Error: {sensor_name} init error! {err}")
-        if deb_scr_a == 1:
-            print(f"Error: {sensor_name} init error! {err}")
-        return None, True
 
+async def pms_init():
+    # Passive mode duty cycling: fan and laser run 30 s warm up + 5 frames every 1 - 10 minutes
+    sensor = PARTS.PMS(rxpin=PMS_RX, txpin=PMS_TX, uart=PMS_UART, duty=True)
+    sensor.debug = True
+    return await sensor.init()
 
-# Particle sensor - keep this first!
-pms, pms_f = init_sensor(
-    lambda: PARTS.PMS(rxpin=PMS_RX, txpin=PMS_TX, uart=PMS_UART),
-    "Particle sensor",
-    "pms_f"
-)
-if pms:
-    pms.debug = True
-    aq = AirQuality(pms)
 
 # I2C-bus for BME sensor and other devices
 i2c = SoftI2C(scl=Pin(I2C_SCL_PIN), sda=Pin(I2C_SDA_PIN))
 
-# BME-sensor
-bmes, bmes_f = init_sensor(
-    lambda: BMES.BME680_I2C(i2c=i2c),
-    "BME680 sensor",
-    "bme_s_f"
-)
-
-# CO2 sensor
-co2s, mhz19_f = init_sensor(
-    lambda: CO2.MHZ19bCO2(uart=MH_UART, rxpin=MH_RX, txpin=MH_TX),
-    "MHZ19 CO2 sensor",
-    "mhz19_f"
-)
-
-# Display
-display, scr_f = init_sensor(
-    lambda: DisplayMe(),
-    "Display",
-    "scr_f"
-)
+# Devices are initialized concurrently in main(), failed or timed out ones are in devs.faults
+devs = DEVINIT.DeviceInit(timeout=10)
+devs.add('pms', pms_init)
+devs.add('aq', lambda: AirQuality(devs['pms']), after=('pms',))
+devs.add('bme', lambda: BMES.BME680_I2C(i2c=i2c))
+# MH-Z19B sampled every 5 s, co2_average is the rolling 40 minute average
+devs.add('mhz19', lambda: CO2.MHZ19bCO2(uart=MH_UART, rxpin=MH_RX, txpin=MH_TX, read_interval=5))
+devs.add('display', DisplayMe)
 
 # Network handshake
 if start_net == 1:
@@ -514,7 +423,7 @@ if start_net == 1:
 
 
 async def upd_status_loop():
-    global temp_average, rh_average, pressure_average, gas_average, bme_read_errors
+    global bme_read_errors
 
     temp_list = []
     rh_list = []
@@ -531,17 +440,18 @@ async def upd_status_loop():
         return None
 
     while True:
-        if not bmes_f:
+        sup.beat('status')
+        if not devs.fault('bme'):
             try:
                 temp = round(float(bmes.temperature)) + temp_corr
                 rh = round(float(bmes.humidity)) + rh_corr
                 press = round(float(bmes.pressure)) + press_corr
                 gas = round(float(bmes.gas))
 
-                temp_average = update_list(temp_list, temp)
-                rh_average = update_list(rh_list, rh)
-                pressure_average = update_list(press_list, press)
-                gas_average = update_list(gas_list, gas)
+                bus.publish('temp', update_list(temp_list, temp))
+                bus.publish('rh', update_list(rh_list, rh))
+                bus.publish('press', update_list(press_list, press))
+                bus.publish('gas', update_list(gas_list, gas))
 
             except ValueError as err:
                 bme_read_errors += 1
@@ -550,7 +460,7 @@ async def upd_status_loop():
                 log_errors(f"BME sensor loop error: {err}")
 
             if len(temp_list) % max_len == 0:
-                gc.collect()
+                mem.idle()
 
         await asyncio.sleep(1)
 
@@ -564,8 +474,9 @@ async def mqtt_up_l():
     max_retries = 5
 
     while not net.net_ok:
-        gc.collect()
+        mem.idle()
         await asyncio.sleep(5)
+    boot_mark("wifi_up")
 
     if net.net_ok:
         config['subs_cb'] = upd_mqtt_stat
@@ -580,6 +491,7 @@ async def mqtt_up_l():
                 await mq_clnt.connect()
                 if mq_clnt.isconnected():
                     mqtt_up = True
+                    boot_mark("mqtt_up")
                     break
             except OSError as e:
                 log_errors(f"MQTT Connect error: {e}")
@@ -592,59 +504,46 @@ async def mqtt_up_l():
                 else:
                     await asyncio.sleep(5)
 
-    n = 0
-    while True:
-        await asyncio.sleep(10)
-        if deb_scr_a == 1:
-            print(f'mqtt-publish test {n}')
-        await mq_clnt.publish('result', f'{n}', qos=1)
-        n += 1
-
 
 async def mqtt_pub_l():
     global mqtt_last_update
+    inf = float('inf')
+    values = (('temp', t_temp, -40, 120), ('rh', t_rh, 0, 100), ('press', t_press, 0, 5000),
+              ('gas', t_gasr, 0, 99999999999999), ('aqi', t_airq, 0, inf), ('co2', t_co2, 0, inf))
+    particles = (('PM1_0', t_pm1_0), ('PM1_0_ATM', t_pm1_0_atm), ('PM2_5', t_pm2_5), ('PM2_5_ATM', t_pm2_5_atm),
+                 ('PM10_0', t_pm10_0), ('PM10_0_ATM', t_pm10_0_atm), ('PCNT_0_3', t_pcnt_0_3),
+                 ('PCNT_0_5', t_pcnt_0_5), ('PCNT_1_0', t_pcnt_1_0), ('PCNT_2_5', t_pcnt_2_5),
+                 ('PCNT_5_0', t_pcnt_5_0), ('PCNT_10_0', t_pcnt_10_0))
 
     async def publish_if_valid(topic, value, min_value, max_value):
         """Helper function to publish if value is within valid range."""
-        if min_value < value < max_value:
+        if value is not None and min_value < value < max_value:
             await mq_clnt.publish(topic, str(value), retain=0, qos=0)
 
     while True:
+        sup.beat('mqtt_pub')
         if not mqtt_up:
             await asyncio.sleep(5)
-        elif (time() - mqtt_last_update) >= mqtt_ival:
-            await publish_if_valid(t_temp, temp_average, -40, 120)
-            await publish_if_valid(t_rh, rh_average, 0, 100)
-            await publish_if_valid(t_press, pressure_average, 0, 5000)
-            await publish_if_valid(t_gasr, gas_average, 0, 99999999999999)
-
-            if pms.pms_dictionary is not None and (time() - pms.startup_time) > pms.read_interval:
-                await publish_if_valid(t_pm1_0, pms.pms_dictionary['PM1_0'], 0, float('inf'))
-                await publish_if_valid(t_pm1_0_atm, pms.pms_dictionary['PM1_0_ATM'], 0, float('inf'))
-                await publish_if_valid(t_pm2_5, pms.pms_dictionary['PM2_5'], 0, float('inf'))
-                await publish_if_valid(t_pm2_5_atm, pms.pms_dictionary['PM2_5_ATM'], 0, float('inf'))
-                await publish_if_valid(t_pm10_0, pms.pms_dictionary['PM10_0'], 0, float('inf'))
-                await publish_if_valid(t_pm10_0_atm, pms.pms_dictionary['PM10_0_ATM'], 0, float('inf'))
-                await publish_if_valid(t_pcnt_0_3, pms.pms_dictionary['PCNT_0_3'], 0, float('inf'))
-                await publish_if_valid(t_pcnt_0_5, pms.pms_dictionary['PCNT_0_5'], 0, float('inf'))
-                await publish_if_valid(t_pcnt_1_0, pms.pms_dictionary['PCNT_1_0'], 0, float('inf'))
-                await publish_if_valid(t_pcnt_2_5, pms.pms_dictionary['PCNT_2_5'], 0, float('inf'))
-                await publish_if_valid(t_pcnt_5_0, pms.pms_dictionary['PCNT_5_0'], 0, float('inf'))
-                await publish_if_valid(t_pcnt_10_0, pms.pms_dictionary['PCNT_10_0'], 0, float('inf'))
-
-            if aq.aqinndex is not None:
-                await publish_if_valid(t_airq, aq.aqinndex, 0, float('inf'))
-
-            if not mhz19_f and co2s.co2_average is not None:
-                await publish_if_valid(t_co2, co2s.co2_average, 0, float('inf'))
-
-            mqtt_last_update = time()
-
-            await asyncio.sleep(1)
-            gc.collect()
-            gc.threshold(gc.mem_free() // 4 + gc.mem_alloc())
-        else:
-            await asyncio.sleep(1)
+            continue
+        # Changed samples are sent, wakes up at most once per mqtt_ival. Unchanged after MQTT_REPUBLISH intervals
+        if not await mqtt_sub.wait(30000):
+            continue
+        for name, topic, min_value, max_value in values:
+            if mqtt_sub.changed(name):
+                await publish_if_valid(topic, bus.get(name), min_value, max_value)
+                mqtt_sub.consumed(name)
+        if mqtt_sub.changed('pms'):
+            pms_d = bus.get('pms')
+            if pms_d is not None:
+                for key, topic in particles:
+                    await publish_if_valid(topic, pms_d[key], 0, inf)
+                mqtt_sub.consumed('pms')
+
+        mqtt_last_update = time()
+        if not first_pub.is_set():
+            boot_mark("first_publish")
+            first_pub.set()
+        mem.idle()
 
 
 async def mqtt_subs(mq_client):
@@ -669,15 +568,23 @@ async def disp_l():
 
     while True:
         try:
-            wdt.feed()  # Feed the watchdog more frequently to avoid resets
+            sup.beat('disp')
+            # One consistent set of samples per page rotation
+            temp_average = bus.get('temp')
+            rh_average = bus.get('rh')
+            pressure_average = bus.get('press')
+            gas_average = bus.get('gas')
+            co2_average = bus.get('co2')
+            aqindex = bus.get('aqi')
+            pms_d = bus.get('pms')
 
             display.inverse = any([
                 temp_average is not None and temp_average > temp_thold,
                 rh_average is not None and rh_average > rh_thold,
                 pressure_average is not None and pressure_average > press_thold,
                 gas_average is not None and gas_average > gasr_thold,
-                co2s.co2_average is not None and co2s.co2_average > co2_thold,
-                aq.aqinndex is not None and aq.aqinndex > aq_thold
+                co2_average is not None and co2_average > co2_thold,
+                aqindex is not None and aqindex > aq_thold
             ])
 
             await update_display_page(f"  {resolve_date()[2]} {resolve_date()[0]}", 0, 5)
@@ -688,33 +595,30 @@ async def disp_l():
             else:
                 await update_display_page("Waiting values", 2, 5)
 
-            if co2s.co2_average is not None and pressure_average is not None and pressure_average > 0:
-                await update_display_page(f"CO2:{int(co2s.co2_average)} hPa:{int(pressure_average)}", 3, 5)
+            if co2_average is not None and pressure_average is not None and pressure_average > 0:
+                await update_display_page(f"CO2:{int(co2_average)} hPa:{int(pressure_average)}", 3, 5)
 
             if gas_average is not None and gas_average > 0:
                 await update_display_page(f"GasR:{int(gas_average)}", 4, 5)
 
-            if aq.aqinndex is not None:
-                await update_display_page(f"AQIndex:{int(aq.aqinndex)}", 5, 5)
+            if aqindex is not None:
+                await update_display_page(f"AQIndex:{int(aqindex)}", 5, 5)
 
             await display.act_scr()
             await asyncio.sleep(1)
 
-            wdt.feed()  # Feed again before starting the next block
+            sup.beat('disp')
 
-            if pms.pms_dictionary is not None:
+            if pms_d is not None:
                 await update_display_page("Particles ug/m3", 0, 5)
-                await update_display_page(f"PM1.0:{pms.pms_dictionary['PM1_0']} ATM:{pms.pms_dictionary['PM1_0_ATM']}",
-                                          2, 5)
-                await update_display_page(f"PM2.5:{pms.pms_dictionary['PM2_5']} ATM:{pms.pms_dictionary['PM2_5_ATM']}",
-                                          3, 5)
-                await update_display_page(
-                    f"PM10: {pms.pms_dictionary['PM10_0']} ATM:{pms.pms_dictionary['PM10_0_ATM']}", 4, 5)
+                await update_display_page(f"PM1.0:{pms_d['PM1_0']} ATM:{pms_d['PM1_0_ATM']}", 2, 5)
+                await update_display_page(f"PM2.5:{pms_d['PM2_5']} ATM:{pms_d['PM2_5_ATM']}", 3, 5)
+                await update_display_page(f"PM10: {pms_d['PM10_0']} ATM:{pms_d['PM10_0_ATM']}", 4, 5)
                 await update_display_page("- ATM for AQI -", 5, 5)
                 await display.act_scr()
                 await asyncio.sleep(1)
 
-            wdt.feed()
+            sup.beat('disp')
 
             if deb_scr_a:
                 await update_display_page(f"WIFI:   {net.strength}", 0, 5)
@@ -734,38 +638,99 @@ async def disp_l():
                 await display.act_scr()
                 await asyncio.sleep(1)
 
-            wdt.feed()  # Ensure it's called at various stages in the loop
+            sup.beat('disp')
 
         except Exception as e:
             log_errors(f"Error in display loop: {e}")
             await asyncio.sleep(5)
 
 
+async def fwd_errs(text):
+    # Error log forwarder, records not sent while MQTT is down are kept only on flash
+    if mqtt_up is False:
+        raise OSError("MQTT down")
+    await mq_clnt.publish(t_err, text, retain=0, qos=0)
+
+
+async def init_devices():
+    global pms, aq, bmes, co2s, display
+    await devs.run()
+    pms = devs['pms']
+    aq = devs['aq']
+    bmes = devs['bme']
+    co2s = devs['mhz19']
+    display = devs['display']
+    # Drivers publish each new reading on the sample bus
+    if pms is not None:
+        pms.on_sample = lambda s: bus.publish('pms', s.pms_dictionary)
+    if co2s is not None:
+        co2s.on_sample = lambda s: bus.publish('co2', s.co2_average)
+    for name, err in devs.faults.items():
+        log_errors(f"Error: {name} init error! {err}")
+        if deb_scr_a == 1:
+            print(f"Error: {name} init error! {err}")
+    if not devs.faults:
+        log_errors(f"Devices initialized successfully in {devs.stage_ms} ms.", ELOG.INFO)
+
+
+async def first_reading():
+    # Boot timeline mark when the first sensor value is available
+    sub = bus.subscribe(('pms', 'co2', 'temp'))
+    await sub.wait()
+    sub.close()
+    boot_mark("first_reading")
+
+
+async def boot_report():
+    # Boot timeline to /boottime.csv (and MQTT if TOPIC_BOOT is set) after the first publish or 2 minutes
+    try:
+        await asyncio.wait_for(first_pub.wait(), 120)
+    except asyncio.TimeoutError:
+        pass
+    prof.save()
+    if deb_scr_a == 1:
+        prof.dump()
+    if mqtt_up and t_boot is not None:
+        await prof.publish(mq_clnt, t_boot)
+
+
 async def main():
     loop = asyncio.get_event_loop()
-    if deb_scr_a == 1:
-        loop.create_task(show_what_i_do())
+    loop.create_task(sup.run())
+    prev = sup.last_reset()
+    if prev is not None:
+        log_errors("Previous reset: %s" % prev, ELOG.WARNING)
+    # WiFi association runs while the sensors wake up
     if start_net == 1:
         loop.create_task(net.net_upd_loop())
+    await init_devices()
+    if deb_scr_a == 1:
+        mem.probe_every = 10  # Largest free block in the debug output, costs collections
+        loop.create_task(show_what_i_do())
     if start_mqtt == 1:
         loop.create_task(mqtt_up_l())
-        await asyncio.sleep(1)
-        loop.create_task(mqtt_pub_l())
-    if mhz19_f is False:
-        loop.create_task(co2s.read_co2_loop())
-        await asyncio.sleep(1)
-    if pms_f is False:
-        loop.create_task(pms.read_async_loop())
-        await asyncio.sleep(1)
-    if pms_f is False:
+        sup.register('mqtt_pub', mqtt_ival + 60, task=loop.create_task(mqtt_pub_l()))
+    if not devs.fault('mhz19'):
+        sup.register('co2', co2s.preheat_time + 3 * co2s.read_interval, critical=False,
+                     task=loop.create_task(co2s.read_co2_loop()), stamp=lambda: co2s.read_ticks)
+    if not devs.fault('pms'):
+        sup.register('pms', 3 * pms.max_period + 60, critical=False,
+                     task=loop.create_task(pms.read_async_loop()), stamp=lambda: pms.read_ticks)
+    if not devs.fault('aq'):
         loop.create_task(aq.upd_aq_loop())
-        await asyncio.sleep(1)
-    if bmes_f is False:
-        loop.create_task(upd_status_loop())
-    loop.create_task(disp_l())
+    if not devs.fault('bme'):
+        sup.register('status', 30, task=loop.create_task(upd_status_loop()))
+    sup.register('disp', 60, task=loop.create_task(disp_l()))
+    loop.create_task(first_reading())
+    if start_mqtt == 1:
+        elog.forward = fwd_errs
+    loop.create_task(elog.flush_loop())
+    loop.create_task(mem.run())
+    loop.create_task(boot_report())
     loop.run_forever()
 
-wdt = WDT(timeout=30000)
+# Hardware WDT is fed by the supervisor only when all critical task heartbeats are fresh
+sup = SUP.Supervisor(wdt_timeout=30000, log_fn=log_errors)
 
 if __name__ == "__main__":
     asyncio.run(main())
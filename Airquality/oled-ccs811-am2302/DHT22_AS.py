@@ -0,0 +1,90 @@
+"""
+Asynchronous DHT22 (AM2302) reader.
+
+The 40-bit frame is decoded directly: humidity x10 (16 bits), temperature x10 (16 bits), checksum. Datasheet
+temperature is sign and magnitude (bit 15 is the sign), but some AM2302 batches send two's complement. Old
+firmware turned those into -3276.x C. Both are handled: magnitude over 0x7000 (over 2800 C) can only be two's
+complement.
+
+Values are kept as tenths in a preallocated array('h'), reading does not allocate. Sensor must not be read more
+often than every 2 s, read() waits for the rest of the interval instead of blocking. dht_readinto() itself blocks
+about 5 ms with interrupts disabled.
+
+    sensor = DHT22(Pin(4))
+    if await sensor.read():
+        print(sensor.temperature, sensor.humidity)     # float C, % RH
+    print(sensor.values[0], sensor.values[1])          # tenths, no float allocation
+    print(sensor.reads, sensor.timeouts, sensor.frame_errors)
+
+Captured frames:
+    03 72 ff fd 71    88.2 %, -0.3 C (two's complement)
+    02 8c 80 65 73    65.2 %, -10.1 C (sign and magnitude)
+    01 e6 00 df c6    48.6 %, 22.3 C
+"""
+from array import array
+import utime
+import uasyncio as asyncio
+try:
+    from esp import dht_readinto
+except ImportError:
+    from machine import dht_readinto
+
+MIN_IVAL_MS = 2000
+TEMP = 0
+HUMID = 1
+
+
+def decode(buf, values):
+    """ Frame buf (5 bytes) into values (tenths of C, tenths of % RH), False on checksum error or RH over 100 % """
+    humid = buf[0] << 8 | buf[1]
+    if (buf[0] + buf[1] + buf[2] + buf[3]) & 0xff != buf[4] or humid > 1000:
+        return False
+    raw = buf[2] << 8 | buf[3]
+    if raw & 0x8000:
+        raw = raw - 0x10000 if raw & 0x7fff > 0x7000 else -(raw & 0x7fff)
+    values[TEMP] = raw
+    values[HUMID] = humid
+    return True
+
+
+class DHT22(object):
+
+    def __init__(self, pin, interval=2):
+        self.pin = pin
+        self.interval_ms = max(MIN_IVAL_MS, int(interval * 1000))
+        self.buf = bytearray(5)
+        self.values = array('h', (0, 0))
+        self.valid = False
+        self.last_ms = utime.ticks_ms()  # Sensor needs 2 s after power on
+        self.read_time = None
+        self.reads = 0
+        self.timeouts = 0
+        self.frame_errors = 0
+
+    async def read(self):
+        """ New measurement when the interval has passed, False on timeout or invalid frame """
+        wait = self.interval_ms - utime.ticks_diff(utime.ticks_ms(), self.last_ms)
+        if wait > 0:
+            await asyncio.sleep_ms(wait)
+        self.last_ms = utime.ticks_ms()
+        self.reads += 1
+        try:
+            dht_readinto(self.pin, self.buf)
+        except OSError:
+            self.timeouts += 1
+            self.valid = False
+            return False
+        self.valid = decode(self.buf, self.values)
+        if not self.valid:
+            self.frame_errors += 1
+            return False
+        self.read_time = utime.time()
+        return True
+
+    @property
+    def temperature(self):
+        return self.values[TEMP] / 10 if self.valid else None
+
+    @property
+    def humidity(self):
+        return self.values[HUMID] / 10 if self.valid else None
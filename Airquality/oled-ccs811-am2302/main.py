@@ -43,11 +43,24 @@ Asynkroninen MQTT: https://github.com/peterhinch/micropython-mqtt/blob/master/mq
            Poistettu konstruktorista i2c väylä
            Korjattu envdatan kirjoituksesta puuttuneet muuttujanimet. Kauneusvirhe.
            Korjattu self.sensori.put_envdata(humidity=float(kosteusin), temp=float(lampoin))
+19.10.2026 DHT22 luetaan DHT22_AS-ajurilla: 40-bittinen kehys puretaan suoraan, miinusasteet oikein myös kahden
+           komplementtina lähettäviltä antureilta, arvot numeroina ilman merkkijonomuunnoksia. Ajuri odottaa
+           asynkronisesti vähintään 2 s lukujen välillä.
+19.10.2026 CCS811 luetaan CCS811_AS-ajurilla. Jos nINT on kytketty (CCS811_NINT_PINNI parametrit.py:ssä),
+           uusi lukema herättää keskeytyksellä eikä väylää pollata. Lämpö ja kosteus lähetetään sensorille
+           keskiarvoista vain kun ne muuttuvat yli kuolleen alueen (0.5 C / 2 %). Baseline tallennetaan
+           vuorokauden välein tiedostoon /ccs811.bin ja palautetaan 20 min käynnistyksen jälkeen.
+           Korjattu lämpö ja kosteus olivat ristissä put_envdata-kutsussa.
+19.10.2026 Keskiarvot näytteiden väylällä (SAMPLEBUS_AS): anturisilmukat laskevat liukuvan keskiarvon 20 viimeisestä
+           lukemasta ja julkaisevat sen väylälle, sekunnin välein pollaava laske_keskiarvot on poistettu. MQTT herää
+           muuttuneesta keskiarvosta, lähettää korkeintaan kerran minuutissa vain muuttuneet arvot ja muuttumattomat
+           10 minuutin välein (MQTT_TOISTO), jotta hiljainen aihe tarkoittaa pysähtynyttä laitetta. CCS811:n lämpö-
+           ja kosteuskorjaus päivitetään kun keskiarvo muuttuu. 5 s välein lähetetty 'result'-laskuri on poistettu.
 """
 
 from machine import SoftI2C, SPI, Pin
 import sh1106
-import ccs811
+import CCS811_AS
 import time
 import uasyncio as asyncio
 import utime
@@ -57,13 +70,18 @@ import network
 import gc
 from mqtt_as import config
 import machine
-import dht
+import DHT22_AS
+from SAMPLEBUS_AS import bus
 
 
 # tuodaan parametrit tiedostosta parametrit.py
 from parametrit import CLIENT_ID, MQTT_SERVERI, MQTT_PORTTI, MQTT_KAYTTAJA, \
     MQTT_SALASANA, SSID1, SALASANA1, SSID2, SALASANA2, AIHE_CO2, AIHE_TVOC, \
     DHT22_KOSTEUS_KORJAUSKERROIN, DHT22_LAMPO_KORJAUSKERROIN, DHT22_KOSTEUS, DHT22_LAMPO
+try:
+    from parametrit import CCS811_NINT_PINNI
+except ImportError:
+    CCS811_NINT_PINNI = None  # nINT ei kytketty, sensoria pollataan kerran sekunnissa
 
 
 kaytettava_salasana = None
@@ -81,9 +99,14 @@ config['password'] = MQTT_SALASANA
 config['port'] = MQTT_PORTTI
 config['client_id'] = CLIENT_ID
 client = MQTTClient(config)
-edellinen_mqtt_klo = utime.time()
 aloitusaika = utime.time()
 anturilukuvirheita = 0
+# Keskiarvot väylällä: eco2, tvoc (CCS811), lampo, kosteus (DHT22). MQTT herää muutoksesta korkeintaan kerran
+# minuutissa, muuttumattomat arvot lähetetään uudelleen MQTT_TOISTO välein
+MQTT_VALI = 60
+MQTT_TOISTO = 10
+mqtt_tilaus = bus.subscribe(('eco2', 'tvoc', 'lampo', 'kosteus'), min_ms=MQTT_VALI * 1000,
+                            max_silence_ms=MQTT_TOISTO * MQTT_VALI * 1000)
 
 
 def restart_and_reconnect():
@@ -189,33 +212,45 @@ class SPInaytonohjain:
         self.naytto.poweron()
 
 
+class Keskiarvo:
+    """ Liukuva keskiarvo viimeisistä lukemista, vähentää anturiheittoja """
+
+    def __init__(self, koko=20):
+        self.arvot = []
+        self.koko = koko
+
+    def lisaa(self, arvo):
+        self.arvot.append(arvo)
+        if len(self.arvot) > self.koko:
+            self.arvot.pop(0)
+        return round(sum(self.arvot) / len(self.arvot), 1)
+
+
 class KaasuSensori:
 
-    def __init__(self, scl=22, sda=21, taajuus=400000, osoite=90):
+    def __init__(self, scl=22, sda=21, taajuus=400000, osoite=90, nint=None):
         self.i2c = SoftI2C(scl=Pin(scl), sda=Pin(sda), freq=taajuus)
         self.laiteosoite = osoite
-        self.sensori = ccs811.CCS811(self.i2c)
+        self.sensori = CCS811_AS.CCS811(self.i2c, osoite, None if nint is None else Pin(nint))
         self.eCO2 = 0
         self.tVOC = 0
-        self.eCO2_keskiarvo = 0
-        self.eCO2_arvoja = 0
-        self.tVOC_keskiarvo = 0
-        self.tVOC_arvoja = 0
+        self.eCO2_keskiarvo = Keskiarvo()
+        self.tVOC_keskiarvo = Keskiarvo()
         self.luettu_aika = utime.time()
 
     async def lue_arvot(self):
         while True:
-            if self.sensori.data_ready():
+            #  Odottaa keskeytystä tai pollaa kerran sekunnissa
+            if await self.sensori.read():
                 self.eCO2 = self.sensori.eCO2
                 self.tVOC = self.sensori.tVOC
                 self.luettu_aika = utime.time()
-            await asyncio.sleep_ms(1000)
-
-    async def laheta_lampo_ja_kosteus_korjaus(self, lampoin, kosteusin):
-        if (float(lampoin) > -40) and (float(lampoin) < 150) and (float(kosteusin) > 0) and (float(kosteusin) < 101):
-            self.sensori.put_envdata(humidity=float(kosteusin), temp=float(lampoin))
-
+                bus.publish('eco2', self.eCO2_keskiarvo.lisaa(self.eCO2))
+                bus.publish('tvoc', self.tVOC_keskiarvo.lisaa(self.tVOC))
 
+    def laheta_lampo_ja_kosteus_korjaus(self, lampoin, kosteusin):
+        #  Kirjoitetaan sensorille vain jos muutos on yli kuolleen alueen
+        return self.sensori.put_envdata(humidity=kosteusin, temp=lampoin)
 
 
 class LampojaKosteus:
@@ -225,41 +260,36 @@ class LampojaKosteus:
         self.lukuvali = lukuvali
         self.lampo = None
         self.kosteus = None
-        self.anturi = dht.DHT22(Pin(self.pinni))
-        self.lampo_keskiarvo = 0
-        self.kosteus_keskiarvo = 0
+        self.anturi = DHT22_AS.DHT22(Pin(self.pinni), lukuvali)
+        self.lampo_keskiarvo = Keskiarvo()
+        self.kosteus_keskiarvo = Keskiarvo()
 
     async def lue_arvot(self):
         global anturilukuvirheita
         while True:
-            try:
-                self.anturi.measure()
-            except OSError as e:
-                print("Anturilukuvirhe %s", e)
+            #  read() odottaa itse lukuvälin
+            if not await self.anturi.read():
+                print("Anturilukuvirhe, aikakatkaisuja %s, virheellisiä kehyksiä %s" %
+                      (self.anturi.timeouts, self.anturi.frame_errors))
                 self.lampo = None
                 self.kosteus = None
                 anturilukuvirheita += 1
                 if anturilukuvirheita > 50:
                     restart_and_reconnect()
+                continue
             #  Prosessorin ja näytön aiheuttama mittariheitto ja tarkistus ettei ole älyttömiä arvoja
-            self.lampo = float(self.anturi.temperature()) - 3.01  # heitto noin 0 asteessa
-            #   - asteiden korjaus, tyypillisesti -3276.x C
-            if self.lampo < -45:
-                ttemp = str(self.lampo).split('.')
-                msb = int(ttemp[0]) * -1
-                lsb = ttemp[1]
-                belowzero = str(3276 - msb) + "." + lsb
-                if float(belowzero) > 0.0:
-                    self.lampo = float(belowzero) * -1
-                else:
-                    self.lampo = float(belowzero)
-            if self.lampo > 100:
+            lampo = self.anturi.temperature - 3.01  # heitto noin 0 asteessa
+            if -45 < lampo < 100:
+                self.lampo = lampo * DHT22_LAMPO_KORJAUSKERROIN
+                bus.publish('lampo', self.lampo_keskiarvo.lisaa(self.lampo))
+            else:
                 self.lampo = None
-            #  Muotoilu ja tarvittaessa korjauskerroin
-            self.lampo = '{:.1f}'.format(self.lampo * DHT22_LAMPO_KORJAUSKERROIN)
-            if (self.anturi.humidity() > 0) and (self.anturi.humidity() < 101):
-                self.kosteus = '{:.1f}'.format(self.anturi.humidity() * DHT22_KOSTEUS_KORJAUSKERROIN)
-            await asyncio.sleep(self.lukuvali)
+            kosteus = self.anturi.humidity
+            if 0 < kosteus < 101:
+                self.kosteus = kosteus * DHT22_KOSTEUS_KORJAUSKERROIN
+                bus.publish('kosteus', self.kosteus_keskiarvo.lisaa(self.kosteus))
+            else:
+                self.kosteus = None
 
 
 def ratkaise_aika():
@@ -280,60 +310,28 @@ def ratkaise_aika():
 
 
 naytin = SPInaytonohjain()
-kaasusensori = KaasuSensori()
+kaasusensori = KaasuSensori(nint=CCS811_NINT_PINNI)
 tempjarh = LampojaKosteus()
 
 async def kerro_tilannetta():
     while True:
         # print("RSSI %s" % network.WLAN(network.STA_IF).status('rssi'), end=",")
         if tempjarh.lampo is not None:
-            print('Lampo: %s C' % tempjarh.lampo)
+            print('Lampo: %.1f C' % tempjarh.lampo)
         if tempjarh.kosteus is not None:
-            print('Kosteus: %s %%' % tempjarh.kosteus)
+            print('Kosteus: %.1f %%' % tempjarh.kosteus)
         await asyncio.sleep(2)
 
 
-async def laske_keskiarvot():
-    """ Luetaan 20 arvoa keskiarvon laskemiseksi. Tämä vähentää anturiheittoja. """
-    eco2_keskiarvot = []
-    tvoc_keskiarvot = []
-    lampo_keskiarvot = []
-    kosteus_keskiarvot = []
-
+async def ymparistokorjaus():
+    """ CCS811:lle lämmön ja kosteuden keskiarvot kun jompikumpi muuttuu, parantaa tarkkuutta """
+    tilaus = bus.subscribe(('lampo', 'kosteus'))
     while True:
-        if kaasusensori.eCO2 is not None:
-            eco2_keskiarvot.append(kaasusensori.eCO2)
-            kaasusensori.eCO2_keskiarvo = (sum(eco2_keskiarvot) / len(eco2_keskiarvot))
-            kaasusensori.eCO2_arvoja = len(eco2_keskiarvot)
-            #  Luetaan 20 arvoa ja poistetaan vanhin
-            if len(eco2_keskiarvot) == 20:
-                eco2_keskiarvot.pop(0)
-            #  Tänne ei pitäisi tulla koskaan
-            elif len(eco2_keskiarvot) > 20:
-                eco2_keskiarvot.clear()
-        if kaasusensori.tVOC is not None:
-            tvoc_keskiarvot.append(kaasusensori.tVOC)
-            kaasusensori.tVOC_keskiarvo = (sum(tvoc_keskiarvot) / len(tvoc_keskiarvot))
-            kaasusensori.tVOC_arvoja = len(tvoc_keskiarvot)
-            if len(tvoc_keskiarvot) == 20:
-                tvoc_keskiarvot.pop(0)
-            elif len(tvoc_keskiarvot) > 20:
-                tvoc_keskiarvot.clear()
-        if tempjarh.lampo is not None:
-            lampo_keskiarvot.append(float(tempjarh.lampo))
-            tempjarh.lampo_keskiarvo = sum(lampo_keskiarvot) / len(lampo_keskiarvot)
-            if len(lampo_keskiarvot) == 20:
-                lampo_keskiarvot.pop(0)
-            elif len(lampo_keskiarvot) > 20:
-                lampo_keskiarvot.clear()
-        if tempjarh.kosteus is not None:
-            kosteus_keskiarvot.append(float(tempjarh.kosteus))
-            tempjarh.kosteus_keskiarvo = sum(kosteus_keskiarvot) / len(kosteus_keskiarvot)
-            if len(kosteus_keskiarvot) == 20:
-                kosteus_keskiarvot.pop(0)
-            elif len(kosteus_keskiarvot) > 20:
-                kosteus_keskiarvot.clear()
-        await asyncio.sleep(1)
+        await tilaus.wait()
+        lampo = bus.get('lampo')
+        kosteus = bus.get('kosteus')
+        if lampo is not None and kosteus is not None:
+            kaasusensori.laheta_lampo_ja_kosteus_korjaus(lampo, kosteus)
 
 
 async def sivu_1():
@@ -353,9 +351,9 @@ async def sivu_1():
     else:
         await naytin.kaanteinen_vari(False)
     if tempjarh.lampo is not None:
-        await naytin.teksti_riville("Temp: %s C" % tempjarh.lampo, 4, 5)
+        await naytin.teksti_riville("Temp: %.1f C" % tempjarh.lampo, 4, 5)
     if tempjarh.kosteus is not None:
-        await naytin.teksti_riville("Rh:   %s %%" % tempjarh.kosteus, 5, 5)
+        await naytin.teksti_riville("Rh:   %.1f %%" % tempjarh.kosteus, 5, 5)
     await naytin.kaanna_180_astetta(True)
     if (ratkaise_aika()[1] > '20:00:00') and (ratkaise_aika()[1] < '08:00:00'):
         await naytin.kontrasti(2)
@@ -370,14 +368,14 @@ async def sivu_2():
     await naytin.kaynnista_naytto()
     await naytin.teksti_riville("KESKIARVOT", 0, 5)
     await naytin.piirra_alleviivaus(0, 10)
-    if kaasusensori.eCO2_keskiarvo > 1200:
+    if bus.get('eco2', 0) > 1200:
         await naytin.kaanteinen_vari(True)
-    if kaasusensori.tVOC_keskiarvo > 100:
+    if bus.get('tvoc', 0) > 100:
         await naytin.kaanteinen_vari(True)
-    await naytin.teksti_riville("eCO2:{:0.1f} ppm ".format(kaasusensori.eCO2_keskiarvo), 2, 5)
-    await naytin.teksti_riville("tVOC:{:0.1f} ppb".format(kaasusensori.tVOC_keskiarvo), 3, 5)
-    await naytin.teksti_riville("Temp:{:0.1f} C".format(tempjarh.lampo_keskiarvo), 4, 5)
-    await naytin.teksti_riville("Rh  :{:0.1f} %".format(tempjarh.kosteus_keskiarvo), 5, 5)
+    await naytin.teksti_riville("eCO2:{:0.1f} ppm ".format(bus.get('eco2', 0)), 2, 5)
+    await naytin.teksti_riville("tVOC:{:0.1f} ppb".format(bus.get('tvoc', 0)), 3, 5)
+    await naytin.teksti_riville("Temp:{:0.1f} C".format(bus.get('lampo', 0)), 4, 5)
+    await naytin.teksti_riville("Rh  :{:0.1f} %".format(bus.get('kosteus', 0)), 5, 5)
     await naytin.kaanna_180_astetta(True)
     if (ratkaise_aika()[1] > '20:00:00') and (ratkaise_aika()[1] < '08:00:00'):
         await naytin.kontrasti(2)
@@ -408,27 +406,24 @@ async def sivu_3():
 
 
 async def mqtt_raportoi():
-    """ Raportoidaan tiedot mqtt-brokerille ja asetetaan samalla ccs811-sensorille uudet lämpö ja kosteus """
-    global edellinen_mqtt_klo
-    n = 0
+    """ Raportoidaan muuttuneet keskiarvot mqtt-brokerille, herätään korkeintaan kerran MQTT_VALI aikana """
+    aiheet = (('eco2', AIHE_CO2, 0), ('tvoc', AIHE_TVOC, -1), ('lampo', DHT22_LAMPO, -50),
+              ('kosteus', DHT22_KOSTEUS, -1))
     while True:
-        await asyncio.sleep(5)
-        # print('mqtt-publish', n)
-        await client.publish('result', '{}'.format(n), qos=1)
-        n += 1
-        if (kaasusensori.eCO2_keskiarvo > 0) and (kaasusensori.tVOC_keskiarvo > 0) and \
-                (utime.time() - edellinen_mqtt_klo) > 60:
-            try:
-                await client.publish(AIHE_CO2, str(kaasusensori.eCO2_keskiarvo), retain=False, qos=0)
-                await client.publish(AIHE_TVOC, str(kaasusensori.tVOC_keskiarvo), retain=False, qos=0)
-                await client.publish(DHT22_LAMPO, str(tempjarh.lampo_keskiarvo), retain=False, qos=0)
-                await client.publish(DHT22_KOSTEUS, str(tempjarh.kosteus_keskiarvo), retain=False, qos=0)
-                await kaasusensori.laheta_lampo_ja_kosteus_korjaus(tempjarh.kosteus_keskiarvo, tempjarh.lampo_keskiarvo)
-                edellinen_mqtt_klo = utime.time()
-            except OSError as e:
-                await naytin.kaanteinen_vari(True)
-                await naytin.pitka_teksti_nayttoon("Virhe %s:" % e, 5)
-                await naytin.aktivoi_naytto()
+        #  Aikakatkaisu vain jotta muuttumattomat arvot toistetaan
+        if not await mqtt_tilaus.wait(30000):
+            continue
+        try:
+            for nimi, aihe, alaraja in aiheet:
+                if mqtt_tilaus.changed(nimi):
+                    arvo = bus.get(nimi)
+                    if arvo is not None and arvo > alaraja:
+                        await client.publish(aihe, str(arvo), retain=False, qos=0)
+                    mqtt_tilaus.consumed(nimi)
+        except OSError as e:
+            await naytin.kaanteinen_vari(True)
+            await naytin.pitka_teksti_nayttoon("Virhe %s:" % e, 5)
+            await naytin.aktivoi_naytto()
 
 
 async def main():
@@ -442,8 +437,9 @@ async def main():
     #  Aktivoi seuraava rivi jos haluat nähdä taustatoimintoja
     # asyncio.create_task(kerro_tilannetta())
     asyncio.create_task(kaasusensori.lue_arvot())
+    asyncio.create_task(kaasusensori.sensori.baseline_loop())
     asyncio.create_task(tempjarh.lue_arvot())
-    asyncio.create_task(laske_keskiarvot())
+    asyncio.create_task(ymparistokorjaus())
     asyncio.create_task(mqtt_raportoi())
     #  ESP32 oletusnopeus on 160 MHZ, lasketaan CPU lämmöntuoton vuoksi
     machine.freq(80000000)
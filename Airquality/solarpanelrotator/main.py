@@ -56,6 +56,7 @@ from umqttsimple import MQTTClient
 import network
 from json import load, dump
 import BME280_float as BmE
+import ADCSAMPLER_AS as ADCSAMPLER
 from Suntime import Sun
 import os
 
@@ -246,7 +247,7 @@ class StepperMotor(object):
             print("Turning panel clockwise %s steps" % self.max_steps_to_rotate)
         for i in range(1, self.max_steps_to_rotate):
             self.step("cw")
-            self.solar_voltage = ((solarpanelreader.read() / 1000) * 2)  # due to voltage splitter
+            self.solar_voltage = solarpanelreader.sample()
             if self.solar_voltage is not None:
                 try:
                     self.steps_voltages.append(self.solar_voltage)
@@ -380,8 +381,9 @@ def mqtt_report():
         if bmes.values[1][:-3] is not None:
             client.publish(TOPIC_PRESSURE, bmes.values[1][:-3], retain=0, qos=0)
             LAST_PRESSURE = bmes.values[1][:-3]
-        if batteryreader.read() > 0:
-            client.publish(TOPIC_BATTERY_VOLTAGE, str((batteryreader.read() / 1000) * 2), retain=0, qos=0)
+        battery_voltage = batteryreader.sample()
+        if battery_voltage:
+            client.publish(TOPIC_BATTERY_VOLTAGE, "%.2f" % battery_voltage, retain=0, qos=0)
 
     else:
         if DEBUG_ENABLED == 1:
@@ -424,12 +426,11 @@ secondarycircuit(0)
 sleep(1)
 
 """ Global objects """
-batteryreader = ADC(Pin(BATTERY_ADC_PIN))
-# Attennuation below 1 volts 11 db
-batteryreader.atten(ADC.ATTN_11DB)
+# Attennuation below 1 volts 11 db. ADC noise is +-150 counts: battery is trimmed mean of 32 reads, solar panel
+# median of 16 reads per step. Volts = counts * BATTERY_ADC_MULTIPLIER (voltage splitter included)
+batteryreader = ADCSAMPLER.ADCChannel(BATTERY_ADC_PIN, ADC.ATTN_11DB, n=32, trim=8, scale=BATTERY_ADC_MULTIPLIER)
 f4.write("Batteryreader circuit initialized\n")
-solarpanelreader = ADC(Pin(SOLARPANEL_ADC_PIN))
-solarpanelreader.atten(ADC.ATTN_11DB)
+solarpanelreader = ADCSAMPLER.ADCChannel(SOLARPANEL_ADC_PIN, ADC.ATTN_11DB, n=16, scale=BATTERY_ADC_MULTIPLIER)
 f4.write("Solarpanel circuit initialized\n")
 
 #  First initialize limiter_switch object, then panel motor
@@ -477,7 +478,7 @@ def main():
 
     # TRY - EXCEPT catch during main() init
 
-    battery_voltage = (batteryreader.read() / 1000) * 2
+    battery_voltage = batteryreader.sample() or 0
     if battery_voltage < BATTERY_LOW_VOLTAGE:
         if DEBUG_ENABLED == 1:
             print("Battery voltage %s too low!" % battery_voltage)
@@ -556,7 +557,7 @@ def main():
     # Save parameters to the file
     runtimedata['TURNTABLE_ZEROTIME'] = TURNTABLE_ZEROTIME
     runtimedata['STEPPER_LAST_STEP'] = panel_motor.steps_taken
-    runtimedata['LAST_BATTERY_VOLTAGE'] = (batteryreader.read() / 1000) * 2
+    runtimedata['LAST_BATTERY_VOLTAGE'] = batteryreader.value
     runtimedata['BATTERY_LOW_VOLTAGE'] = BATTERY_LOW_VOLTAGE
     runtimedata['BATTERY_ADC_MULTIPLIER'] = BATTERY_ADC_MULTIPLIER
     runtimedata['LAST_UPTIME'] = LAST_UPTIME
@@ -0,0 +1,195 @@
+"""
+Asynchronous ams CCS811 eCO2 / TVOC driver.
+
+With the nINT pin connected, the sensor pulls nINT low when a new result is ready and the IRQ handler sets a
+ThreadSafeFlag, read() awaits it and the I2C bus is not polled. Without int_pin read() polls the status register
+once per measurement interval. Reading ALG_RESULT_DATA releases nINT.
+
+Environment compensation: put_envdata() writes ENV_DATA only when temperature or humidity has moved more than
+the deadband since the last write, callers may pass every new reading.
+
+Baseline: the sensor learns its baseline during the first 48 h and after each power on it needs 20 minutes before
+the baseline can be written. baseline_loop() restores the saved baseline 20 minutes after start and saves the
+current one to flash every baseline_ival seconds, so a reboot does not restart the conditioning.
+
+    ccs = CCS811(i2c, int_pin=Pin(19))
+    asyncio.create_task(ccs.baseline_loop())
+    while True:
+        if await ccs.read():
+            print(ccs.eCO2, ccs.tVOC)
+        ccs.put_envdata(humidity=45.5, temp=21.3)
+"""
+import struct
+from machine import Pin
+import uasyncio as asyncio
+from utime import ticks_ms, ticks_diff, time
+try:
+    from binascii import crc32
+except ImportError:
+    from ubinascii import crc32
+
+REG_STATUS = 0x00
+REG_MEAS_MODE = 0x01
+REG_ALG_RESULT = 0x02
+REG_ENV_DATA = 0x05
+REG_BASELINE = 0x11
+REG_HW_ID = 0x20
+REG_APP_START = 0xF4
+HW_ID = 0x81
+MODE_MS = {1: 1000, 2: 10000, 3: 60000, 4: 250}
+WARMUP_S = 1200  # Baseline can be written 20 minutes after power on
+BL_MAGIC = b'CCB1'
+
+
+class CCS811(object):
+
+    def __init__(self, i2c, addr=0x5A, int_pin=None, mode=1, temp_band=0.5, rh_band=2.0,
+                 baseline_path='/ccs811.bin', baseline_ival=86400):
+        self.i2c = i2c
+        self.addr = addr  # 0x5A = 90, 0x5B = 91
+        self.interval_ms = MODE_MS[mode]
+        self.temp_band = temp_band
+        self.rh_band = rh_band
+        self.baseline_path = baseline_path
+        self.baseline_ival = baseline_ival
+        self.buf = bytearray(6)  # eCO2 (2), TVOC (2), STATUS, ERROR_ID
+        self.b1 = bytearray(1)
+        self.env = bytearray(4)
+        self.eCO2 = 0
+        self.tVOC = 0
+        self.read_time = None
+        self.env_temp = None  # Last written compensation
+        self.env_rh = None
+        self.started = ticks_ms()  # Not time(), an NTP step would shorten or stretch the warm-up
+        # Statistics
+        self.reads = 0
+        self.irqs = 0
+        self.polls = 0
+        self.missed = 0
+        self.errors = 0
+        self.error_id = 0
+        self.env_writes = 0
+        self.env_skipped = 0
+        self.baseline = None
+        self.baseline_saves = 0
+        self.baseline_restored = False
+
+        if self.addr not in i2c.scan():
+            raise ValueError('CCS811 not found. Please check wiring. Pull nWake to ground.')
+        if i2c.readfrom_mem(self.addr, REG_HW_ID, 1)[0] != HW_ID:
+            raise ValueError('Wrong Hardware ID.')
+        if not (i2c.readfrom_mem(self.addr, REG_STATUS, 1)[0] >> 4) & 0x01:
+            raise ValueError('Application not valid.')
+        i2c.writeto(self.addr, bytes((REG_APP_START,)))
+        self.flag = None
+        if int_pin is not None:
+            self.flag = asyncio.ThreadSafeFlag()
+            int_pin.init(Pin.IN, Pin.PULL_UP)
+            int_pin.irq(trigger=Pin.IRQ_FALLING, handler=self._irq)
+        # Drive mode in bits 6:4, bit 3 enables nINT on data ready
+        i2c.writeto_mem(self.addr, REG_MEAS_MODE, bytes(((mode << 4) | (0x08 if self.flag else 0),)))
+
+    def _irq(self, _):
+        self.irqs += 1
+        self.flag.set()
+
+    def _fetch(self):
+        """ Result registers, True if data was ready """
+        self.i2c.readfrom_mem_into(self.addr, REG_ALG_RESULT, self.buf)
+        status = self.buf[4]
+        if status & 0x01:
+            self.errors += 1
+            self.error_id = self.buf[5]
+            return False
+        if not status & 0x08:
+            return False
+        self.eCO2 = self.buf[0] << 8 | self.buf[1]
+        self.tVOC = self.buf[2] << 8 | self.buf[3]
+        self.read_time = time()
+        self.reads += 1
+        return True
+
+    async def read(self):
+        """ Waits for the next result, True if eCO2 and tVOC were updated """
+        if self.flag is not None:
+            try:
+                await asyncio.wait_for_ms(self.flag.wait(), 2 * self.interval_ms)
+            except asyncio.TimeoutError:
+                self.missed += 1  # nINT was low before the IRQ was enabled, reading the result releases it
+            return self._fetch()
+        while True:
+            await asyncio.sleep_ms(self.interval_ms)
+            self.polls += 1
+            self.i2c.readfrom_mem_into(self.addr, REG_STATUS, self.b1)
+            if self.b1[0] & 0x09:
+                return self._fetch()
+
+    def put_envdata(self, humidity, temp):
+        """ Compensation in % RH and C, written only beyond the deadband. True if written """
+        if not (-25 < temp < 100 and 0 <= humidity <= 100):
+            return False
+        if (self.env_temp is not None and abs(temp - self.env_temp) < self.temp_band and
+                abs(humidity - self.env_rh) < self.rh_band):
+            self.env_skipped += 1
+            return False
+        struct.pack_into('>HH', self.env, 0, int(humidity * 512 + 0.5), int((temp + 25) * 512 + 0.5))
+        self.i2c.writeto_mem(self.addr, REG_ENV_DATA, self.env)
+        self.env_temp = temp
+        self.env_rh = humidity
+        self.env_writes += 1
+        return True
+
+    def get_baseline(self):
+        return self.i2c.readfrom_mem(self.addr, REG_BASELINE, 2)
+
+    def put_baseline(self, baseline):
+        self.i2c.writeto_mem(self.addr, REG_BASELINE, baseline)
+
+    def load_baseline(self):
+        try:
+            with open(self.baseline_path, 'rb') as f:
+                blob = f.read()
+        except OSError:
+            return None
+        if len(blob) != 10 or blob[:4] != BL_MAGIC:
+            return None
+        if struct.unpack_from('<I', blob, 6)[0] != crc32(blob[:6]) & 0xffffffff:
+            return None
+        return blob[4:6]
+
+    def save_baseline(self):
+        baseline = self.get_baseline()
+        if baseline == self.baseline:
+            return False
+        blob = BL_MAGIC + baseline
+        try:
+            with open(self.baseline_path, 'wb') as f:
+                f.write(blob)
+                f.write(struct.pack('<I', crc32(blob) & 0xffffffff))
+        except OSError as e:
+            print("CCS811: can not write %s: %s" % (self.baseline_path, e))
+            return False
+        self.baseline = baseline
+        self.baseline_saves += 1
+        return True
+
+    async def baseline_loop(self):
+        await asyncio.sleep_ms(max(0, WARMUP_S * 1000 - ticks_diff(ticks_ms(), self.started)))
+        saved = self.load_baseline()
+        if saved is not None:
+            self.put_baseline(saved)
+            self.baseline = saved
+            self.baseline_restored = True
+        start = ticks_ms()
+        while True:
+            await asyncio.sleep(60)
+            if ticks_diff(ticks_ms(), start) >= self.baseline_ival * 1000:
+                start = ticks_ms()
+                self.save_baseline()
+
+    def stats(self):
+        return ("reads %s, irqs %s (missed %s), polls %s, errors %s (id %s), env writes %s skipped %s, "
+                "baseline %s (restored %s, saves %s)" %
+                (self.reads, self.irqs, self.missed, self.polls, self.errors, self.error_id, self.env_writes,
+                 self.env_skipped, None if self.baseline is None else "%02x%02x" % tuple(self.baseline),
+                 self.baseline_restored, self.baseline_saves))
@@ -0,0 +1,181 @@
+"""
+Asynchronous DS18B20 bus scheduler for several sensors on one OneWire pin.
+
+One cycle: broadcast Convert T (skip ROM) to all sensors, await the conversion time of the slowest resolution
+(9 bit 94 ms, 10 bit 188 ms, 11 bit 375 ms, 12 bit 750 ms) and read each scratchpad with CRC check. The event
+loop runs during the conversion, only the scratchpad reads (about 5 ms each) block, and the loop yields between
+sensors. DS18B20 (0x28) and DS1822 (0x22) are supported, DS18S20 has another temperature format.
+
+    bus = DS18B20Bus(onewire.OneWire(Pin(4)), roms, resolution=12)
+    bus.set_resolution(roms[0], 9)        # faster cycle, 0.5 C steps
+    temps = await bus.cycle()             # list in roms order, None if sensor did not answer or CRC failed
+    print(bus.crc_errors, bus.latency_us, bus.cycle_ms)
+
+Statistics per sensor (lists in roms order): reads, crc_errors, missing (no presence pulse), latency_us
+(last scratchpad read), max_latency_us and res_fixes. A rom can be None (role without a sensor), it is skipped.
+A sensor which has lost its resolution (power cycle without EEPROM copy) is reconfigured, that reading is None.
+"""
+import utime
+from micropython import const
+import uasyncio as asyncio
+
+CMD_CONVERT = const(0x44)
+CMD_RD_SCRATCH = const(0xBE)
+CMD_WR_SCRATCH = const(0x4E)
+CMD_CP_SCRATCH = const(0x48)
+CMD_SKIP_ROM = const(0xCC)
+FAMILIES = (0x28, 0x22)
+CONV_MS = {9: 94, 10: 188, 11: 375, 12: 750}
+RES_MASK = {9: ~7, 10: ~3, 11: ~1, 12: ~0}  # Undefined low bits at lower resolutions
+
+
+def _check_res(bits):
+    if bits not in CONV_MS:
+        raise ValueError("DS18B20 resolution %s, supported %s" % (bits, tuple(sorted(CONV_MS))))
+    return bits
+
+
+class DS18B20Bus(object):
+
+    def __init__(self, ow, roms=(), resolution=12):
+        self.ow = ow
+        self.buf = bytearray(9)
+        self.roms = []
+        self.res = []
+        self.temps = []
+        self.reads = []
+        self.crc_errors = []
+        self.missing = []
+        self.latency_us = []
+        self.max_latency_us = []
+        self.res_fixes = []
+        self.conv_ms = CONV_MS[_check_res(resolution)]
+        self.cycles = 0
+        self.cycle_ms = None
+        self.read_time = 0
+        for rom in roms:
+            self.add(rom, resolution)
+
+    def scan(self):
+        return [rom for rom in self.ow.scan() if rom[0] in FAMILIES]
+
+    def add(self, rom, resolution=12):
+        _check_res(resolution)
+        self.roms.append(bytes(rom) if rom else None)
+        self.res.append(resolution)
+        self.temps.append(None)
+        self.reads.append(0)
+        self.crc_errors.append(0)
+        self.missing.append(0)
+        self.latency_us.append(0)
+        self.max_latency_us.append(0)
+        self.res_fixes.append(0)
+        self._update_conv()
+        return len(self.roms) - 1
+
+    def _update_conv(self):
+        self.conv_ms = CONV_MS[max(self.res)] if self.res else CONV_MS[12]
+
+    def _read_scratch(self, rom):
+        """ True if CRC is valid, False on CRC error, None if there is no presence pulse """
+        ow = self.ow
+        if not ow.reset():
+            return None
+        ow.select_rom(rom)
+        ow.writebyte(CMD_RD_SCRATCH)
+        ow.readinto(self.buf)
+        return ow.crc8(self.buf) == 0
+
+    def _write_conf(self, rom, bits, persist):
+        """ Alarm registers TH and TL from the scratchpad in buf are written back unchanged """
+        ow = self.ow
+        ow.reset()
+        ow.select_rom(rom)
+        ow.writebyte(CMD_WR_SCRATCH)
+        ow.write(bytes((self.buf[2], self.buf[3], ((bits - 9) << 5) | 0x1F)))
+        if persist:
+            ow.reset()
+            ow.select_rom(rom)
+            ow.writebyte(CMD_CP_SCRATCH)
+            utime.sleep_ms(10)
+
+    def set_resolution(self, rom, bits, persist=False):
+        """ 9 - 12 bits, alarm registers are kept. persist=True copies configuration to the sensor EEPROM """
+        _check_res(bits)
+        ok = self._read_scratch(rom)
+        if not ok:
+            raise OSError("DS18B20 %s %s" % (rom, "CRC error" if ok is False else "not responding"))
+        if persist or (self.buf[4] >> 5) & 3 != bits - 9:
+            self._write_conf(rom, bits, persist)
+        rom = bytes(rom)
+        if rom in self.roms:
+            self.res[self.roms.index(rom)] = bits
+            self._update_conv()
+
+    def convert(self):
+        """ Broadcast Convert T, False if no sensor answers the reset """
+        ow = self.ow
+        if not ow.reset():
+            return False
+        ow.writebyte(CMD_SKIP_ROM)
+        ow.writebyte(CMD_CONVERT)
+        return True
+
+    def read(self, i):
+        """ Temperature of sensor i from its scratchpad, None on error """
+        start = utime.ticks_us()
+        ok = self._read_scratch(self.roms[i])
+        lat = utime.ticks_diff(utime.ticks_us(), start)
+        self.latency_us[i] = lat
+        if lat > self.max_latency_us[i]:
+            self.max_latency_us[i] = lat
+        self.reads[i] += 1
+        if ok is None:
+            self.missing[i] += 1
+            return None
+        if not ok:
+            self.crc_errors[i] += 1
+            return None
+        if (self.buf[4] >> 5) & 3 != self.res[i] - 9:
+            # Conversion was done with another resolution and may not be ready, value is not used
+            self.res_fixes[i] += 1
+            self._write_conf(self.roms[i], self.res[i], False)
+            return None
+        raw = (self.buf[1] << 8 | self.buf[0]) & RES_MASK[self.res[i]]
+        if raw & 0x8000:
+            raw -= 0x10000
+        return raw / 16
+
+    async def cycle(self):
+        """ One conversion of all sensors, returns temps (list in roms order) """
+        start = utime.ticks_ms()
+        if self.convert():
+            await asyncio.sleep_ms(self.conv_ms)
+            for i in range(len(self.roms)):
+                if self.roms[i] is None:
+                    continue
+                self.temps[i] = self.read(i)
+                await asyncio.sleep_ms(0)
+        else:
+            for i in range(len(self.roms)):
+                self.missing[i] += 1
+                self.temps[i] = None
+        self.cycles += 1
+        self.cycle_ms = utime.ticks_diff(utime.ticks_ms(), start)
+        self.read_time = utime.time()
+        return self.temps
+
+    def read_temp(self, rom):
+        """ Blocking single read for REPL use, do not call from the event loop """
+        self.convert()
+        utime.sleep_ms(CONV_MS[12])
+        ok = self._read_scratch(rom)
+        if not ok:
+            return None
+        raw = self.buf[1] << 8 | self.buf[0]
+        if raw & 0x8000:
+            raw -= 0x10000
+        return raw / 16
+
+    def crc_rate(self, i):
+        return self.crc_errors[i] / self.reads[i] if self.reads[i] else 0
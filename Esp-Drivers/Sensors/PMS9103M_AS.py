@@ -3,16 +3,39 @@
 
   Active mode UART driver for PMS9103M (and 7000 etc)
 
-  Add loop into your code loop.create_task(objectname.read_async_loop())
+  Wake up the sensor with await objectname.init(), then
+  add loop into your code loop.create_task(objectname.read_async_loop())
 
+  19.10.2026: Passive mode duty cycling. With duty=True the fan and laser run only for a reading:
+  wake up, wait warmup seconds (30 s by the datasheet), request frames with the passive read command, average
+  them, put the sensor to sleep. Cycle length starts at min_period and doubles up to max_period while PM2.5
+  stays within the change band (change relative or change_abs ug/m3), a bigger change drops it back to
+  min_period. If the off time would be shorter than warmup the sensor stays awake.
+
+  Frames are parsed from the byte stream with a timeout, command acknowledgements (length 4) are skipped and
+  garbage before 0x42 0x4d is dropped. Active mode (default) keeps the old behaviour: one frame every
+  read_interval, the frames buffered during the sleep are flushed, not parsed.
+
+      pms = await PMS(rxpin=16, txpin=17, uart=2, duty=True).init()
+      asyncio.create_task(pms.read_async_loop())
+      print(pms.pms_dictionary['PM2_5_ATM'], pms.period, pms.duty_cycle(), pms.stats())
+
+  max_period is the longest time between readings in both modes, use it with read_ticks (ticks_ms() of the last
+  reading) for supervision. on_sample(sensor) is called after each new pms_dictionary, for example to publish it
+  on SAMPLEBUS_AS.
 """
 
+from array import array
 from machine import UART, Pin
-import gc
-import struct
 import utime
 import uasyncio as asyncio
 
+FRAME_TIMEOUT_MS = 2000  # Passive read reply, 32 bytes at 9600 baud is 33 ms
+ACTIVE_TIMEOUT_MS = 5000  # Active mode sends a frame every 0.2 - 2.3 s
+DATA_LEN = 28
+KEYS = ('PM1_0', 'PM2_5', 'PM10_0', 'PM1_0_ATM', 'PM2_5_ATM', 'PM10_0_ATM', 'PCNT_0_3', 'PCNT_0_5', 'PCNT_1_0',
+        'PCNT_2_5', 'PCNT_5_0', 'PCNT_10_0')
+
 
 class PMS:
 
@@ -35,95 +58,213 @@ class PMS:
     PMS_ERROR = 14
     PMS_CHECKSUM = 15
     PMS_ACTIVE_MODE = bytearray([0x42, 0x4d, 0xe1, 0x00, 0x01, 0x01, 0x71])
+    PMS_PASSIVE_MODE = bytearray([0x42, 0x4d, 0xe1, 0x00, 0x00, 0x01, 0x70])
+    PMS_PASSIVE_READ = bytearray([0x42, 0x4d, 0xe2, 0x00, 0x00, 0x01, 0x71])
+    PMS_SLEEP = bytearray([0x42, 0x4d, 0xe4, 0x00, 0x00, 0x01, 0x73])
     PMS_WAKEUP = bytearray([0x42, 0x4d, 0xe4, 0x00, 0x01, 0x01, 0x74])
 
-
     #  Default UART1, rx=32, tx=33. Don't use UART0 if you want to use REPL!
-    def __init__(self, rxpin=16, txpin=17, uart=2):
+    def __init__(self, rxpin=16, txpin=17, uart=2, duty=False, min_period=60, max_period=600, frames=5,
+                 warmup=30, change=0.2, change_abs=2):
         self.sensor = UART(uart, baudrate=9600, bits=8, parity=None, stop=1, rx=Pin(rxpin), tx=Pin(txpin))
+        self.port_r = asyncio.StreamReader(self.sensor)
+        self.port_w = asyncio.StreamWriter(self.sensor, {})
+        self.buf = bytearray(32)
+        self.vals = array('L', [0] * len(KEYS))
         self.pms_dictionary = None
         self.debug = False
-        asyncio.run(self.writer(self.PMS_WAKEUP))
-        if (self.reader(1) != 7) and (self.debug is True):
-            print("PMS Wakeup failed!")
-        asyncio.run(self.writer(self.PMS_ACTIVE_MODE))
-        if (self.reader(1) != 7) and (self.debug is True):
-            print("PMS Set Active failed!")
+        self.on_sample = None
         self.startup_time = utime.time()
         self.read_time = 0
-        self.read_interval = 30
+        self.read_ticks = utime.ticks_ms()  # Supervisor stamp, last reading or start. Not moved by RTC sync
+        self.duty = duty
+        self.frames = frames
+        self.warmup = warmup
+        self.change = change
+        self.change_abs = change_abs
+        self.min_period = min_period
+        self.max_period = max_period if duty else 30
+        self.period = min_period
+        self.read_interval = min_period if duty else 30
+        # Statistics
+        self.rx_bytes = 0
+        self.tx_bytes = 0
+        self.frames_ok = 0
+        self.checksum_errors = 0
+        self.sync_drops = 0
+        self.acks = 0
+        self.timeouts = 0
+        self.cycles = 0
+        self.wakeups = 0
+        self.on_ms = 0
+        self.started_ms = utime.ticks_ms()
+        self.on_since = self.started_ms  # ticks_ms of the last wake up, None while sleeping. On at power on
 
-    async def writer(self, data):
-        port = asyncio.StreamWriter(self.sensor, {})
-        port.write(data)
-        await port.drain()
-        await asyncio.sleep(2)
+    async def init(self):
+        """ Wake up and set the mode without blocking the loop, returns self for DeviceInit factories """
+        await self.wakeup()
+        await self.command(self.PMS_PASSIVE_MODE if self.duty else self.PMS_ACTIVE_MODE)
+        self.startup_time = utime.time()
+        self.read_ticks = utime.ticks_ms()
+        return self
 
-    async def reader(self, chars):
-        port = asyncio.StreamReader(self.sensor)
-        try:
-            data = await port.readexactly(chars)
-            if self.debug:
-                print("PMS data in %s" % data)
-            if len(data) == int(chars):
-                return data
-            else:
-                return False
-        except MemoryError:
-            gc.collect()
-            return False
+    def _flush(self):
+        while self.sensor.any():
+            self.rx_bytes += len(self.sensor.read() or b'')
 
-    @staticmethod
-    def _assert_byte(byte, expected):
-        if byte is None or len(byte) < 1 or ord(byte) != expected:
-            return False
-        return True
+    async def command(self, data):
+        self._flush()
+        self.port_w.write(data)
+        await self.port_w.drain()
+        self.tx_bytes += len(data)
 
-    async def read_async_loop(self):
+    async def wakeup(self):
+        await self.command(self.PMS_WAKEUP)
+        if self.on_since is None:
+            self.on_since = utime.ticks_ms()
+        self.wakeups += 1
+        await asyncio.sleep(2)  # Sensor does not answer commands right after wake up
+
+    async def standby(self):
+        await self.command(self.PMS_SLEEP)
+        if self.on_since is not None:
+            self.on_ms += utime.ticks_diff(utime.ticks_ms(), self.on_since)
+            self.on_since = None
 
+    async def _read_frame(self):
+        """ Next data frame into buf, acknowledgements are skipped, garbage is dropped """
+        buf = self.buf
+        n = 0
+        need = 4
         while True:
+            data = await self.port_r.read(need - n)
+            self.rx_bytes += len(data)
+            for b in data:
+                if n == 1 and b != PMS.START_BYTE_2:
+                    self.sync_drops += 1  # Start byte in buf[0] is dropped, b may start the next frame
+                    n = 0
+                if n == 0 and b != PMS.START_BYTE_1:
+                    self.sync_drops += 1
+                    continue
+                buf[n] = b
+                n += 1
+                if n == 4:
+                    length = buf[2] << 8 | buf[3]
+                    if not 4 <= length <= DATA_LEN:
+                        self.sync_drops += 4
+                        n = 0
+                        continue
+                    need = 4 + length
+                elif n == need:
+                    n = 0
+                    need = 4
+                    if length != DATA_LEN:
+                        self.acks += 1
+                        continue
+                    total = 0
+                    for i in range(30):
+                        total += buf[i]
+                    if total == buf[30] << 8 | buf[31]:
+                        self.frames_ok += 1
+                        return True
+                    self.checksum_errors += 1
 
-            first_byte = await self.reader(1)
-            if not self._assert_byte(first_byte, PMS.START_BYTE_1):
-                continue
+    async def _wait_frame(self, timeout_ms):
+        try:
+            return await asyncio.wait_for_ms(self._read_frame(), timeout_ms)
+        except asyncio.TimeoutError:
+            self.timeouts += 1
+            return False
 
-            second_byte = await self.reader(1)
-            if not self._assert_byte(second_byte, PMS.START_BYTE_2):
-                continue
+    def _store(self):
+        """ vals and version, error and checksum of the last frame into pms_dictionary """
+        buf = self.buf
+        d = {'FRAME_LENGTH': DATA_LEN}
+        for i in range(len(KEYS)):
+            d[KEYS[i]] = self.vals[i]
+        d['VERSION'] = buf[28]
+        d['ERROR'] = buf[29]
+        d['CHECKSUM'] = buf[30] << 8 | buf[31]
+        self.pms_dictionary = d
+        self.read_time = utime.time()
+        self.read_ticks = utime.ticks_ms()
+        if self.on_sample is not None:
+            self.on_sample(self)
+        if self.debug:
+            print("PMS Read at %s" % self.read_time)
+            if buf[29] != 0:
+                print("PMS reports error %s" % buf[29])
 
-            # we are reading 30 bytes left
-            read_bytes = await self.reader(30)
-            if len(read_bytes) < 30:
-                continue
+    async def read_passive(self):
+        """ Average of frames passive reads into pms_dictionary, False if no frame arrived """
+        buf = self.buf
+        vals = self.vals
+        for i in range(len(KEYS)):
+            vals[i] = 0
+        got = 0
+        for _ in range(self.frames):
+            await self.command(self.PMS_PASSIVE_READ)
+            if await self._wait_frame(FRAME_TIMEOUT_MS):
+                for i in range(len(KEYS)):
+                    vals[i] += buf[4 + 2 * i] << 8 | buf[5 + 2 * i]
+                got += 1
+            await asyncio.sleep(1)  # Sensor updates its data about once per second
+        if not got:
+            return False
+        for i in range(len(KEYS)):
+            vals[i] = (vals[i] + got // 2) // got
+        self._store()
+        return True
 
-            data = struct.unpack('!HHHHHHHHHHHHHBBH', read_bytes)
+    def _adapt(self, previous):
+        pm = self.pms_dictionary['PM2_5_ATM']
+        if previous is None or abs(pm - previous) > max(self.change_abs, self.change * previous):
+            self.period = self.min_period
+        else:
+            self.period = min(self.max_period, self.period * 2)
 
-            checksum = PMS.START_BYTE_1 + PMS.START_BYTE_2
-            checksum += sum(read_bytes[:28])
+    async def duty_loop(self):
+        await self.command(self.PMS_PASSIVE_MODE)
+        while True:
+            start = utime.ticks_ms()
+            if self.on_since is None:
+                await self.wakeup()
+                await self.command(self.PMS_PASSIVE_MODE)
+            awake = utime.ticks_diff(utime.ticks_ms(), self.on_since) // 1000
+            if awake < self.warmup:
+                await asyncio.sleep(self.warmup - awake)
+            previous = self.pms_dictionary['PM2_5_ATM'] if self.pms_dictionary else None
+            if await self.read_passive():
+                self._adapt(previous)
+            self.cycles += 1
+            rest = self.period - utime.ticks_diff(utime.ticks_ms(), start) // 1000
+            if rest > self.warmup:
+                await self.standby()
+            await asyncio.sleep(max(1, rest))
 
-            if checksum != data[PMS.PMS_CHECKSUM]:
+    async def read_async_loop(self):
+        if self.duty:
+            await self.duty_loop()
+        while True:
+            self._flush()  # Frames sent during the sleep are old
+            if not await self._wait_frame(ACTIVE_TIMEOUT_MS):
                 continue
-
-            self.pms_dictionary = {
-                'FRAME_LENGTH': data[PMS.PMS_FRAME_LENGTH],
-                'PM1_0': data[PMS.PMS_PM1_0],
-                'PM2_5': data[PMS.PMS_PM2_5],
-                'PM10_0': data[PMS.PMS_PM10_0],
-                'PM1_0_ATM': data[PMS.PMS_PM1_0_ATM],
-                'PM2_5_ATM': data[PMS.PMS_PM2_5_ATM],
-                'PM10_0_ATM': data[PMS.PMS_PM10_0_ATM],
-                'PCNT_0_3': data[PMS.PMS_PCNT_0_3],
-                'PCNT_0_5': data[PMS.PMS_PCNT_0_5],
-                'PCNT_1_0': data[PMS.PMS_PCNT_1_0],
-                'PCNT_2_5': data[PMS.PMS_PCNT_2_5],
-                'PCNT_5_0': data[PMS.PMS_PCNT_5_0],
-                'PCNT_10_0': data[PMS.PMS_PCNT_10_0],
-                'VERSION': data[PMS.PMS_VERSION],
-                'ERROR': data[PMS.PMS_ERROR],
-                'CHECKSUM': data[PMS.PMS_CHECKSUM], }
-            self.read_time = utime.time()
-            if self.debug:
-                print("PMS Read at %s" % self.read_time)
-                if data[PMS.PMS_ERROR] != 0:
-                    print("PMS reports error %s" % data[PMS.PMS_ERROR])
+            buf = self.buf
+            for i in range(len(KEYS)):
+                self.vals[i] = buf[4 + 2 * i] << 8 | buf[5 + 2 * i]
+            self._store()
             await asyncio.sleep(self.read_interval)
+
+    def duty_cycle(self):
+        """ Share of time the fan and laser have been on since start """
+        on = self.on_ms
+        if self.on_since is not None:
+            on += utime.ticks_diff(utime.ticks_ms(), self.on_since)
+        total = utime.ticks_diff(utime.ticks_ms(), self.started_ms)
+        return on / total if total > 0 else 1.0
+
+    def stats(self):
+        return ("duty %.2f, period %s s, cycles %s, frames %s, checksum errors %s, acks %s, timeouts %s, "
+                "sync drops %s, uart rx %s B tx %s B" %
+                (self.duty_cycle(), self.period if self.duty else self.read_interval, self.cycles, self.frames_ok,
+                 self.checksum_errors, self.acks, self.timeouts, self.sync_drops, self.rx_bytes, self.tx_bytes))
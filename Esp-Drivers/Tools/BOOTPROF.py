@@ -0,0 +1,121 @@
+"""
+Boot timeline profiler.
+
+Records start time (ticks_us since reset), duration and heap delta of each boot phase into preallocated arrays,
+so profiling itself does not allocate. Import this module first in main.py, phases can be nested.
+
+    from drivers.BOOTPROF import boot_phase, boot_mark, prof
+    with boot_phase("pms_init"):
+        pms = PARTICLES.PSensorPMS7003(...)
+    boot_mark("wifi_up")          # zero length event, for example from an async task
+    prof.dump()                   # REPL
+    prof.save()                   # /boottime.csv, overwritten at every boot
+    await prof.publish(client, topic)
+
+Heap delta is gc.mem_alloc() after - before, collections during the phase make it smaller or negative.
+"""
+import gc
+from array import array
+from utime import ticks_us, ticks_diff
+
+MAX_PHASES = 32
+
+
+class BootProfiler(object):
+
+    def __init__(self, size=MAX_PHASES):
+        self.size = size
+        self.names = [None] * size
+        self.start = array('l', [0] * size)
+        self.dur = array('l', [0] * size)
+        self.heap = array('l', [0] * size)
+        self.depth = bytearray(size)
+        self.count = 0
+        self.stack = array('b', [0] * 8)  # Open phase indexes
+        self.level = 0
+        self.pending = None
+        self.boot_us = ticks_us()  # Import time of this module, ticks_us() starts at reset
+        self.overflow = 0
+
+    def begin(self, name, nest=True):
+        """ nest=False for phases which overlap (concurrent tasks), those must be ended with end(i) """
+        if self.count >= self.size or self.level >= len(self.stack):
+            self.overflow += 1
+            return -1
+        i = self.count
+        self.count += 1
+        self.names[i] = name
+        self.depth[i] = self.level
+        if nest:
+            self.stack[self.level] = i
+            self.level += 1
+        self.heap[i] = gc.mem_alloc()
+        self.dur[i] = -1  # Open
+        self.start[i] = ticks_us()
+        return i
+
+    def end(self, i=None):
+        now = ticks_us()
+        if i is None:
+            if self.level == 0:
+                return
+            i = self.stack[self.level - 1]
+        if i < 0 or self.dur[i] != -1:
+            return
+        if self.level > 0 and self.stack[self.level - 1] == i:
+            self.level -= 1
+        self.dur[i] = ticks_diff(now, self.start[i])
+        self.heap[i] = gc.mem_alloc() - self.heap[i]
+
+    def mark(self, name):
+        i = self.begin(name, False)
+        if i >= 0:
+            self.dur[i] = 0
+            self.heap[i] = 0
+
+    # Context manager, boot_phase(name) returns the profiler itself, no allocation per phase
+    def __call__(self, name):
+        self.pending = name
+        return self
+
+    def __enter__(self):
+        self.begin(self.pending)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.end()
+        return False
+
+    def lines(self):
+        for i in range(self.count):
+            yield "%s%s,%s,%s,%s" % ('  ' * self.depth[i], self.names[i], self.start[i] // 1000,
+                                     (self.dur[i] // 1000) if self.dur[i] >= 0 else 'open', self.heap[i])
+
+    def total_ms(self):
+        return ticks_diff(ticks_us(), self.boot_us) // 1000
+
+    def dump(self):
+        print("Boot timeline: phase, start ms, duration ms, heap delta bytes")
+        for line in self.lines():
+            print(line)
+
+    def save(self, path='/boottime.csv'):
+        try:
+            with open(path, 'w') as f:
+                f.write("phase,start_ms,duration_ms,heap_bytes\r\n")
+                for line in self.lines():
+                    f.write(line.strip())
+                    f.write("\r\n")
+        except OSError as e:
+            print("BootProfiler: can not write %s: %s" % (path, e))
+
+    async def publish(self, client, topic):
+        """ One message, phase:start_ms:duration_ms separated with ; """
+        msg = ";".join("%s:%s:%s" % (self.names[i], self.start[i] // 1000, self.dur[i] // 1000)
+                       for i in range(self.count))
+        await client.publish(topic, msg, retain=0, qos=0)
+
+
+prof = BootProfiler()
+boot_phase = prof
+boot_mark = prof.mark
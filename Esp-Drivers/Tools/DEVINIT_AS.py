@@ -0,0 +1,90 @@
+"""
+Parallel asynchronous device initialisation.
+
+Each device is registered with a factory which returns the device object. Factory may be a plain function (sync
+constructor) or an async function, for example one which wakes up a UART sensor and awaits its settle time.
+All factories run as separate tasks, so UART wakeups, sensor settle sleeps and WiFi association overlap instead of
+running one after another at import time. Each init has its own timeout. Failure or timeout marks the device
+faulty in the fault map, other devices continue.
+
+    devs = DeviceInit()
+    devs.add('pms', pms_init, timeout=10)             # async def pms_init(): ... return sensor
+    devs.add('bme', lambda: BME680_I2C(i2c=i2c))
+    devs.add('aq', lambda: AirQuality(devs['pms']), after=('pms',))
+    await devs.run()
+    if not devs.fault('pms'):
+        loop.create_task(devs['pms'].read_async_loop())
+
+devs.faults holds the error text of faulty devices, devs.init_ms the init time of each device.
+"""
+import uasyncio as asyncio
+from utime import ticks_ms, ticks_diff
+try:
+    from BOOTPROF import prof
+except ImportError:
+    try:
+        from drivers.BOOTPROF import prof
+    except ImportError:
+        prof = None
+
+
+class DeviceInit(object):
+
+    def __init__(self, timeout=10):
+        self.timeout = timeout
+        self.names = []
+        self.factories = {}
+        self.timeouts = {}
+        self.deps = {}
+        self.devices = {}
+        self.faults = {}
+        self.init_ms = {}
+        self.done = {}
+        self.stage_ms = None
+
+    def add(self, name, factory, timeout=None, after=()):
+        self.names.append(name)
+        self.factories[name] = factory
+        self.timeouts[name] = timeout if timeout is not None else self.timeout
+        self.deps[name] = after
+        self.done[name] = asyncio.Event()
+
+    def __getitem__(self, name):
+        return self.devices.get(name)
+
+    def fault(self, name):
+        """ True if device failed or is not initialised (yet) """
+        return name not in self.devices
+
+    async def _call(self, factory):
+        dev = factory()
+        if hasattr(dev, 'send'):  # Coroutine
+            dev = await dev
+        return dev
+
+    async def _init(self, name):
+        for dep in self.deps[name]:
+            await self.done[dep].wait()
+            if self.fault(dep):
+                self.faults[name] = "%s faulty" % dep
+                self.done[name].set()
+                return
+        start = ticks_ms()
+        p = prof.begin(name, False) if prof is not None else -1
+        try:
+            self.devices[name] = await asyncio.wait_for(self._call(self.factories[name]), self.timeouts[name])
+        except asyncio.TimeoutError:
+            self.faults[name] = "init timeout %s s" % self.timeouts[name]
+        except Exception as e:
+            self.faults[name] = "%s" % e
+        if prof is not None:
+            prof.end(p)
+        self.init_ms[name] = ticks_diff(ticks_ms(), start)
+        self.done[name].set()
+
+    async def run(self):
+        """ Initialise all devices concurrently, returns the fault map """
+        start = ticks_ms()
+        await asyncio.gather(*[self._init(name) for name in self.names])
+        self.stage_ms = ticks_diff(ticks_ms(), start)
+        return self.faults
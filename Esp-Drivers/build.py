@@ -0,0 +1,233 @@
+"""
+Builds precompiled driver bundle (.mpy) for an application from its drivers.manifest. Runs on the host (CPython 3).
+
+On the device .py drivers are compiled at every import, which takes time and the compiler needs heap. .mpy files
+are loaded without compiling. Esp-Drivers is the single source of the shared drivers, apps list what they use:
+
+    # Airquality/esp32-bme680-oled/drivers.manifest
+    Tools/BOOTPROF.py          # relative to Esp-Drivers
+    MQTT/MQTT_AS.py
+    drivers/AQI.py             # module of the app itself
+
+    python3 Esp-Drivers/build.py Airquality/esp32-bme680-oled
+    mpremote fs cp -r Airquality/esp32-bme680-oled/build/drivers :
+
+Output is <app>/build/drivers/*.mpy and BUILDINFO.mpy (VERSION, APP, MODULES), <app>/build/*.mpy for the older
+flat apps without drivers/. Upload main.py, boot.py and parameters.py as source. mpy-cross must match the
+firmware's .mpy version (MicroPython >= 1.22: mpy v6.x).
+
+Apps keep source copies of their shared drivers in <app>/drivers/ (flat apps: in the app folder) for deploying
+without a build. --check compares
+each copy with its manifest source and exits with 1 when one differs or is missing, --sync copies the sources over:
+
+    python3 Esp-Drivers/build.py --check Airquality/* HVAC-systems/esp32-ds18b20
+    python3 Esp-Drivers/build.py --sync Airquality/esp32-bme680-oled
+
+--bench runs the MicroPython Unix port, imports each module from source and from .mpy and reports time and
+heap use. uasyncio is imported before the measurement, it is frozen into the firmware on the device. Modules
+which need hardware (machine, network) fail to import on Unix and are reported as such.
+"""
+import argparse
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+BENCH = """
+import gc, sys, time, micropython
+sys.path.insert(0, %r)
+try:
+    import uasyncio  # Frozen into the firmware on the device, not part of the module's cost
+except ImportError:
+    pass
+if getattr(sys.implementation, '_build', '') != 'wasi':
+    gc.collect()  # The WASI build can not scan roots on the wasm stack, a collection corrupts the heap
+peak0 = micropython.mem_peak() if hasattr(micropython, 'mem_peak') else 0
+a0 = gc.mem_alloc()
+t0 = time.ticks_us()
+try:
+    __import__(%r)
+    err = ''
+except Exception as e:
+    err = '%%s: %%s' %% (type(e).__name__, e)
+t1 = time.ticks_us()
+peak = micropython.mem_peak() - peak0 if hasattr(micropython, 'mem_peak') else -1
+print('%%s;%%s;%%s;%%s' %% (time.ticks_diff(t1, t0), gc.mem_alloc() - a0, peak, err))
+"""
+
+
+def read_version():
+    with open(os.path.join(HERE, 'VERSION')) as f:
+        return f.read().strip()
+
+
+def manifest_apps(apps):
+    """ Apps with a drivers.manifest, folders given without one are skipped with a note """
+    found = []
+    for app in apps:
+        if os.path.isfile(os.path.join(app, 'drivers.manifest')):
+            found.append(app)
+        else:
+            print("%s: no drivers.manifest, skipped" % app)
+    return found
+
+
+def read_manifest(app):
+    """ (module name, source path) in manifest order """
+    modules = []
+    with open(os.path.join(app, 'drivers.manifest')) as f:
+        for line in f:
+            line = line.split('#', 1)[0].strip()
+            if not line:
+                continue
+            if line.startswith('drivers/'):
+                src = os.path.join(app, line)
+            else:
+                src = os.path.join(HERE, line)
+            if not os.path.isfile(src):
+                raise SystemExit("%s: %s not found" % (app, src))
+            name = os.path.splitext(os.path.basename(line))[0]
+            modules.append((name, src))
+    return modules
+
+
+def drivers_dir(app):
+    """ Where the app imports its drivers from: drivers/ or, in the older flat apps, the app folder """
+    return 'drivers' if os.path.isdir(os.path.join(app, 'drivers')) else ''
+
+
+def app_copies(app):
+    """ (app copy, Esp-Drivers source) of the shared drivers in the manifest """
+    copies = []
+    for name, src in read_manifest(app):
+        if not src.startswith(HERE + os.sep):
+            continue  # Module of the app itself
+        copies.append((os.path.join(app, drivers_dir(app), os.path.basename(src)), src))
+    return copies
+
+
+def same_file(a, b):
+    with open(a, 'rb') as f:
+        data = f.read()
+    with open(b, 'rb') as f:
+        return data == f.read()
+
+
+def check(app, sync=False):
+    """ Number of app copies which differ from their source or are missing, copied over when sync """
+    stale = 0
+    for copy, src in app_copies(app):
+        if os.path.isfile(copy):
+            if same_file(copy, src):
+                continue
+            state = "differs from"
+        else:
+            state = "missing, source"
+        if sync:
+            shutil.copy(src, copy)
+            print("%s: %s %s, synced" % (copy, state, os.path.relpath(src)))
+        else:
+            print("%s: %s %s" % (copy, state, os.path.relpath(src)))
+            stale += 1
+    return stale
+
+
+def compile_mpy(mpy_cross, src, dst, march=None, opt=None):
+    cmd = [mpy_cross, '-o', dst, '-s', os.path.basename(src)]
+    if march:
+        cmd.append('-march=' + march)
+    if opt is not None:
+        cmd.append('-O%s' % opt)
+    cmd.append(src)
+    subprocess.run(cmd, check=True)
+
+
+def build(app, mpy_cross, march, opt):
+    version = read_version()
+    modules = read_manifest(app)
+    out = os.path.normpath(os.path.join(app, 'build', drivers_dir(app)))
+    if os.path.isdir(out):
+        shutil.rmtree(out)
+    os.makedirs(out)
+    src_total = 0
+    mpy_total = 0
+    print("%-16s %8s %8s" % ("module", "py", "mpy"))
+    for name, src in modules:
+        dst = os.path.join(out, name + '.mpy')
+        compile_mpy(mpy_cross, src, dst, march, opt)
+        src_size = os.path.getsize(src)
+        mpy_size = os.path.getsize(dst)
+        src_total += src_size
+        mpy_total += mpy_size
+        print("%-16s %8d %8d" % (name, src_size, mpy_size))
+    print("%-16s %8d %8d" % ("total", src_total, mpy_total))
+    info = os.path.join(out, 'BUILDINFO.py')
+    with open(info, 'w') as f:
+        f.write("VERSION = %r\nAPP = %r\nMODULES = %r\n" % (version, os.path.basename(os.path.normpath(app)),
+                                                          tuple(name for name, _ in modules)))
+    compile_mpy(mpy_cross, info, os.path.join(out, 'BUILDINFO.mpy'), march, opt)
+    os.remove(info)
+    print("Esp-Drivers %s, %s modules into %s" % (version, len(modules), out))
+    return modules
+
+
+def bench_one(micropython, path, name):
+    res = subprocess.run([micropython, '-c', BENCH % (path, name)], capture_output=True, text=True)
+    if res.returncode != 0 or not res.stdout.strip():
+        return None, None, None, (res.stderr.strip().splitlines() or ['failed'])[-1]
+    us, heap, peak, err = res.stdout.strip().splitlines()[-1].split(';', 3)
+    return int(us), int(heap), int(peak), err
+
+
+def bench(modules, micropython, mpy_cross, opt):
+    """ Import time (us), retained heap and peak heap (bytes), source vs .mpy, Unix port """
+    print("%-16s %9s %9s %9s | %9s %9s %9s" % ("module", "py us", "py heap", "py peak", "mpy us", "mpy heap",
+                                               "mpy peak"))
+    with tempfile.TemporaryDirectory() as tmp:
+        py_dir = os.path.join(tmp, 'py')
+        mpy_dir = os.path.join(tmp, 'mpy')
+        os.makedirs(py_dir)
+        os.makedirs(mpy_dir)
+        for name, src in modules:
+            shutil.copy(src, os.path.join(py_dir, name + '.py'))
+            compile_mpy(mpy_cross, src, os.path.join(mpy_dir, name + '.mpy'), None, opt)
+        for name, _ in modules:
+            py = bench_one(micropython, py_dir, name)
+            mpy = bench_one(micropython, mpy_dir, name)
+            if py[3] or mpy[3]:
+                print("%-16s not importable on Unix port: %s" % (name, py[3] or mpy[3]))
+                continue
+            print("%-16s %9d %9d %9d | %9d %9d %9d" % ((name,) + py[:3] + mpy[:3]))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build .mpy driver bundle from <app>/drivers.manifest")
+    parser.add_argument('apps', nargs='+', help="application folders")
+    parser.add_argument('--mpy-cross', default='mpy-cross')
+    parser.add_argument('--march', default='xtensawin', help="xtensawin for ESP32, empty for bytecode only")
+    parser.add_argument('-O', dest='opt', type=int, default=None, help="mpy-cross optimisation level")
+    parser.add_argument('--bench', action='store_true', help="import benchmark with the MicroPython Unix port")
+    parser.add_argument('--micropython', default='micropython')
+    parser.add_argument('--check', action='store_true', help="fail if an app copy in <app>/drivers/ is stale")
+    parser.add_argument('--sync', action='store_true', help="copy the sources over stale app copies")
+    args = parser.parse_args()
+    if args.check or args.sync:
+        stale = 0
+        for app in manifest_apps(args.apps):
+            stale += check(app, args.sync)
+        if stale:
+            print("%s stale app copies, run with --sync" % stale)
+            return 1
+        return 0
+    for app in args.apps:
+        modules = build(app, args.mpy_cross, args.march, args.opt)
+        if args.bench:
+            bench(modules, args.micropython, args.mpy_cross, args.opt)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,97 @@
+"""
+US EPA breakpoint vectors and NowCast cases for Tools/AQI.py. Runs on the host (CPython 3).
+
+    pm2_5     both ends of every PM2.5 row of the 2024 table, truncation to 0.1 ug/m3, the 2012 table
+    pm10      both ends of every PM10 row, truncation to 1 ug/m3
+    aqi       larger sub-index, extrapolation above the table, negative concentration
+    nowcast   hourly averages fed through add(): constant air, the 0.5 weight floor, missing hours and the
+              two of three latest hours rule
+
+    python3 Esp-Drivers/tests/aqi_vectors.py
+
+Exits with 1 if a vector gives another index.
+"""
+import sys
+
+from hostenv import Checks
+
+from AQI import AQI, NowCast
+
+PM2_5 = (
+    # ug/m3, AQI
+    (0.0, 0), (9.0, 50), (9.1, 51), (35.4, 100), (35.5, 101), (55.4, 150), (55.5, 151),
+    (125.4, 200), (125.5, 201), (225.4, 300), (225.5, 301), (325.4, 500),
+    (9.09, 50), (35.49, 100), (12.0, 56),
+)
+PM2_5_2012 = ((12.0, 50), (12.1, 51), (35.4, 100), (150.4, 200), (150.5, 201), (500.4, 500))
+PM10 = (
+    (0, 0), (54, 50), (55, 51), (154, 100), (155, 101), (254, 150), (255, 151),
+    (354, 200), (355, 201), (424, 300), (425, 301), (604, 500),
+    (54.9, 50), (154.99, 100),
+)
+AQI_CASES = (
+    # PM2.5, PM10, AQI
+    (12.0, 155, 101),
+    (55.5, 20, 151),
+    (9.0, 54, 50),
+    (0.0, 0, 0),
+)
+NOWCAST = (
+    # hourly averages, newest first, None = hour without readings; NowCast ug/m3 or None
+    ("constant air", [20.0] * 12, 20.0),
+    ("weight floor 0.5, min / max 0.11", [13, 16, 10, 21, 74, 64, 53, 82, 90, 75, 80, 50], 17.41),
+    ("weight floor 0.5, two hours", [10, 40], 20.0),
+    ("weight 0.75, four hours", [12, 14, 15, 16], 13.78),
+    ("weight 0.2 floored, rising air", [50, 40, 30, 20, 10], 41.61),
+    ("middle hour missing", [30, None, 20], 26.92),
+    ("oldest of three missing", [30, 20, None, 10], 25.38),
+    ("two of the three latest missing", [30, None, None, 20], None),
+    ("one hour", [30], None),
+)
+
+
+def nowcast(hours):
+    """ Feeds hours (newest first) through add(), three readings an hour, value when the next hour starts """
+    nc = NowCast()
+    for i, c in enumerate(reversed(hours)):
+        if c is not None:
+            for minute, d in ((5, -1), (25, 0), (45, 1)):
+                nc.add(c + d, now=i * 3600 + minute * 60)
+    return nc.add(0, now=len(hours) * 3600)
+
+
+def main():
+    checks = Checks()
+    expect = checks.expect
+
+    print("pm2_5: 2024 table")
+    for c, index in PM2_5:
+        expect(AQI.PM2_5(c) == index, "PM2.5 %s is %s, not %s" % (c, index, AQI.PM2_5(c)))
+    print("pm2_5: 2012 table")
+    for c, index in PM2_5_2012:
+        got = AQI.PM2_5(c, AQI._PM2_5_2012)
+        expect(got == index, "PM2.5 %s is %s in the 2012 table, not %s" % (c, index, got))
+    print("pm10")
+    for c, index in PM10:
+        expect(AQI.PM10_0(c) == index, "PM10 %s is %s, not %s" % (c, index, AQI.PM10_0(c)))
+    print("aqi")
+    for pm2_5, pm10, index in AQI_CASES:
+        got = AQI.aqi(pm2_5, pm10)
+        expect(got == index, "PM2.5 %s, PM10 %s is %s, not %s" % (pm2_5, pm10, index, got))
+    expect(AQI.PM2_5(400) > 500 and AQI.PM10_0(700) > 500, "above the table the last row is extrapolated")
+    expect(AQI.PM2_5(-5) is None and AQI.PM10_0(-5) is None, "negative concentration has no index")
+
+    print("nowcast")
+    expect(NowCast().add(10, now=0) is None, "no NowCast before the first complete hour")
+    for what, hours, value in NOWCAST:
+        got = nowcast(hours)
+        print("   %-36s %s" % (what, got if got is None else round(got, 2)))
+        if value is None:
+            expect(got is None, "%s: no NowCast" % what)
+        else:
+            expect(got is not None and abs(got - value) < 0.01, "%s: NowCast %s" % (what, value))
+    return checks.result()
+
+
+if __name__ == '__main__':
+    sys.exit(main())
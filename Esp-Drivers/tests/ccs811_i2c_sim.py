@@ -0,0 +1,196 @@
+"""
+Simulated CCS811 register model on I2C for Sensors/CCS811_AS.py. Runs on the host (CPython 3).
+
+The simulated sensor measures every drive mode interval, sets data ready (STATUS bit 3) and pulls nINT low if
+MEAS_MODE bit 3 is set. Reading ALG_RESULT_DATA clears data ready and releases nINT. Scenarios:
+
+    irq        nINT connected, every result is read on the falling edge, STATUS is not polled
+    poll       no nINT, STATUS is polled once per interval, an error flag is counted and not read as a result
+    env        ENV_DATA encoding (40 %, 21 C is 50 00 5c 00) and the deadband
+    baseline   warm-up from ticks_ms() also when NTP steps the clock, saved baseline restored after a reboot,
+               a corrupted baseline file is ignored
+
+    python3 Esp-Drivers/tests/ccs811_i2c_sim.py
+
+Exits with 1 if a scenario does not behave as expected.
+"""
+import asyncio
+import os
+import struct
+import sys
+import tempfile
+
+import hostenv
+from hostenv import loop, Pin, Checks
+
+import CCS811_AS
+
+MINUTE = 60
+
+
+class Bus(object):
+    """ I2C with a CCS811 at 0x5A, results are eCO2 400 + 10 * n and TVOC n for measurement n """
+
+    def __init__(self, nint=None):
+        self.nint = nint
+        self.mode = 0
+        self.app = False
+        self.ready = False
+        self.error_id = 0
+        self.n = 0
+        self.baseline = b'\x00\x00'
+        self.env = None
+        self.transfers = 0
+        self.task = None
+
+    def scan(self):
+        return [0x5A]
+
+    def status(self):
+        return 0x10 | (0x80 if self.app else 0) | (0x08 if self.ready else 0) | (0x01 if self.error_id else 0)
+
+    def readfrom_mem(self, addr, reg, n):
+        self.transfers += 1
+        if reg == CCS811_AS.REG_HW_ID:
+            return bytes((CCS811_AS.HW_ID,))
+        if reg == CCS811_AS.REG_STATUS:
+            return bytes((self.status(),))
+        if reg == CCS811_AS.REG_BASELINE:
+            return self.baseline
+        raise OSError(19)
+
+    def readfrom_mem_into(self, addr, reg, buf):
+        self.transfers += 1
+        if reg == CCS811_AS.REG_STATUS:
+            buf[0] = self.status()
+        elif reg == CCS811_AS.REG_ALG_RESULT:
+            struct.pack_into('>HHBB', buf, 0, 400 + 10 * self.n, self.n, self.status(), self.error_id)
+            self.ready = False
+            self.error_id = 0
+        else:
+            raise OSError(19)
+
+    def writeto(self, addr, data):
+        self.transfers += 1
+        if data[0] == CCS811_AS.REG_APP_START:
+            self.app = True
+
+    def writeto_mem(self, addr, reg, data):
+        self.transfers += 1
+        if reg == CCS811_AS.REG_MEAS_MODE:
+            self.mode = data[0]
+            if self.task is not None:
+                self.task.cancel()
+            self.task = loop.create_task(self.measure())
+        elif reg == CCS811_AS.REG_ENV_DATA:
+            self.env = bytes(data)
+        elif reg == CCS811_AS.REG_BASELINE:
+            self.baseline = bytes(data)
+
+    async def measure(self):
+        while True:
+            await asyncio.sleep(CCS811_AS.MODE_MS[self.mode >> 4 & 0x07] / 1000)
+            self.n += 1
+            fall = not self.ready and self.mode & 0x08
+            self.ready = True
+            if fall and self.nint is not None:
+                self.nint.fall()
+
+
+def correct(ccs, bus):
+    return ccs.eCO2 == 400 + 10 * bus.n and ccs.tVOC == bus.n
+
+
+async def reads(ccs, bus, count):
+    """ Number of correct results of count reads """
+    ok = 0
+    for _ in range(count):
+        if await ccs.read() and correct(ccs, bus):
+            ok += 1
+    return ok
+
+
+async def scenarios():
+    checks = Checks()
+    expect = checks.expect
+
+    print("irq: nINT connected, mode 1")
+    pin = Pin(19)
+    bus = Bus(pin)
+    ccs = CCS811_AS.CCS811(bus, int_pin=pin)
+    start = bus.transfers
+    ok = await reads(ccs, bus, 10)
+    print("   %s" % ccs.stats())
+    expect(bus.mode == 0x18, "MEAS_MODE is mode 1 with the interrupt enabled")
+    expect(ok == 10 and ccs.irqs == 10 and ccs.polls == 0, "every result comes from the IRQ")
+    expect(bus.transfers - start == 10, "one I2C transfer per result")
+    expect(not bus.ready and not ccs._fetch(), "ALG_RESULT read clears data ready")
+    bus.task.cancel()
+
+    print("poll: no nINT, an error in the middle")
+    bus = Bus()
+    ccs = CCS811_AS.CCS811(bus)
+    ok = await reads(ccs, bus, 5)
+    bus.error_id = 0x02  # READ_REG_INVALID
+    failed = not await ccs.read()
+    ok += await reads(ccs, bus, 5)
+    print("   %s" % ccs.stats())
+    expect(bus.mode == 0x10, "MEAS_MODE is mode 1 without the interrupt")
+    expect(ok == 10 and ccs.polls >= 11, "results are found by polling STATUS")
+    expect(failed and ccs.errors == 1 and ccs.error_id == 0x02, "error flag is counted, not read as a result")
+    bus.task.cancel()
+
+    print("env: encoding and deadband")
+    bus = Bus()
+    ccs = CCS811_AS.CCS811(bus)
+    written = ccs.put_envdata(humidity=40, temp=21)
+    expect(written and bus.env == bytes((0x50, 0x00, 0x5c, 0x00)), "40 %, 21 C is written as 50 00 5c 00")
+    expect(not ccs.put_envdata(humidity=41.5, temp=21.4), "change within the deadband is not written")
+    expect(ccs.put_envdata(humidity=40, temp=21.5), "0.5 C change is written")
+    expect(ccs.put_envdata(humidity=42, temp=21.5), "2 % RH change is written")
+    expect(not ccs.put_envdata(humidity=101, temp=21) and not ccs.put_envdata(humidity=40, temp=-30),
+           "values out of range are not written")
+    print("   %s, last %s" % (ccs.stats(), bus.env.hex()))
+    expect(ccs.env_writes == 3 and ccs.env_skipped == 1, "writes and skips are counted")
+    bus.task.cancel()
+
+    print("baseline: save, reboot, NTP step during the warm-up and restore")
+    path = os.path.join(tempfile.mkdtemp(), 'ccs811.bin')
+    bus = Bus()
+    ccs = CCS811_AS.CCS811(bus, baseline_path=path, baseline_ival=3600)
+    task = loop.create_task(ccs.baseline_loop())
+    bus.baseline = b'\x12\x34'
+    await asyncio.sleep(89 * MINUTE)
+    task.cancel()
+    print("   %s" % ccs.stats())
+    expect(ccs.baseline_saves == 1 and ccs.load_baseline() == b'\x12\x34', "baseline is saved and loads back")
+    bus.task.cancel()
+
+    bus = Bus()  # Power on, the sensor starts from its default baseline
+    ccs = CCS811_AS.CCS811(bus, baseline_path=path, baseline_ival=3600)
+    await asyncio.sleep(1)
+    hostenv.step_clock(3600)  # RTC set from NTP between the driver start and baseline_loop()
+    task = loop.create_task(ccs.baseline_loop())
+    await asyncio.sleep(19 * MINUTE)
+    expect(bus.baseline == b'\x00\x00', "baseline is not written during the warm-up, NTP step does not end it")
+    await asyncio.sleep(2 * MINUTE)
+    task.cancel()
+    print("   %s" % ccs.stats())
+    expect(ccs.baseline_restored and bus.baseline == b'\x12\x34', "saved baseline is written after the warm-up")
+    bus.task.cancel()
+
+    with open(path, 'r+b') as f:
+        f.seek(4)
+        f.write(b'\x56')
+    expect(ccs.load_baseline() is None, "corrupted baseline file is ignored")
+    os.remove(path)
+    expect(ccs.load_baseline() is None, "missing baseline file is ignored")
+    return checks
+
+
+def main():
+    return loop.run_until_complete(scenarios()).result()
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,87 @@
+"""
+Captured DHT22 (AM2302) frames through Sensors/DHT22_AS.py. Runs on the host (CPython 3).
+
+    decode    the captured frames of the driver docstring, two's complement and sign and magnitude negatives,
+              rejection of a bad checksum and of RH over 100 %
+    read      read() with a stand-in dht_readinto: 2 s minimum interval, timeouts and frame errors counted,
+              values invalid after a failed read
+
+    python3 Esp-Drivers/tests/dht22_frames.py
+
+Exits with 1 if a frame does not decode as expected.
+"""
+import sys
+from array import array
+
+from hostenv import loop, machine, Checks
+
+FRAMES = (
+    # frame, C, % RH
+    ('03 72 ff fd 71', -0.3, 88.2),
+    ('02 8c 80 65 73', -10.1, 65.2),
+    ('01 e6 00 df c6', 22.3, 48.6),
+)
+REJECTED = (
+    ('01 e6 00 df c7', "bad checksum"),
+    ('03 e9 00 df cb', "RH 100.1 %"),
+)
+
+
+class Line(object):
+    """ dht_readinto stand-in, returns queued frames, None in the queue is a timeout """
+
+    def __init__(self):
+        self.queue = []
+        self.calls = []
+
+    def __call__(self, pin, buf):
+        self.calls.append(loop.time())
+        data = self.queue.pop(0)
+        if data is None:
+            raise OSError(110)
+        buf[:] = bytes.fromhex(data)
+
+
+line = Line()
+machine.dht_readinto = line
+
+import DHT22_AS  # noqa: E402
+
+
+async def scenarios():
+    checks = Checks()
+    expect = checks.expect
+
+    print("decode: captured frames")
+    values = array('h', (0, 0))
+    for data, temp, humid in FRAMES:
+        ok = DHT22_AS.decode(bytes.fromhex(data), values)
+        print("   %s -> %s C, %s %%" % (data, values[DHT22_AS.TEMP] / 10, values[DHT22_AS.HUMID] / 10))
+        expect(ok and values[DHT22_AS.TEMP] == round(temp * 10) and values[DHT22_AS.HUMID] == round(humid * 10),
+               "%s decodes to %s C, %s %%" % (data, temp, humid))
+    for data, why in REJECTED:
+        values[:] = array('h', (1, 2))
+        ok = DHT22_AS.decode(bytes.fromhex(data), values)
+        expect(not ok and list(values) == [1, 2], "%s (%s) is rejected, values untouched" % (data, why))
+
+    print("read: interval, timeouts and frame errors")
+    sensor = DHT22_AS.DHT22(None, interval=1)
+    line.queue = [FRAMES[0][0], None, REJECTED[0][0], FRAMES[2][0]]
+    results = []
+    for _ in range(4):
+        results.append((await sensor.read(), sensor.temperature, sensor.humidity))
+    print("   %s" % results)
+    expect(results == [(True, -0.3, 88.2), (False, None, None), (False, None, None), (True, 22.3, 48.6)],
+           "values follow the frames, None after a failed read")
+    expect(sensor.reads == 4 and sensor.timeouts == 1 and sensor.frame_errors == 1, "failures are counted")
+    gaps = [b - a for a, b in zip([0] + line.calls, line.calls)]
+    expect(min(gaps) >= 2, "sensor is read at most every 2 s, also after power on")
+    return checks
+
+
+def main():
+    return loop.run_until_complete(scenarios()).result()
+
+
+if __name__ == '__main__':
+    sys.exit(main())
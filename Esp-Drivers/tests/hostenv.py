@@ -0,0 +1,208 @@
+"""
+Host stand-ins for machine, utime and uasyncio, shared by the tests in this folder. Runs on the host (CPython 3).
+
+Time is virtual: the event loop jumps to the next timer instead of sleeping, so minutes of sensor time take
+milliseconds and every run gives the same numbers. Importing hostenv installs the stand-ins, drivers in
+Esp-Drivers/Sensors and Tools can be imported after it:
+
+    from hostenv import loop, machine, Checks
+    machine.dht_readinto = fake_readinto      # or machine.UART = a SimUART subclass
+    import DHT22_AS
+
+utime.time() is loop time plus clock_step, step_clock() moves it like an NTP correction while ticks_ms() keeps
+running steadily.
+"""
+import asyncio
+import os
+import random
+import sys
+import types
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+for category in ('Tools', 'Sensors'):
+    sys.path.insert(0, os.path.join(os.path.dirname(HERE), category))
+
+
+class VirtualClockLoop(asyncio.SelectorEventLoop):
+    """ Event loop whose clock advances to the next timer when there is nothing to run """
+
+    def __init__(self):
+        super().__init__()
+        self.now = 0.0
+        real = self._selector
+        loop = self
+
+        class Selector(object):
+            def select(self, timeout=None):
+                if timeout is None:
+                    raise RuntimeError("deadlock, nothing scheduled")
+                loop.now += timeout
+                return real.select(0)
+
+            def __getattr__(self, name):
+                return getattr(real, name)
+
+        self._selector = Selector()
+
+    def time(self):
+        return self.now
+
+
+loop = VirtualClockLoop()
+asyncio.set_event_loop(loop)
+clock_step = 0
+
+
+def step_clock(seconds):
+    """ Wall clock jump, as when NTP sets the RTC """
+    global clock_step
+    clock_step += seconds
+
+
+class SimUART(object):
+    """ Sensor end of the line, subclasses answer the driver in tx() and reply with send() """
+    noise = 0.0  # Share of transfers with garbage in front, truncated or dropped
+    delay = 0.0  # Answer latency, seconds
+
+    def __init__(self, *args, **kwargs):
+        self.inbuf = bytearray()
+        self.event = asyncio.Event()
+
+    def any(self):
+        return len(self.inbuf)
+
+    def read(self, n=None):
+        data = bytes(self.inbuf)
+        self.inbuf = bytearray()
+        return data
+
+    def send(self, data):
+        if self.delay:
+            loop.call_later(self.delay, self._rx, data)
+        else:
+            self._rx(data)
+
+    def _rx(self, data):
+        if random.random() < self.noise:
+            data = bytes([random.randrange(256)]) * random.randrange(1, 6) + data
+        if random.random() < self.noise:
+            data = data[:random.randrange(len(data))]
+        if random.random() < self.noise / 2:
+            return
+        self.inbuf += data
+        self.event.set()
+
+    def tx(self, data):
+        raise NotImplementedError
+
+
+class StreamReader(object):
+
+    def __init__(self, uart):
+        self.uart = uart
+
+    async def read(self, n):
+        while not self.uart.inbuf:
+            self.uart.event.clear()
+            await self.uart.event.wait()
+        data = bytes(self.uart.inbuf[:n])
+        del self.uart.inbuf[:n]
+        return data
+
+
+class StreamWriter(object):
+
+    def __init__(self, uart, extra):
+        self.uart = uart
+
+    def write(self, data):
+        self.uart.tx(data)
+
+    async def drain(self):
+        pass
+
+
+async def wait_for_ms(aw, timeout_ms):
+    return await asyncio.wait_for(aw, timeout_ms / 1000)
+
+
+async def sleep_ms(ms):
+    await asyncio.sleep(ms / 1000)
+
+
+class ThreadSafeFlag(object):
+
+    def __init__(self):
+        self.event = asyncio.Event()
+
+    def set(self):
+        self.event.set()
+
+    def clear(self):
+        self.event.clear()
+
+    async def wait(self):
+        await self.event.wait()
+        self.event.clear()
+
+
+class Pin(object):
+    """ Input pin, fall() calls the IRQ handler as a falling edge would """
+    IN = 1
+    OUT = 3
+    PULL_UP = 2
+    IRQ_FALLING = 2
+    IRQ_RISING = 1
+
+    def __init__(self, id=None, *args, **kwargs):
+        self.id = id
+        self.handler = None
+
+    def init(self, *args, **kwargs):
+        pass
+
+    def irq(self, trigger=None, handler=None):
+        self.handler = handler
+
+    def fall(self):
+        if self.handler is not None:
+            self.handler(self)
+
+
+def not_wired(*args, **kwargs):
+    raise OSError("not simulated")
+
+
+machine = types.ModuleType('machine')
+machine.Pin = Pin
+machine.UART = SimUART
+machine.dht_readinto = not_wired
+utime = types.ModuleType('utime')
+utime.ticks_ms = lambda: int(loop.time() * 1000)
+utime.ticks_diff = lambda a, b: a - b
+utime.time = lambda: int(loop.time()) + clock_step
+uasyncio = types.ModuleType('uasyncio')
+uasyncio.__dict__.update((k, v) for k, v in asyncio.__dict__.items() if not k.startswith('__'))
+uasyncio.StreamReader = StreamReader
+uasyncio.StreamWriter = StreamWriter
+uasyncio.wait_for_ms = wait_for_ms
+uasyncio.sleep_ms = sleep_ms
+uasyncio.ThreadSafeFlag = ThreadSafeFlag
+sys.modules.update(machine=machine, utime=utime, uasyncio=uasyncio)
+
+
+class Checks(object):
+    """ Failed expectations of a test run """
+
+    def __init__(self):
+        self.failed = []
+
+    def expect(self, ok, what):
+        if not ok:
+            self.failed.append(what)
+            print("   FAILED: %s" % what)
+
+    def result(self):
+        """ Exit status, 1 if anything failed """
+        print("%s failed" % len(self.failed) if self.failed else "all scenarios passed")
+        return 1 if self.failed else 0
@@ -0,0 +1,179 @@
+"""
+Simulated MH-Z19B on the UART for Sensors/MHZ19B_AS.py. Runs on the host (CPython 3).
+
+The simulated sensor answers read commands (ff 01 86 ...) with ff 86 co2_hi co2_lo ... crc about 10 ms later and
+takes the other commands without a reply. Scenarios:
+
+    mangled   one reply at a time is damaged: garbage, stray 0xFF or the tail of a lost reply in front (resync),
+              checksum error, truncated or dropped (timeout). Each is followed by a clean read
+    stale     a late reply left in the input is flushed, not read as the answer
+    commands  ABC and range frames on the wire, value over measuring_range is a range error
+    loop      first reading right after preheat_time, then every read_interval, rolling average
+    random    200 reads with 30 % of the replies getting garbage in front, truncated or dropped
+
+    python3 Esp-Drivers/tests/mhz19_uart_sim.py
+
+Exits with 1 if a scenario does not behave as expected.
+"""
+import asyncio
+import random
+import sys
+
+import hostenv
+from hostenv import loop, Checks
+
+
+def crc(b):
+    return ((~(sum(b[1:8]) & 0xff) & 0xff) + 1) & 0xff
+
+
+def reply(co2):
+    """ Read reply, temperature byte 0x47 (31 C) """
+    f = bytearray((0xFF, 0x86, co2 >> 8, co2 & 0xff, 0x47, 0, 0, 0, 0))
+    f[8] = crc(f)
+    return bytes(f)
+
+
+class UART(hostenv.SimUART):
+    """ MH-Z19B end of the line """
+    delay = 0.01  # 9 bytes at 9600 baud
+
+    def __init__(self, *args, **kwargs):
+        super().__init__()
+        self.co2 = 400
+        self.commands = []
+        self.mangle = None  # Damages the next reply
+
+    def tx(self, cmd):
+        cmd = bytes(cmd)
+        assert cmd[:2] == b'\xff\x01' and len(cmd) == 9 and crc(cmd) == cmd[8], "command frame"
+        self.commands.append(cmd)
+        if cmd[2] == 0x86:
+            data = reply(self.co2)
+            if self.mangle is not None:
+                data = self.mangle(data)
+                self.mangle = None
+            if data:
+                self.send(data)
+
+
+hostenv.machine.UART = UART
+
+import MHZ19B_AS  # noqa: E402
+
+MANGLED = (
+    # what, reply on the wire, reading expected
+    ("garbage in front", lambda r: b'\x12\x34\x00' + r, True),
+    ("stray 0xFF in front", lambda r: b'\xff' + r, True),
+    ("two stray 0xFF in front", lambda r: b'\xff\xff' + r, True),
+    ("tail of a lost reply in front", lambda r: r[:4] + r, True),
+    ("checksum error", lambda r: r[:8] + bytes(((r[8] + 1) & 0xff,)), False),
+    ("wrong command byte", lambda r: r[:1] + b'\x87' + r[2:], False),
+    ("truncated", lambda r: r[:5], False),
+    ("dropped", lambda r: b'', False),
+)
+
+
+def counters(co2):
+    return co2.crc_errors, co2.sync_drops, co2.timeouts
+
+
+async def timed_read(co2):
+    """ read_co2() result and the time it took """
+    start = loop.time()
+    value = await co2.read_co2()
+    return value, loop.time() - start
+
+
+async def scenarios():
+    checks = Checks()
+    expect = checks.expect
+
+    print("mangled: one damaged reply, then a clean read")
+    co2 = MHZ19B_AS.MHZ19bCO2(uart=2, rxpin=25, txpin=27)
+    uart = co2.sensor
+    for i, (what, mangle, ok) in enumerate(MANGLED):
+        uart.co2 = 500 + i
+        uart.mangle = mangle
+        before = counters(co2)
+        value, took = await timed_read(co2)
+        after = counters(co2)
+        print("   %-30s %s in %.2f s, crc errors +%s, sync drops +%s, timeouts +%s" %
+              ((what, value, took) + tuple(a - b for a, b in zip(after, before))))
+        expect(value == (uart.co2 if ok else None), "%s: reading is %s" % (what, "correct" if ok else "None"))
+        expect(took <= co2.timeout_ms / 1000, "%s: answer within timeout_ms" % what)
+        expect(ok or after[2] == before[2] + 1, "%s: counted as a timeout" % what)
+        uart.co2 = 600 + i
+        expect(await co2.read_co2() == uart.co2, "%s: next read is clean" % what)
+    expect(co2.crc_errors >= 4 and co2.sync_drops > 0, "resyncs show up as crc errors and sync drops")
+
+    print("stale: late reply in the input")
+    uart.co2 = 700
+    uart.inbuf += reply(999)
+    drops = co2.sync_drops
+    expect(await co2.read_co2() == 700 and co2.sync_drops == drops + 9, "stale input is flushed and counted")
+
+    print("commands: ABC off, range 2000, reading over the range")
+    await co2.set_abc(False)
+    await co2.set_range(2000)
+    print("   %s" % ' '.join(c.hex() for c in uart.commands[-2:]))
+    expect(uart.commands[-2][2:4] == b'\x79\x00' and co2.abc is False, "ABC off is 79 00")
+    expect(uart.commands[-1][2:8] == b'\x99\x00\x00\x00\x07\xd0', "range 2000 is 99 00 00 00 07 d0")
+    uart.co2 = 2100
+    errors = co2.range_errors
+    expect(await co2.read_co2() is None and co2.range_errors == errors + 1 and co2.co2_value is None,
+           "reading over measuring_range is a range error")
+    try:
+        await co2.set_range(3000)
+        expect(False, "unsupported range is refused")
+    except ValueError:
+        pass
+
+    print("loop: preheat 180 s, read_interval 5 s, average over 20 s")
+    co2 = MHZ19B_AS.MHZ19bCO2(read_interval=5, average_time=20, preheat_time=180)
+    values = []
+    co2.on_sample = lambda sensor: values.append((round(loop.time() - start), sensor.co2_value))
+    start = loop.time()
+    co2.sensor.co2 = 800
+    task = loop.create_task(co2.read_co2_loop())
+    await asyncio.sleep(179)
+    expect(not values, "no reading during preheat")
+    for ppm in (800, 820, 840, 860, 880, 900):
+        co2.sensor.co2 = ppm
+        await asyncio.sleep(5)
+    task.cancel()
+    print("   %s, average %s" % (values, co2.co2_average))
+    expect([t for t, _ in values] == [180, 185, 190, 195, 200, 205], "first reading after preheat, then every 5 s")
+    expect(co2.co2_average == (840 + 860 + 880 + 900) / 4, "average of the last 4 readings")
+
+    print("random: 200 reads, 30 % garbage, truncated and dropped replies")
+    random.seed(1)
+    UART.noise = 0.3
+    co2 = MHZ19B_AS.MHZ19bCO2()
+    uart = co2.sensor
+    correct = wrong = 0
+    longest = 0
+    for _ in range(200):
+        uart.co2 = random.randrange(400, 5000)
+        value, took = await timed_read(co2)
+        longest = max(longest, took)
+        if value == uart.co2:
+            correct += 1
+        elif value is not None:
+            wrong += 1
+    UART.noise = 0.0
+    print("   %s correct, %s wrong, longest %.2f s: %s" % (correct, wrong, longest, co2.stats()))
+    expect(wrong == 0, "no wrong readings")
+    expect(correct > 100, "most replies get through")
+    expect(co2.crc_errors > 0 and co2.sync_drops > 0 and co2.timeouts > 0,
+           "losses show up as crc errors, sync drops and timeouts")
+    expect(longest <= co2.timeout_ms / 1000, "no read waits over timeout_ms")
+    return checks
+
+
+def main():
+    return loop.run_until_complete(scenarios()).result()
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,168 @@
+"""
+Simulated Plantower sensor on the UART for Sensors/PMS9103M_AS.py and PMS7003_AS.py. Runs on the host (CPython 3).
+
+machine, utime and uasyncio are replaced by the stand-ins of hostenv.py, time is virtual: the event loop jumps to
+the next timer instead of sleeping, so 40 minutes of sensor time take under a second and every run gives the same
+numbers.
+
+The simulated sensor sends a frame every second in active mode, answers passive reads and acknowledges mode
+commands (42 4d 00 04 ...). Sleep stops the fan, the laser and the frames. Scenarios:
+
+    duty      passive mode duty cycling, 25 minutes of stable air then a PM jump
+    active    active mode for the same 40 minutes, for comparison of on-time and UART traffic
+    noisy     30 % of the transfers get garbage in front, are truncated or dropped
+    slow      sensor answers 200 ms late with warmup=0, acknowledgements arrive in front of the frames
+    resync    known garbage in front of a frame, every dropped byte is counted once in sync_drops
+
+    python3 Esp-Drivers/tests/pms_uart_sim.py
+
+Exits with 1 if a scenario does not behave as expected.
+"""
+import asyncio
+import random
+import sys
+
+import hostenv
+from hostenv import loop, Checks
+
+MINUTE = 60
+
+
+def frame(pm):
+    """ Data frame, field i is pm + i """
+    f = bytearray(32)
+    f[0] = 0x42
+    f[1] = 0x4d
+    f[3] = 28
+    for i in range(12):
+        f[4 + 2 * i] = (pm + i) >> 8
+        f[5 + 2 * i] = (pm + i) & 0xff
+    f[28] = 0x97  # Version
+    total = sum(f[:30])
+    f[30] = total >> 8
+    f[31] = total & 0xff
+    return bytes(f)
+
+
+class UART(hostenv.SimUART):
+    """ Plantower end of the line """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__()
+        self.awake = True
+        self.active = True  # Power on default
+        self.pm = 10
+        loop.create_task(self.active_tx())
+
+    async def active_tx(self):
+        while True:
+            await asyncio.sleep(1)
+            if self.awake and self.active:
+                self._rx(frame(self.pm))
+
+    def tx(self, cmd):
+        cmd = bytes(cmd)
+        assert sum(cmd[:5]) == cmd[5] << 8 | cmd[6], "command checksum"
+        if cmd[2] == 0xe4:
+            self.awake = bool(cmd[4])
+        elif not self.awake:
+            return
+        elif cmd[2] == 0xe1:
+            self.active = bool(cmd[4])
+            self.send(bytes([0x42, 0x4d, 0x00, 0x04, 0xe1, cmd[4], 0x01, 0x74 + cmd[4]]))
+        elif cmd[2] == 0xe2 and not self.active:
+            self.send(frame(self.pm))
+
+
+hostenv.machine.UART = UART
+
+import PMS9103M_AS  # noqa: E402
+import PMS7003_AS  # noqa: E402
+
+
+class Samples(object):
+    """ on_sample recorder, counts readings which differ from what the sensor measured """
+
+    def __init__(self, sensor):
+        self.count = 0
+        self.wrong = 0
+        sensor.on_sample = self
+
+    def __call__(self, sensor):
+        self.count += 1
+        d = sensor.pms_dictionary
+        if d['PM2_5'] != sensor.sensor.pm + 1 or d['PM2_5_ATM'] != sensor.sensor.pm + 4 or d['VERSION'] != 0x97:
+            self.wrong += 1
+
+
+async def run(sensor, minutes, jump=None):
+    """ Periods seen at each minute, recorded samples and duty cycle, PM steps from 10 to 40 at minute jump """
+    samples = Samples(sensor)
+    if sensor.duty:
+        await sensor.init()
+    task = loop.create_task(sensor.read_async_loop())
+    periods = []
+    for minute in range(minutes):
+        if minute == jump:
+            sensor.sensor.pm = 40
+        await asyncio.sleep(MINUTE)
+        periods.append(sensor.period)
+    task.cancel()
+    print("   %s samples, %s wrong: %s" % (samples.count, samples.wrong, sensor.stats()))
+    return periods, samples, sensor.duty_cycle()
+
+
+async def scenarios():
+    checks = Checks()
+    expect = checks.expect
+
+    random.seed(2)
+    print("duty: passive mode, stable air for 25 minutes, then PM2.5 10 -> 40")
+    duty = PMS9103M_AS.PMS(duty=True, min_period=60, max_period=600)
+    periods, samples, duty_cycle = await run(duty, 40, jump=25)
+    print("   period each minute %s" % periods)
+    expect(600 in periods[:25], "stable air backs the period off to max_period")
+    expect(60 in periods[25:], "PM jump drops the period to min_period")
+    expect(samples.wrong == 0 and duty.pms_dictionary['PM2_5_ATM'] == 44, "readings are correct")
+    expect(duty_cycle < 0.2, "fan and laser are off most of the time")
+
+    print("active: default mode for the same time")
+    active = PMS9103M_AS.PMS()
+    _, samples, active_cycle = await run(active, 40)
+    expect(samples.wrong == 0, "readings are correct")
+    expect(active_cycle == 1.0, "active mode is always on")
+    print("   duty cycle %.2f vs %.2f, UART rx %.1f KB vs %.1f KB" %
+          (duty_cycle, active_cycle, duty.rx_bytes / 1024, active.rx_bytes / 1024))
+    expect(duty.rx_bytes * 20 < active.rx_bytes, "duty cycling reads a fraction of the UART traffic")
+
+    print("noisy: 30 % garbage, truncated and dropped transfers, PMS7003 defaults")
+    UART.noise = 0.3
+    noisy = PMS7003_AS.PSensorPMS7003(duty=True, min_period=60, max_period=60)
+    _, samples, _ = await run(noisy, 20)
+    UART.noise = 0.0
+    expect(samples.count > 0 and samples.wrong == 0, "every published reading is correct")
+    expect(noisy.sync_drops > 0 and noisy.timeouts > 0, "losses show up as sync drops and timeouts")
+
+    print("slow: 200 ms answers, warmup=0, acknowledgements in front of the frames")
+    UART.delay = 0.2
+    slow = PMS9103M_AS.PMS(duty=True, min_period=60, max_period=120, warmup=0)
+    _, samples, _ = await run(slow, 10)
+    UART.delay = 0.0
+    expect(samples.count > 0 and samples.wrong == 0, "every published reading is correct")
+    expect(slow.acks > 0 and slow.checksum_errors == 0, "acknowledgements are skipped, not parsed as frames")
+
+    print("resync: 42 00 42 42 13 4d 42 in front of a frame")
+    sensor = PMS9103M_AS.PMS(duty=True)
+    sensor.sensor.inbuf += bytes((0x42, 0x00, 0x42, 0x42, 0x13, 0x4d, 0x42)) + frame(20)
+    ok = await sensor._read_frame()
+    expect(ok, "frame after the garbage is read")
+    expect(sensor.buf[4:6] == bytes((0, 20)) and sensor.sync_drops == 7, "7 bytes dropped, 7 counted")
+    return checks
+
+
+def main():
+    return loop.run_until_complete(scenarios()).result()
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,97 @@
+"""
+ROM-to-role index of DS18B20 sensors, kept as a compact binary file on flash.
+
+Roles are the sensor positions of the application (S1 ... S5). A configured ROM address keeps its role, roles
+without an address get discovered sensors in ROM order. At first boot, or after the configured addresses or
+resolutions change, the bus is scanned once and the index is written to /dsindex.bin. Later boots load the index
+and skip the OneWire search, the first bus cycle shows which sensors answer.
+
+A missing sensor keeps its role and reads None until it answers again, the node starts with the sensors it has.
+Sensors plugged in later for roles without a ROM are picked up with discover() after a new scan.
+
+    idx = DSIndex((s1_addr, s2_addr, b'', b'', b''), (12, 12, 12, 12, 12))
+    if not idx.loaded:
+        idx.discover(bus.scan())      # saves the index
+    idx.roms                          # ROM per role, None if the role has no sensor
+    idx.extras                        # found sensors without a role
+    print(idx.loaded, idx.load_us)
+
+File: header (magic, configuration crc32, roles, extras), 8 byte ROM per role (zeros if none), 8 byte ROM per
+extra sensor and crc32 of all preceding bytes.
+"""
+import struct
+from utime import ticks_us, ticks_diff
+try:
+    from binascii import crc32
+except ImportError:
+    from ubinascii import crc32
+
+MAGIC = b'DSX1'
+HEADER = '<4sIBB'  # magic, configuration crc, number of roles, number of extra ROMs
+HDR_LEN = 10
+NO_ROM = bytes(8)
+
+
+class DSIndex(object):
+
+    def __init__(self, roles, resolutions, path='/dsindex.bin'):
+        start = ticks_us()
+        self.path = path
+        self.conf = tuple(bytes(rom) if rom else None for rom in roles)
+        self.sig = crc32(b''.join(rom or NO_ROM for rom in self.conf) + bytes(resolutions)) & 0xffffffff
+        self.roms = list(self.conf)
+        self.extras = []
+        self.loaded = self._load()
+        self.load_us = ticks_diff(ticks_us(), start)
+
+    def _load(self):
+        try:
+            with open(self.path, 'rb') as f:
+                blob = f.read()
+        except OSError:
+            return False
+        if len(blob) < HDR_LEN + 4:
+            return False
+        magic, sig, roles, extras = struct.unpack_from(HEADER, blob, 0)
+        end = HDR_LEN + 8 * (roles + extras)
+        if magic != MAGIC or sig != self.sig or roles != len(self.conf) or len(blob) != end + 4:
+            return False
+        if struct.unpack_from('<I', blob, end)[0] != crc32(blob[:end]) & 0xffffffff:
+            return False
+        pos = HDR_LEN
+        for i in range(roles):
+            rom = blob[pos:pos + 8]
+            self.roms[i] = None if rom == NO_ROM else rom
+            pos += 8
+        self.extras = [blob[pos + 8 * j:pos + 8 * j + 8] for j in range(extras)]
+        return True
+
+    def save(self):
+        blob = (struct.pack(HEADER, MAGIC, self.sig, len(self.roms), len(self.extras)) +
+                b''.join(rom or NO_ROM for rom in self.roms) + b''.join(self.extras))
+        try:
+            with open(self.path, 'wb') as f:
+                f.write(blob)
+                f.write(struct.pack('<I', crc32(blob) & 0xffffffff))
+        except OSError as e:
+            print("DSIndex: can not write %s: %s" % (self.path, e))
+
+    def discover(self, found):
+        """ Assigns found ROMs to roles without a sensor and saves the index, returns roles which got a sensor """
+        found = sorted(bytes(rom) for rom in found)
+        free = [rom for rom in found if rom not in self.roms]
+        new = []
+        for i in range(len(self.roms)):
+            if self.roms[i] is None and free:
+                self.roms[i] = free.pop(0)
+                new.append(i)
+        self.extras = free
+        self.save()
+        return new
+
+    def missing(self, found):
+        """ Roles whose ROM is not in found """
+        return [i for i in range(len(self.roms)) if self.roms[i] is not None and self.roms[i] not in found]
+
+    def unassigned(self):
+        return [i for i in range(len(self.roms)) if self.roms[i] is None]
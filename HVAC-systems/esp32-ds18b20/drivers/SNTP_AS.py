@@ -0,0 +1,165 @@
+# Asynchronous SNTP client, replaces blocking ntptime.settime()
+#
+# UDP socket is non-blocking, reply is polled with asyncio.sleep_ms() so the event loop keeps running.
+# Each server is queried once per sync, median offset of the answered servers is used.
+# Offset below step_ms is slewed in max slew_ms per second steps by slew_loop(), larger offsets are stepped.
+# RTC drift (ppm) is estimated between syncs and the next sync interval is adapted so that the
+# expected error stays under max_err_ms, between min_ival and max_ival seconds.
+#
+# in main.py:
+# sntp = SNTPClient(('0.fi.pool.ntp.org', '1.fi.pool.ntp.org', '2.fi.pool.ntp.org'))
+# loop.create_task(sntp.sync_loop())   # or call await sntp.sync() when sntp.due()
+
+import socket
+import struct
+import uasyncio as asyncio
+from machine import RTC
+from utime import gmtime, time_ns, ticks_ms, ticks_us, ticks_diff
+
+# (date(2000, 1, 1) - date(1900, 1, 1)).days * 24*60*60
+NTP_DELTA = 3155673600
+if gmtime(0)[0] == 1970:
+    NTP_DELTA = 2208988800
+
+
+class SNTPClient(object):
+
+    def __init__(self, servers=('pool.ntp.org',), timeout_ms=1000, step_ms=500, slew_ms=20,
+                 min_ival=900, max_ival=86400, max_err_ms=200):
+        self.servers = servers
+        self.timeout_ms = timeout_ms
+        self.step_ms = step_ms
+        self.slew_ms = slew_ms
+        self.min_ival = min_ival
+        self.max_ival = max_ival
+        self.max_err_ms = max_err_ms
+        self.addrs = {}  # DNS cache, getaddrinfo blocks
+        self.buf = bytearray(48)
+        self.ival = min_ival
+        self.pending_ms = 0  # Offset still to be slewed
+        self.synced = False
+        self.last_sync = None  # ticks_ms of last successful sync
+        self.drift_ppm = None
+        # Statistics
+        self.syncs = 0
+        self.failures = 0
+        self.steps = 0
+        self.last_offset_ms = None
+        self.last_delay_ms = None
+        self.max_block_us = 0  # Longest synchronous section, event loop stall
+
+    @staticmethod
+    def _now_ms():
+        return time_ns() // 1000000
+
+    def _blocked(self, start_us):
+        used = ticks_diff(ticks_us(), start_us)
+        if used > self.max_block_us:
+            self.max_block_us = used
+
+    async def query(self, host):
+        """ Returns (offset_ms, delay_ms) or None """
+        t = ticks_us()
+        try:
+            if host not in self.addrs:
+                self.addrs[host] = socket.getaddrinfo(host, 123)[0][-1]
+            addr = self.addrs[host]
+            s = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        except OSError:
+            self._blocked(t)
+            return None
+        try:
+            s.setblocking(False)
+            buf = self.buf
+            buf[:] = bytes(48)
+            buf[0] = 0x1B
+            t1 = self._now_ms()
+            s.sendto(buf, addr)
+            self._blocked(t)
+            start = ticks_ms()
+            while ticks_diff(ticks_ms(), start) < self.timeout_ms:
+                await asyncio.sleep_ms(5)
+                try:
+                    n = s.readinto(buf)
+                except OSError:
+                    continue  # EAGAIN
+                if n is None or n < 48:
+                    continue
+                t4 = self._now_ms()
+                rx_s, rx_f, tx_s, tx_f = struct.unpack("!IIII", buf[32:48])
+                if tx_s == 0:
+                    return None  # Kiss-o'-death or not synchronized server
+                t2 = (rx_s - NTP_DELTA) * 1000 + (rx_f * 1000 >> 32)
+                t3 = (tx_s - NTP_DELTA) * 1000 + (tx_f * 1000 >> 32)
+                offset = ((t2 - t1) + (t3 - t4)) // 2
+                delay = (t4 - t1) - (t3 - t2)
+                return offset, delay
+            # Timeout, DNS may have changed
+            self.addrs.pop(host, None)
+            return None
+        finally:
+            s.close()
+
+    def _step(self, offset_ms):
+        t = self._now_ms() + offset_ms
+        tm = gmtime(t // 1000)
+        RTC().datetime((tm[0], tm[1], tm[2], tm[6] + 1, tm[3], tm[4], tm[5], (t % 1000) * 1000))
+
+    def due(self):
+        if not self.synced:
+            return True
+        return ticks_diff(ticks_ms(), self.last_sync) >= self.ival * 1000
+
+    async def sync(self):
+        results = []
+        for host in self.servers:
+            r = await self.query(host)
+            if r is not None:
+                results.append(r)
+        if not results:
+            self.failures += 1
+            return False
+        results.sort()
+        offset, delay = results[len(results) // 2]
+        now = ticks_ms()
+        if self.synced:
+            # Drift accumulated since previous sync, offset not yet slewed is not drift
+            elapsed = ticks_diff(now, self.last_sync)
+            if elapsed > 0:
+                ppm = (offset - self.pending_ms) * 1000000 / elapsed
+                self.drift_ppm = ppm if self.drift_ppm is None else (self.drift_ppm + ppm) / 2
+        if (not self.synced) or (abs(offset) > self.step_ms):
+            self._step(offset)
+            self.pending_ms = 0
+            self.steps += 1
+        else:
+            self.pending_ms = offset
+        if self.drift_ppm:
+            ival = self.max_err_ms * 1000 / abs(self.drift_ppm)
+            self.ival = int(min(max(ival, self.min_ival), self.max_ival))
+        self.last_offset_ms = offset
+        self.last_delay_ms = delay
+        self.last_sync = now
+        self.synced = True
+        self.syncs += 1
+        return True
+
+    def slew(self):
+        """ Apply one small correction, call once per second """
+        if self.pending_ms != 0:
+            adj = max(-self.slew_ms, min(self.slew_ms, self.pending_ms))
+            self._step(adj)
+            self.pending_ms -= adj
+
+    async def slew_loop(self):
+        while True:
+            await asyncio.sleep(1)
+            self.slew()
+
+    async def sync_loop(self):
+        asyncio.create_task(self.slew_loop())
+        while True:
+            if await self.sync():
+                await asyncio.sleep(self.ival)
+            else:
+                await asyncio.sleep(60)
@@ -1,133 +1,178 @@
-# This class is for asynchronous WiFi connection.
+# This class is for asynchronous WiFi connection. 7.9.2024: Jari Hiltunen / Divergentti
+# Tries to connect to 2 different APs
+# in main.py:
+# net = WIFINET.ConnectWiFi(ssid1, pw for ssid1, ssid2, pw for 2, ntpserver  name, dhcpname, startwebrepl, wbpassword)
+# ... your asynchronous code ...
 #
-#   7.2.2024: Jari Hiltunen / Divergentti
-#
-#   in your main.py:
-#   import WIFICONN_AS as WNET
-#   net = WNET.ConnectWiFi(ssid1, pw for ssid1, ssid2, pw for 2, ntpserver  name, dhcpname, startwebrepl, wbpassword)
-#   ...
-#   your asynchronous code ...
-#   async def main():
+# async def main():
 #   loop = asyncio.get_event_loop()
 #   loop.create_task(net.net_upd_loop())
 #   loop.run_forever()
-
+#
+# Reconnect: last good SSID/BSSID is tried first with direct connect, status is polled every poll_ms and
+# connect returns as soon as IP is assigned. Scan (APs ranked by RSSI) is done only if direct connect fails.
+# Failed rounds back off exponentially from 1 second up to max_backoff seconds.
+# Channel of the last AP is stored for diagnostics, MicroPython STA connect() does not accept channel.
+# Time is set with asynchronous SNTP_AS client. ntpserver may be comma separated list of servers, resync interval
+# adapts to measured RTC drift.
 
 import gc
 import uasyncio as asyncio
 import network
-import ntptime
+import webrepl
+try:
+    from SNTP_AS import SNTPClient
+except ImportError:
+    from drivers.SNTP_AS import SNTPClient
+from utime import time, ticks_ms, ticks_diff
 gc.collect()
 
 
 class ConnectWiFi(object):
-    """ Class initialize WI-FI and tries to connect two predefined APs """
 
     def __init__(self, ssid1, password1, ssid2=None, password2=None, ntpserver='fi.pool.ntp.org', dhcpname=None,
-                 startwebrepl=False, webreplpwd=None):
-        self.sid1 = ssid1
+                 startwebrepl=False, webreplpwd=None, connect_timeout=10, poll_ms=100, max_backoff=120):
+        self.ssid1 = ssid1
         self.pw1 = password1
-        self.sid2 = ssid2
+        self.ssid2 = ssid2
         self.pw2 = password2
         self.ntps = ntpserver
+        self.sntp = SNTPClient(tuple(s.strip() for s in ntpserver.split(',')))
         self.dhcpn = dhcpname
-        if startwebrepl == 1:
-            self.s_wbr = True
-        else:
-            self.s_wbr = False
-        self.wbrpl_pwd = webreplpwd
+        self.starwbr = bool(startwebrepl)
+        self.webrplpwd = webreplpwd
         self.net_ok = False
-        self.pwd = None
+        self.password = None
         self.u_pwd = None
         self.use_ssid = None
         self.ip_a = None
         self.strength = None
-        self.wbrpl_sted = False
-        self.scan_ok = False
-        self.time_set = False
-        self.last_err = None
+        self.webrepl_started = False
+        self.startup_time = None
+        self.con_tout_ms = connect_timeout * 1000
+        self.poll_ms = poll_ms
+        self.max_backoff = max_backoff
+        self.backoff = 1
+        # Last good AP
+        self.last_bssid = None
+        self.last_channel = None
+        # Statistics
+        self.connects = 0
+        self.scans = 0
+        self.failures = 0
+        self.last_connect_ms = None  # Time from start of connect_to_network() to IP
 
     async def net_upd_loop(self):
-        if self.dhcpn is not None:
-            network.WLAN(network.STA_IF).config(dhcp_hostname=self.dhcpn)
-        if self.ntps is not None:
-            ntptime.host = self.ntps
-
         while True:
-            # Scan available APs and check if they are in list
-            if (self.net_ok is False) and (self.scan_ok is False):
-                try:
-                    await self.s_nets()
-                except False:
-                    print("Scan error: %s" % self.last_err)
-
-            if (self.scan_ok is True) and (self.net_ok is False):
-                # Try to connect
-                try:
-                    network.WLAN(network.STA_IF).connect(self.use_ssid, self.u_pwd)
-                    await asyncio.sleep(10)
-                except network.WLAN(network.STA_IF).ifconfig()[0] == '0.0.0.0':
-                    self.net_ok = False
-                    self.last_err = "IP 0.0.0.0"
-                    print("Connect error %s" % self.last_err)
-                except OSError as e:
-                    self.net_ok = False
-                    self.last_err = e
-                    print("Connect error %s" % self.last_err)
+            if self.net_ok and not network.WLAN(network.STA_IF).isconnected():
+                self.net_ok = False
+                self.ip_a = None
+            if not self.net_ok:
+                if await self.connect_to_network():
+                    self.backoff = 1
                 else:
-                    self.use_ssid = network.WLAN(network.STA_IF).config('essid')
-                    self.ip_a = network.WLAN(network.STA_IF).ifconfig()[0]
-                    self.strength = network.WLAN(network.STA_IF).status('rssi')
-                    self.net_ok = True
+                    self.failures += 1
+                    await asyncio.sleep(self.backoff)
+                    self.backoff = min(self.backoff * 2, self.max_backoff)
+                    continue
+            elif self.sntp.due():
+                await self.set_time()
+            if self.sntp.pending_ms != 0:
+                self.sntp.slew()
+            await asyncio.sleep(1)
 
-            if (self.net_ok is True) and (self.time_set is False):
-                try:
-                    ntptime.settime()
-                except OSError as e:
-                    self.last_err = e
-                    self.time_set = False
-                else:
-                    self.time_set = True
+    async def start_webrepl(self):
+        if not self.webrepl_started:
+            try:
+                webrepl.start(password=self.webrplpwd)
+                self.webrepl_started = True
+                return True
+            except OSError as e:
+                self.webrepl_started = False
+                return False
 
-            if ((self.net_ok is True) and (self.s_wbr is True) and
-                    (self.wbrpl_pwd is not None) and (self.wbrpl_sted is False)):
-                import webrepl
-                # Note! Execute in REPL command import webrepl_setup  !! Check boot.py after setup!
-                try:
-                    webrepl.start(password=self.wbrpl_pwd)
-                    webrepl.start()
-                except NameError as e:
-                    self.wbrpl_sted = False
-                    self.last_err = e
-                except OSError as e:
-                    self.wbrpl_sted = False
-                    self.last_err = e
-                else:
-                    self.wbrpl_sted = True
+    async def set_time(self):
+        return await self.sntp.sync()
 
-            await asyncio.sleep(1)
+    def _pwd(self, ssid):
+        if ssid == self.ssid1:
+            return self.pw1
+        return self.pw2
 
     async def s_nets(self):
-        ssid_list = []
-        network.WLAN(network.STA_IF).active(True)
+        """ Scan and return known APs as list of (ssid, bssid, channel), strongest first """
+        wlan = network.WLAN(network.STA_IF)
+        wlan.active(True)
+        self.scans += 1
         try:
-            ssid_list = network.WLAN(network.STA_IF).scan()
-            await asyncio.sleep(5)
-        except ssid_list == []:
-            self.last_err = "Empty SSID list!"
-            self.scan_ok = False
+            ssid_list = wlan.scan()
         except OSError as e:
-            self.last_err = e
-            self.scan_ok = False
-        else:
-            if (item for item in ssid_list if item[0].decode() == self.sid1):
-                self.use_ssid = self.sid1
-                self.u_pwd = self.pw1
-                self.scan_ok = True
-            elif (item for item in ssid_list if item[0].decode() == self.sid2):
-                self.use_ssid = self.sid2
-                self.u_pwd = self.pw2
-                self.scan_ok = True
+            return []
+        found = []
+        for item in ssid_list:
+            ssid = item[0].decode()
+            if (ssid == self.ssid1) or ((self.ssid2 is not None) and (ssid == self.ssid2)):
+                found.append((item[3], ssid, item[1], item[2]))  # rssi, ssid, bssid, channel
+        found.sort(reverse=True)
+        if not found:
+            print("s_nets: either AP1 or AP2 not found in range!")
+        return [(ssid, bssid, channel) for rssi, ssid, bssid, channel in found]
+
+    async def _try_connect(self, ssid, bssid=None):
+        """ Connect and poll status, True as soon as IP is assigned """
+        wlan = network.WLAN(network.STA_IF)
+        try:
+            if bssid is not None:
+                wlan.connect(ssid, self._pwd(ssid), bssid=bssid)
             else:
-                self.last_err = "AP1 or AP2 not found in range!"
-                self.scan_ok = False
+                wlan.connect(ssid, self._pwd(ssid))
+        except OSError as e:
+            return False
+        start = ticks_ms()
+        while ticks_diff(ticks_ms(), start) < self.con_tout_ms:
+            await asyncio.sleep_ms(self.poll_ms)
+            if wlan.isconnected() and (wlan.ifconfig()[0] != '0.0.0.0'):
+                return True
+            status = wlan.status()
+            if status in (network.STAT_WRONG_PASSWORD, network.STAT_NO_AP_FOUND, network.STAT_CONNECT_FAIL):
+                break
+        try:
+            wlan.disconnect()
+        except OSError:
+            pass
+        return False
+
+    async def connect_to_network(self):
+        start = ticks_ms()
+        wlan = network.WLAN(network.STA_IF)
+        wlan.active(True)
+        if self.dhcpn is not None and (len(self.dhcpn) < 15):
+            # Since version 1.2 <15 characters
+            wlan.config(dhcp_hostname=self.dhcpn)
+        ok = False
+        # Direct connect to last good AP, no scan
+        if self.use_ssid is not None:
+            ok = await self._try_connect(self.use_ssid, self.last_bssid)
+        if not ok:
+            for ssid, bssid, channel in await self.s_nets():
+                if await self._try_connect(ssid, bssid):
+                    self.use_ssid = ssid
+                    self.last_bssid = bssid
+                    self.last_channel = channel
+                    ok = True
+                    break
+        if not ok:
+            self.net_ok = False
+            return False
+        self.u_pwd = self._pwd(self.use_ssid)
+        self.ip_a = wlan.ifconfig()[0]
+        self.strength = wlan.status('rssi')
+        self.connects += 1
+        self.last_connect_ms = ticks_diff(ticks_ms(), start)
+        if self.sntp.due():
+            await self.set_time()
+        if (self.starwbr is True) and (self.webrepl_started is False):
+            await self.start_webrepl()
+        self.startup_time = time()
+        self.net_ok = True
+        return True
@@ -8,7 +8,8 @@ Parasitic mode: 1) connect DS18B20 GND (black) and VDD (red) to ESP32 GND
                 3) connect DS18B20 DATA (yellow) to ESP32 GPIO (Pin4)
 Use this- > conventional mode: connect DS18B20 red to ESP32 VDD (3.3V). Keep the pull-up 4.7 K resistor.
 
-Sensor addresses must be converted to base64 format to runtimeconfig.json! Use sub def find_sensors() !!
+Sensor addresses are base64 format in runtimeconfig.json, f_sens() shows them. Empty S1..S5_ADDRESS is filled with
+a discovered sensor at first boot, the event log shows the address. Delete /dsindex.bin to scan the bus again.
 
 Enclosure for 3D printer is available from thingsverse.com
 
@@ -16,7 +17,8 @@ As default, I2C for the OLED is connected to SDA = Pin21 and SCL (SCK) = Pin22 (
 Use command i2c.scan() to check which devices respond from the I2C channel.
 
 Program read sensor values once per second, rounds them to 1 decimal with correction values, then calculates averages.
-Averages are sent to the MQTT broker defined in runtimeconfig.json.
+Averages are published on the sample bus (drivers/SAMPLEBUS_AS.py), changed averages are sent to the MQTT broker
+defined in runtimeconfig.json at most once per MQTT_INTERVAL.
 
 For webrepl, remember to execute import webrepl_setup one time.
 
@@ -27,197 +29,140 @@ Version 0.2 - error handling, variable names / try, except, else fix - 25.01.202
 """
 
 
+from drivers.BOOTPROF import boot_phase, boot_mark, prof
+from drivers.MEMMGR_AS import mem
+prof.begin("imports")
 from machine import SoftI2C, Pin, freq, reset
 import ubinascii
 import onewire
-import ds18x20
+import drivers.DS18B20_AS as DS18B20
+import drivers.DSINDEX as DSINDEX
 import uasyncio as asyncio
-from utime import mktime, localtime
 import gc
 import drivers.SH1106 as DISP
-gc.collect()
+import drivers.RUNCONF as RUNCONF
+import drivers.EVENTLOG_AS as ELOG
+import drivers.SUPERVISOR_AS as SUP
+from drivers.SAMPLEBUS_AS import bus
+import drivers.TIMEZONE as TIMEZONE
+mem.collect()
 import drivers.WIFICONN_AS as WNET
-gc.collect()
-from json import load
+mem.collect()
 import esp32
 from drivers.MQTT_AS import MQTTClient, config
-gc.collect()
-import os
+mem.collect()
+prof.end()
 
 mqtt_up = False
+first_pub = asyncio.Event()
 bro_upt = 0
-temp_s1_av = 0
-temp_s2_av = 0
-temp_s3_av = 0
-temp_s4_av = 0
-temp_s5_av = 0
+SENSORS = ('s1', 's2', 's3', 's4', 's5')  # Sample bus channels, 60 s averages
+DS_RESCAN_IVAL = 300  # Bus cycles between scans while some sensor role has no ROM
 
 
-def log_errors(err_in):
-    filename = "/errors.csv"
-    max_file_size_bytes = 1024  # 1KB
+# Fixed size records in RAM ring, flush_loop() appends them to rotating /errors0-3.csv segments
+elog = ELOG.EventLog(date_fn=lambda: "%s %s" % resolve_date()[:2])
 
-    with open(filename, 'a+') as logf:
-        try:
-            logf.write("%s" % str(resolve_date()[0]))  # Date in local format
-            logf.write(",")
-            logf.write("%s" % str(err_in))
-            logf.write("\r\n")
-        except OSError:
-            print("Can not write to ", filename, "!")
-            raise OSError
 
-    logf.close()
-
-    # Check file size and shrink/delete if needed
-    try:
-        file_stat = os.stat(filename)
-        file_size_bytes = file_stat[6]  # Index 6 corresponds to file size
-
-        if file_size_bytes > max_file_size_bytes:
-            with open(filename, 'r') as file:
-                lines = file.readlines()
-                lines = lines[-1000:]  # Keep the last 1000 lines
-            with open(filename, 'w') as file:
-                file.writelines(lines)
-    except OSError as e:
-        if e.args[0] == 2:  # File not found error
-            # File doesn't exist, create it
-            with open(filename, 'w') as file:
-                pass  # Just create an empty file
-        else:
-            print("Error while checking/shrinking the log file.")
-            raise OSError
+def log_errors(err_in, level=ELOG.ERROR):
+    elog.log(err_in, level)
 
 
 try:
-    f = open('parameters.py', "r")
     from parameters import I2C_SCL_PIN, I2C_SDA_PIN, DS_PIN
-    f.close()
-except OSError as err:  # open failed
-    log_errors("Parameters: %s" % err)
+except ImportError as err:
+    log_errors("Parameters: %s" % err, ELOG.CRITICAL)
     print("Error with parameters.py: ", err)
     raise OSError
 
+# Required runtimeconfig.json keys, checked once when the binary snapshot is compiled
+CONF_SCHEMA = {
+    str: ('SSID1', 'SSID2', 'PASSWORD1', 'PASSWORD2', 'MQTT_SERVER', 'MQTT_PASSWORD', 'MQTT_USER', 'MQTT_PORT',
+          'MQTT_SSL', 'CLIENT_ID', 'TOPIC_ERRORS', 'WEBREPL_PASSWORD', 'NTPSERVER', 'DHCP_NAME', 'S1_ADDRESS',
+          'S2_ADDRESS', 'S3_ADDRESS', 'S4_ADDRESS', 'S5_ADDRESS', 'TOPIC_TEMPS1', 'TOPIC_TEMPS2', 'TOPIC_TEMPS3',
+          'TOPIC_TEMPS4', 'TOPIC_TEMPS5'),
+    int: ('MQTT_INTERVAL', 'START_WEBREPL', 'START_NETWORK', 'START_MQTT', 'SCREEN_UPDATE_INTERVAL',
+          'DEBUG_SCREEN_ACTIVE', 'SCREEN_TIMEOUT', 'DST_BEGIN_M', 'DST_BEGIN_DAY', 'DST_BEGIN_OCC', 'DST_BEGIN_TIME',
+          'DST_END_M', 'DST_END_DAY', 'DST_END_TIME', 'DST_END_OCC', 'DST_TIMEZONE'),
+    float: ('TEMPS1_TRESHOLD', 'TEMPS1_CORRECTION', 'TEMPS2_TRESHOLD', 'TEMPS2_CORRECTION', 'TEMPS3_TRESHOLD',
+            'TEMPS3_CORRECTION', 'TEMPS4_TRESHOLD', 'TEMPS4_CORRECTION', 'TEMPS5_TRESHOLD', 'TEMPS5_CORRECTION'),
+}
+
+prof.begin("config")
 try:
-    f = open('runtimeconfig.json', 'r')
-    with open('runtimeconfig.json') as config_file:
-        data = load(config_file)
-        f.close()
-        sid1 = data['SSID1']
-        sid2 = data['SSID2']
-        pwd1 = data['PASSWORD1']
-        pwd2 = data['PASSWORD2']
-        mqtt_s = data['MQTT_SERVER']
-        mqtt_pwd = data['MQTT_PASSWORD']
-        mqtt_usr = data['MQTT_USER']
-        mqtt_prt = data['MQTT_PORT']
-        mqtt_use_ssl = data['MQTT_SSL']
-        mqtt_ival = data['MQTT_INTERVAL']
-        client_id = data['CLIENT_ID']
-        t_errs = data['TOPIC_ERRORS']
-        wbrpl_pwd = data['WEBREPL_PASSWORD']
-        ntp_s = data['NTPSERVER']
-        dhcp_n = data['DHCP_NAME']
-        s_wbrpl = data['START_WEBREPL']
-        s_net = data['START_NETWORK']
-        s_mqtt = data['START_MQTT']
-        s_upd_ival = data['SCREEN_UPDATE_INTERVAL']
-        d_scr_act = data['DEBUG_SCREEN_ACTIVE']
-        s_tout = data['SCREEN_TIMEOUT']
-        s1_addr = data['S1_ADDRESS']
-        s2_addr = data['S2_ADDRESS']
-        s3_addr = data['S3_ADDRESS']
-        s4_addr = data['S4_ADDRESS']
-        s5_addr = data['S5_ADDRESS']
-        t_temp_s1 = data['TOPIC_TEMPS1']
-        t_temp_s2 = data['TOPIC_TEMPS2']
-        t_temp_s3 = data['TOPIC_TEMPS3']
-        t_temp_s4 = data['TOPIC_TEMPS4']
-        t_temp_s5 = data['TOPIC_TEMPS5']
-        temp_s1_thold = data['TEMPS1_TRESHOLD']
-        temp_s1_corr = data['TEMPS1_CORRECTION']
-        temp_s2_thold = data['TEMPS2_TRESHOLD']
-        temp_s2_corr = data['TEMPS2_CORRECTION']
-        temp_s3_thold = data['TEMPS3_TRESHOLD']
-        temp_s3_corr = data['TEMPS3_CORRECTION']
-        temp_s4_thold = data['TEMPS4_TRESHOLD']
-        temp_s4_corr = data['TEMPS4_CORRECTION']
-        temp_s5_thold = data['TEMPS5_TRESHOLD']
-        temp_s5_corr = data['TEMPS5_CORRECTION']
-        dst_b_M = data['DST_BEGIN_M']
-        dst_b_D = data['DST_BEGIN_DAY']
-        dst_b_OCC = data['DST_BEGIN_OCC']
-        dst_b_time = data['DST_BEGIN_TIME']
-        dst_e_M = data['DST_END_M']
-        dst_e_D = data['DST_END_DAY']
-        dst_e_time = data['DST_END_TIME']
-        dst_e_OCC = data['DST_END_OCC']
-        dst_tzone = data['DST_TIMEZONE']
-except OSError as err:
-    log_errors("Runtime.json: %s" % err)
+    data = RUNCONF.RunConfig('runtimeconfig.json', CONF_SCHEMA)
+    sid1 = data['SSID1']
+    sid2 = data['SSID2']
+    pwd1 = data['PASSWORD1']
+    pwd2 = data['PASSWORD2']
+    mqtt_s = data['MQTT_SERVER']
+    mqtt_pwd = data['MQTT_PASSWORD']
+    mqtt_usr = data['MQTT_USER']
+    mqtt_prt = data['MQTT_PORT']
+    mqtt_use_ssl = data['MQTT_SSL']
+    mqtt_ival = data['MQTT_INTERVAL']
+    client_id = data['CLIENT_ID']
+    t_errs = data['TOPIC_ERRORS']
+    t_boot = data.get('TOPIC_BOOT')
+    wbrpl_pwd = data['WEBREPL_PASSWORD']
+    ntp_s = data['NTPSERVER']
+    dhcp_n = data['DHCP_NAME']
+    s_wbrpl = data['START_WEBREPL']
+    s_net = data['START_NETWORK']
+    s_mqtt = data['START_MQTT']
+    s_upd_ival = data['SCREEN_UPDATE_INTERVAL']
+    d_scr_act = data['DEBUG_SCREEN_ACTIVE']
+    s_tout = data['SCREEN_TIMEOUT']
+    s1_addr = data['S1_ADDRESS']
+    s2_addr = data['S2_ADDRESS']
+    s3_addr = data['S3_ADDRESS']
+    s4_addr = data['S4_ADDRESS']
+    s5_addr = data['S5_ADDRESS']
+    t_temp_s1 = data['TOPIC_TEMPS1']
+    t_temp_s2 = data['TOPIC_TEMPS2']
+    t_temp_s3 = data['TOPIC_TEMPS3']
+    t_temp_s4 = data['TOPIC_TEMPS4']
+    t_temp_s5 = data['TOPIC_TEMPS5']
+    temp_s1_thold = data['TEMPS1_TRESHOLD']
+    temp_s1_corr = data['TEMPS1_CORRECTION']
+    temp_s2_thold = data['TEMPS2_TRESHOLD']
+    temp_s2_corr = data['TEMPS2_CORRECTION']
+    temp_s3_thold = data['TEMPS3_TRESHOLD']
+    temp_s3_corr = data['TEMPS3_CORRECTION']
+    temp_s4_thold = data['TEMPS4_TRESHOLD']
+    temp_s4_corr = data['TEMPS4_CORRECTION']
+    temp_s5_thold = data['TEMPS5_TRESHOLD']
+    temp_s5_corr = data['TEMPS5_CORRECTION']
+    ds_res = data.get_int('DS_RESOLUTION', 12)
+    ds_s_res = tuple(data.get_int('S%s_RESOLUTION' % n, ds_res) for n in range(1, 6))
+    dst_b_M = data['DST_BEGIN_M']
+    dst_b_D = data['DST_BEGIN_DAY']
+    dst_b_OCC = data['DST_BEGIN_OCC']
+    dst_b_time = data['DST_BEGIN_TIME']
+    dst_e_M = data['DST_END_M']
+    dst_e_D = data['DST_END_DAY']
+    dst_e_time = data['DST_END_TIME']
+    dst_e_OCC = data['DST_END_OCC']
+    dst_tzone = data['DST_TIMEZONE']
+except (OSError, ValueError) as err:
+    log_errors("Runtime.json: %s" % err, ELOG.CRITICAL)
     print("Error with runtime.json: ", err)
     raise OSError
+prof.end()
+# MQTT is woken by new samples, at most once per mqtt_ival. Unchanged values are sent again after MQTT_REPUBLISH
+# intervals, a topic which stays silent longer means the node is down
+MQTT_REPUBLISH = 10
+mqtt_sub = bus.subscribe(SENSORS, min_ms=mqtt_ival * 1000, max_silence_ms=MQTT_REPUBLISH * mqtt_ival * 1000)
 
 
-def weekday(year, month, day):
-    # Returns weekday. Thanks to 2DOF @ GitHub
-    t = [0, 3, 2, 5, 0, 3, 5, 1, 4, 6, 2, 4]
-    year -= month < 3
-    return (year + int(year / 4) - int(year / 100) + int(year / 400) + t[month - 1] + day) % 7
-
-
-def resolve_dst():
-    (year, month, mdate, hour, minute, second, wday, yday) = localtime()   # supposed to be GMT/UTC
-    match_days_begin = []
-    match_days_end = []
-    # Define the DST rules for the specified time zone
-    # Replace these rules with the actual DST rules for your time zone
-    dst_rules = {
-        "begin": (dst_b_M, dst_b_D, dst_b_OCC, dst_b_time),
-        # 3 = March, 2 = last, 6 = Sunday, 3 = 03:00
-        "end": (dst_e_M, dst_e_D, dst_e_OCC, dst_e_time),   # DST end  month, day, 1=first, 2=last at 04:00.
-        # 10 = October, 2 = last, 6 = Sunday, 4 = 04:00
-        "timezone": dst_tzone,          # hours from UTC during normal (winter time)
-        "offset": 1                     # hours to be added to timezone when DST is True
-    }
-    # Iterate begin
-    if dst_rules["begin"][0] in (1, 3, 5, 7, 8, 10, 11):
-        days_in_month = 30
-    else:
-        days_in_month = 31   # February does not matter here
-    # Iterate months and find days matching criteria
-    for x in range(days_in_month):
-        if weekday(year, dst_rules["begin"][0], x) == dst_rules["begin"][1]:
-            if dst_rules["begin"][2] == 2:  # last day first in the list
-                match_days_begin.insert(0, x)
-            else:
-                match_days_begin.append(x)  # first day first in the list
-    dst_begin = mktime((year, dst_rules["begin"][0], match_days_begin[0], dst_rules["begin"][3], 0, 0,
-                        dst_rules["begin"][1], 0))
-    if dst_rules["end"][0] in (1, 3, 5, 7, 8, 10, 11):
-        days_in_month = 30
-    else:
-        days_in_month = 31   # February does not matter here
-    for x in range(days_in_month):
-        if weekday(year, dst_rules["end"][0], x) == dst_rules["end"][1]:
-            if dst_rules["end"][2] == 2:  # last day first in the list
-                match_days_end.insert(0, x)
-            else:
-                match_days_end.append(x)  # first day first in the list
-    dst_end = mktime((year, dst_rules["end"][0], match_days_end[0], dst_rules["end"][3], 0, 0, dst_rules["end"][1], 0))
-    if (mktime(localtime()) < dst_begin) or (mktime(localtime()) > dst_end):
-        return localtime(mktime(localtime()) + 3600 * dst_rules["timezone"])
-    else:
-        return localtime(mktime(localtime()) + (3600 * dst_rules["timezone"]) + (3600 * dst_rules["offset"]))
+# DST transitions are calculated once per year, date strings once per second
+tz = TIMEZONE.TimeZone(dst_tzone, (dst_b_M, dst_b_D, dst_b_OCC, dst_b_time),
+                 (dst_e_M, dst_e_D, dst_e_OCC, dst_e_time),
+                 weekdays=('Ma', 'Ti', 'Ke', 'To', 'Pe', 'La', 'Su'))
 
 
 def resolve_date():
-    (year, month, mdate, hour, minute, second, wday, yday) = resolve_dst()
-    weekdays = ['Ma', 'Ti', 'Ke', 'To', 'Pe', 'La', 'Su']
-    day = "%s.%s.%s" % (mdate, month, year)
-    hours = "%s:%s:%s" % ("{:02d}".format(hour), "{:02d}".format(minute), "{:02d}".format(second))
-    return day, hours, weekdays[wday]
+    return tz.format_date()
 
 
 class Displayme(object):
@@ -308,8 +253,9 @@ async def mqtt_up_l():
     global mq_clnt
 
     while net.net_ok is False:
-        gc.collect()
+        mem.idle()
         await asyncio.sleep(5)
+    boot_mark("wifi_up")
 
     if net.net_ok is True:
         config['subs_cb'] = upd_mqtt_stat
@@ -331,6 +277,7 @@ async def mqtt_up_l():
                 await mq_clnt.connect()
                 if mq_clnt.isconnected() is True:
                     mqtt_up = True
+                    boot_mark("mqtt_up")
             except OSError as e:
                 log_errors("MQTT Connect: %s" % e)
                 if d_scr_act == 1:
@@ -369,17 +316,29 @@ async def s_what_i_do():
         if s_mqtt == 1:
             print("   MQTT Connected: %s, broker uptime: %s" % (mqtt_up, bro_upt))
         print("   Memory free: %s, allocated: %s" % (gc.mem_free(), gc.mem_alloc()))
+        print("   Memory: %s" % mem.stats())
+        print("   Loop: %s" % sup.stats())
+        print("   Error log: %s records, %s filtered, %s flash bytes/record, segment %s" %
+              (elog.records, elog.filtered, elog.bytes_per_record(), elog.seg))
+        print("   Config: snapshot %s bytes, compiled from JSON %s, loaded in %s us" %
+              (data.size, data.compiled, data.load_us))
         print("   Heap info %s, hall sensor %s, raw-temp %sC" % (esp32.idf_heap_info(esp32.HEAP_DATA),
                                                                  esp32.hall_sensor(),
                                                                  "{:.1f}".format(
                                                                      ((float(esp32.raw_temperature()) - 32.0)
                                                                       * 5 / 9))))
+        print("   Sample bus: %s, MQTT %s" % (bus.stats(), mqtt_sub.stats()))
         print("2 ---------SENSORS----------- 2")
-        print("   Sensor 1: %s " % temp_s1_av)
-        print("   Sensor 2: %s " % temp_s2_av)
-        print("   Sensor 3: %s " % temp_s3_av)
-        print("   Sensor 4: %s " % temp_s4_av)
-        print("   Sensor 5: %s " % temp_s5_av)
+        print("   Sensor 1: %s " % bus.get('s1'))
+        print("   Sensor 2: %s " % bus.get('s2'))
+        print("   Sensor 3: %s " % bus.get('s3'))
+        print("   Sensor 4: %s " % bus.get('s4'))
+        print("   Sensor 5: %s " % bus.get('s5'))
+        print("   Bus cycle %s ms, conversion %s ms, cycles %s" % (ds_bus.cycle_ms, ds_bus.conv_ms, ds_bus.cycles))
+        for i in range(len(ds_bus.roms)):
+            print("   S%s: %s bit, reads %s, CRC errors %s (%.3f), missing %s, latency %s us (max %s)" % (
+                i + 1, ds_bus.res[i], ds_bus.reads[i], ds_bus.crc_errors[i], ds_bus.crc_rate(i),
+                ds_bus.missing[i], ds_bus.latency_us[i], ds_bus.max_latency_us[i]))
         print("\n")
         await asyncio.sleep(5)
 
@@ -396,15 +355,38 @@ s4_addr = ubinascii.a2b_base64(s4_addr)
 s5_addr = ubinascii.a2b_base64(s5_addr)
 
 # DS18B20 pin. Each sensor has unique ID, so you can use just one pin. This is for 5 sensors.
-ds_roms = ds18x20.DS18X20(onewire.OneWire(Pin(DS_PIN)))
-found_roms = ds_roms.scan()
-if len(found_roms) < 5:
-    log_errors("Error: should have 5 sensors, found %s" % len(found_roms))
-    raise Exception("Error: should have 5 sensors, found %s" % len(found_roms))
-# Match sensor addresses to runtimejson addresses
-if not s1_addr and s2_addr and s3_addr and s4_addr and s5_addr in found_roms:
-    log_errors("Sensor addresses do not match to found sensors! %s" % found_roms)
-    raise Exception("Sensor addresses do not match to found sensors! %s" % found_roms)
+# Empty S1..S5_ADDRESS gets a discovered sensor. Index of ROM per sensor is kept in /dsindex.bin, scan is done
+# only when the index does not match to the configuration. Missing sensors read None, the node still starts.
+# Resolution outside 9 - 12 bits in the configuration falls back to 12 bits, the node still starts
+for i in range(len(ds_s_res)):
+    if ds_s_res[i] not in DS18B20.CONV_MS:
+        log_errors("DS18B20 S%s_RESOLUTION %s, using 12" % (i + 1, ds_s_res[i]), ELOG.WARNING)
+ds_s_res = tuple(res if res in DS18B20.CONV_MS else 12 for res in ds_s_res)
+ds_bus = DS18B20.DS18B20Bus(onewire.OneWire(Pin(DS_PIN)))
+ds_idx = DSINDEX.DSIndex((s1_addr, s2_addr, s3_addr, s4_addr, s5_addr), ds_s_res)
+if not ds_idx.loaded:
+    with boot_phase("ds18b20_scan"):
+        found_roms = ds_bus.scan()
+        new_roles = ds_idx.discover(found_roms)
+    for i in ds_idx.missing(found_roms):
+        log_errors("DS18B20 S%s %s not found" % (i + 1, ubinascii.b2a_base64(ds_idx.roms[i]).decode().strip()),
+                   ELOG.WARNING)
+    for i in new_roles:
+        log_errors("DS18B20 S%s discovered, S%s_ADDRESS %s" % (
+            i + 1, i + 1, ubinascii.b2a_base64(ds_idx.roms[i]).decode().strip()), ELOG.INFO)
+    for rom in ds_idx.extras:
+        log_errors("DS18B20 %s without sensor role" % ubinascii.b2a_base64(rom).decode().strip(), ELOG.INFO)
+for i in range(len(ds_idx.roms)):
+    ds_bus.add(ds_idx.roms[i], ds_s_res[i])
+    if ds_idx.roms[i] is None:
+        log_errors("DS18B20 S%s has no sensor" % (i + 1), ELOG.WARNING)
+    elif not ds_idx.loaded:
+        # Resolution into the sensor EEPROM once, read() corrects a sensor which has lost it
+        with boot_phase("ds18b20_res"):
+            try:
+                ds_bus.set_resolution(ds_idx.roms[i], ds_s_res[i], True)
+            except OSError as err:
+                log_errors("DS18B20 S%s resolution: %s" % (i + 1, err))
 
 
 # Network handshake
@@ -412,85 +394,79 @@ net = WNET.ConnectWiFi(sid1, pwd1, sid2, pwd2, ntp_s, dhcp_n, s_wbrpl, wbrpl_pwd
 i2c = SoftI2C(scl=Pin(I2C_SCL_PIN), sda=Pin(I2C_SDA_PIN))
 
 #  OLED display
-try:
-    dp = Displayme()
-except OSError as err:
-    log_errors("OLED init: %s" % err)
-    raise Exception("Error: %s - OLED Display init error!" % err)
+with boot_phase("oled_init"):
+    try:
+        dp = Displayme()
+    except OSError as err:
+        log_errors("OLED init: %s" % err, ELOG.CRITICAL)
+        raise Exception("Error: %s - OLED Display init error!" % err)
 
 
 def f_sens():
     # Shows connected sensors addresses and converts them to base64 for runtimeconfig.json
-    ds_found = ds_roms.scan()
+    ds_found = ds_bus.scan()
     for ds in ds_found:
-        ds_roms.convert_temp()
         print("Found sensors are: %s" % ds)
         print("Encoded base64 addresses for runtimeconfig: %s" % ubinascii.b2a_base64(ds).decode('utf-8').strip())
-        print("Temperature readings: %s" % ds_roms.read_temp(ds))
+        print("Temperature readings: %s" % ds_bus.read_temp(ds))
 
 
 async def r_sen_l():
-    global temp_s1_av, temp_s2_av, temp_s3_av, temp_s4_av, temp_s5_av
-    temp_s1_l = []
-    temp_s2_l = []
-    temp_s3_l = []
-    temp_s4_l = []
-    temp_s5_l = []
-
-    #  Read values from sensor once per second, add them to the array, delete oldest when size 60 (seconds)
+    corrs = (temp_s1_corr, temp_s2_corr, temp_s3_corr, temp_s4_corr, temp_s5_corr)
+    t_lists = ([], [], [], [], [])
+    failed = bytearray(5)
+
+    #  One conversion of all sensors per second, add values to the array, delete oldest when size 60 (seconds)
     while True:
-        try:
-            ds_roms.convert_temp()
-            temp_s1_l.append(ds_roms.read_temp(s1_addr) + temp_s1_corr)
-            temp_s2_l.append(ds_roms.read_temp(s2_addr) + temp_s2_corr)
-            temp_s3_l.append(ds_roms.read_temp(s3_addr) + temp_s3_corr)
-            temp_s4_l.append(ds_roms.read_temp(s4_addr) + temp_s4_corr)
-            temp_s5_l.append(ds_roms.read_temp(s5_addr) + temp_s5_corr)
-        except ValueError as e:
-            log_errors("Value error in read_sensors_loop: %s" % e)
-        else:
-            if len(temp_s1_l) >= 60:
-                temp_s1_l.pop(0)
-            if len(temp_s2_l) >= 60:
-                temp_s2_l.pop(0)
-            if len(temp_s3_l) >= 60:
-                temp_s3_l.pop(0)
-            if len(temp_s4_l) >= 60:
-                temp_s4_l.pop(0)
-            if len(temp_s5_l) >= 60:
-                temp_s5_l.pop(0)
-            if len(temp_s1_l) > 1:
-                temp_s1_av = round(sum(temp_s1_l) / len(temp_s1_l), 1)
-            if len(temp_s2_l) > 1:
-                temp_s2_av = round(sum(temp_s2_l) / len(temp_s2_l), 1)
-            if len(temp_s3_l) > 1:
-                temp_s3_av = round(sum(temp_s3_l) / len(temp_s3_l), 1)
-            if len(temp_s4_l) > 1:
-                temp_s4_av = round(sum(temp_s4_l) / len(temp_s4_l), 1)
-            if len(temp_s5_l) > 1:
-                temp_s5_av = round(sum(temp_s5_l) / len(temp_s5_l), 1)
-            gc.collect()
-            await asyncio.sleep(1)
+        sup.beat('sens')
+        temps = await ds_bus.cycle()
+        for i in range(5):
+            if temps[i] is None:
+                if ds_bus.roms[i] is not None and not failed[i]:
+                    failed[i] = 1
+                    log_errors("DS18B20 S%s read error, CRC errors %s, missing %s" %
+                               (i + 1, ds_bus.crc_errors[i], ds_bus.missing[i]))
+                continue
+            failed[i] = 0
+            t_list = t_lists[i]
+            t_list.append(temps[i] + corrs[i])
+            if len(t_list) >= 60:
+                t_list.pop(0)
+            if len(t_list) > 1:
+                bus.publish(SENSORS[i], round(sum(t_list) / len(t_list), 1))
+        if ds_bus.cycles % DS_RESCAN_IVAL == 0 and ds_idx.unassigned():
+            # Hot-plugged sensors for roles without a ROM, search blocks about 15 ms per sensor on the bus
+            for i in ds_idx.discover(ds_bus.scan()):
+                ds_bus.roms[i] = ds_idx.roms[i]
+                log_errors("DS18B20 S%s discovered, S%s_ADDRESS %s" % (
+                    i + 1, i + 1, ubinascii.b2a_base64(ds_idx.roms[i]).decode().strip()), ELOG.INFO)
+                try:
+                    ds_bus.set_resolution(ds_idx.roms[i], ds_s_res[i], True)
+                except OSError as err:
+                    log_errors("DS18B20 S%s resolution: %s" % (i + 1, err))
+        mem.idle()
+        await asyncio.sleep_ms(max(0, 1000 - ds_bus.cycle_ms))
 
 
 async def mqtt_pub_l():
-    #  Publish only valid average values.
+    #  Publish only valid and changed average values, wakes up at most once per mqtt_ival. Unchanged values are
+    #  repeated after MQTT_REPUBLISH intervals
+    topics = (t_temp_s1, t_temp_s2, t_temp_s3, t_temp_s4, t_temp_s5)
 
     while True:
+        sup.beat('mqtt_pub')
         if mqtt_up is False:
             await asyncio.sleep(10)
-        else:
-            await asyncio.sleep(mqtt_ival)
-            if -40 < temp_s1_av < 120:
-                await mq_clnt.publish(t_temp_s1, str(temp_s1_av), retain=0, qos=0)
-            if -40 < temp_s2_av < 120:
-                await mq_clnt.publish(t_temp_s2, str(temp_s2_av), retain=0, qos=0)
-            if -40 < temp_s3_av < 120:
-                await mq_clnt.publish(t_temp_s3, str(temp_s3_av), retain=0, qos=0)
-            if -40 < temp_s4_av < 120:
-                await mq_clnt.publish(t_temp_s4, str(temp_s4_av), retain=0, qos=0)
-            if -40 < temp_s5_av < 120:
-                await mq_clnt.publish(t_temp_s5, str(temp_s5_av), retain=0, qos=0)
+        elif await mqtt_sub.wait(30000):
+            for i in range(5):
+                if mqtt_sub.changed(SENSORS[i]):
+                    temp = bus.get(SENSORS[i])
+                    if temp is not None and -40 < temp < 120:
+                        await mq_clnt.publish(topics[i], str(temp), retain=0, qos=0)
+                    mqtt_sub.consumed(SENSORS[i])
+            if not first_pub.is_set():
+                boot_mark("first_publish")
+                first_pub.set()
 
 
 # For MQTT_AS
@@ -509,33 +485,69 @@ mq_clnt = MQTTClient(config)
 
 async def disp_l():
     while True:
+        sup.beat('disp')
         await dp.rot_180(True)
         await dp.txt_2_r("  %s %s" % (resolve_date()[2], resolve_date()[0]), 0, 5)
         await dp.txt_2_r("    %s" % resolve_date()[1], 1, 5)
-        await dp.txt_2_r("S1:%s S2:%s" % ("{:.1f}".format(temp_s1_av), "{:.1f}".format(temp_s2_av)), 2, 5)
-        await dp.txt_2_r("S3:%s" % "{:.1f}".format(temp_s3_av), 3, 5)
-        await dp.txt_2_r("S4:%s S5:%s" % ("{:.1f}".format(temp_s4_av), "{:.1f}".format(temp_s5_av)), 4, 5)
+        s1, s2, s3, s4, s5 = (bus.get(name, 0) for name in SENSORS)
+        await dp.txt_2_r("S1:%s S2:%s" % ("{:.1f}".format(s1), "{:.1f}".format(s2)), 2, 5)
+        await dp.txt_2_r("S3:%s" % "{:.1f}".format(s3), 3, 5)
+        await dp.txt_2_r("S4:%s S5:%s" % ("{:.1f}".format(s4), "{:.1f}".format(s5)), 4, 5)
         # row 5 await display.text_to_row("Alarms:%s " % alarms, 5, 5)
         await dp.act_scr()
         await asyncio.sleep(1)
 
 
+async def fwd_errs(text):
+    # Error log forwarder, records not sent while MQTT is down are kept only on flash
+    if mqtt_up is False:
+        raise OSError("MQTT down")
+    await mq_clnt.publish(t_errs, text, retain=0, qos=0)
+
+
+async def boot_report():
+    # Boot timeline to /boottime.csv (and MQTT if TOPIC_BOOT is set) after the first publish or 2 minutes
+    try:
+        await asyncio.wait_for(first_pub.wait(), 120)
+    except asyncio.TimeoutError:
+        pass
+    prof.save()
+    if d_scr_act == 1:
+        prof.dump()
+    if mqtt_up and t_boot is not None:
+        await prof.publish(mq_clnt, t_boot)
+
+
+# Lag monitor and task heartbeats, this node has no hardware WDT: stale tasks are logged and kept in RTC memory
+sup = SUP.Supervisor(log_fn=log_errors)
+
+
 async def main():
     loop = asyncio.get_event_loop()
+    loop.create_task(sup.run())
+    prev = sup.last_reset()
+    if prev is not None:
+        log_errors("Previous reset: %s" % prev, ELOG.WARNING)
     if s_net == 1:
         loop.create_task(net.net_upd_loop())
     if d_scr_act == 1:
+        mem.probe_every = 10  # Largest free block in the debug output, costs collections
         loop.create_task(s_what_i_do())
     if s_mqtt == 1:
         loop.create_task(mqtt_up_l())
-        loop.create_task(mqtt_pub_l())
-    loop.create_task(r_sen_l())
-    loop.create_task(disp_l())
+        sup.register('mqtt_pub', mqtt_ival + 60, task=loop.create_task(mqtt_pub_l()))
+    sup.register('sens', 30, task=loop.create_task(r_sen_l()))
+    sup.register('disp', 60, task=loop.create_task(disp_l()))
+    if s_mqtt == 1:
+        elog.forward = fwd_errs
+    loop.create_task(elog.flush_loop())
+    loop.create_task(mem.run())
+    loop.create_task(boot_report())
     loop.run_forever()
 
 if __name__ == "__main__":
     try:
         asyncio.run(main())
     except MemoryError as err:
-        log_errors(err)
+        log_errors(err, ELOG.CRITICAL)
         reset()
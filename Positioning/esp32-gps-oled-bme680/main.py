@@ -18,12 +18,13 @@ Mostly asyncronous code.
 
 from machine import SoftI2C, Pin, freq, reset, TouchPad, reset_cause
 import uasyncio as asyncio
-from utime import mktime, localtime, sleep
+from utime import sleep
 import os
 import gc
 import drivers.BME680 as BMESENSOR
 import drivers.SH1106 as OLEDDISPLAY
 import drivers.GPS_AS as GPS
+import drivers.TIMEZONE as TIMEZONE
 gc.collect()
 from json import load
 import esp32
@@ -71,63 +72,14 @@ except OSError:
     raise
 
 
-def weekday(year, month, day):
-    # Returns weekday. Thanks to 2DOF @ Github
-    t = [0, 3, 2, 5, 0, 3, 5, 1, 4, 6, 2, 4]
-    year -= month < 3
-    return (year + int(year / 4) - int(year / 100) + int(year / 400) + t[month - 1] + day) % 7
-
-def resolve_dst():
-    (year, month, mdate, hour, minute, second, wday, yday) = localtime()   # supposed to be GMT/UTC
-    match_days_begin = []
-    match_days_end = []
-    # Define the DST rules for the specified time zone
-    # Replace these rules with the actual DST rules for your time zone
-    dst_rules = {
-        "begin": (DST_BEGIN_M, DST_BEGIN_DAY, DST_BEGIN_OCC, DST_BEGIN_TIME),
-            # 3 = March, 2 = last, 6 = Sunday, 3 = 03:00
-        "end": (DST_END_M, DST_END_DAY, DST_END_OCC, DST_END_TIME),   # DST end  month, day, 1=first, 2=last at 04:00.
-            # 10 = October, 2 = last, 6 = Sunday, 4 = 04:00
-        "timezone": DST_TIMEZONE,          # hours from UTC during normal (winter time)
-        "offset": 1                        # hours to be added to timezone when DST is True
-    }
-    # Iterate begin
-    if dst_rules["begin"][0] in (1,3,5,7,8,10,11):
-        days_in_month = 30
-    else:
-        days_in_month = 31   # February does not matter here
-    # Iterate months and find days matching criteria
-    for x in range(days_in_month):
-        if weekday(year,dst_rules["begin"][0],x) == dst_rules["begin"][1]:
-            if dst_rules["begin"][2] == 2:  # last day first in the list
-                match_days_begin.insert(0,x)
-            else:
-                match_days_begin.append(x)  # first day first in the list
-    dst_begin = mktime((year, dst_rules["begin"][0], match_days_begin[0], dst_rules["begin"][3], 0, 0,
-                        dst_rules["begin"][1], 0))
-    if dst_rules["end"][0] in (1,3,5,7,8,10,11):
-        days_in_month = 30
-    else:
-        days_in_month = 31   # February does not matter here
-    for x in range(days_in_month):
-        if weekday(year,dst_rules["end"][0],x) == dst_rules["end"][1]:
-            if dst_rules["end"][2] == 2:  # last day first in the list
-                match_days_end.insert(0,x)
-            else:
-                match_days_end.append(x)  # first day first in the list
-    dst_end = mktime((year, dst_rules["end"][0], match_days_end[0], dst_rules["end"][3], 0, 0,
-                        dst_rules["end"][1], 0))
-    if (mktime(localtime()) < dst_begin) or (mktime(localtime()) > dst_end):
-        return localtime(mktime(localtime()) + 3600 * dst_rules["timezone"])
-    else:
-        return localtime(mktime(localtime()) + (3600 * dst_rules["timezone"]) + (3600 * dst_rules["offset"]))
+# DST transitions are calculated once per year, date strings once per second
+tz = TIMEZONE.TimeZone(DST_TIMEZONE, (DST_BEGIN_M, DST_BEGIN_DAY, DST_BEGIN_OCC, DST_BEGIN_TIME),
+                 (DST_END_M, DST_END_DAY, DST_END_OCC, DST_END_TIME),
+                 weekdays=('Ma', 'Ti', 'Ke', 'To', 'Pe', 'La', 'Su'))
+
 
 def resolve_date():
-    (year, month, mdate, hour, minute, second, wday, yday) = resolve_dst()
-    weekdays = ['Ma', 'Ti', 'Ke', 'To', 'Pe', 'La', 'Su']
-    day = "%s.%s.%s" % (mdate, month, year)
-    hours = "%s:%s:%s" % ("{:02d}".format(hour), "{:02d}".format(minute), "{:02d}".format(second))
-    return day, hours, weekdays[wday]
+    return tz.format_date()
 
 
 class Displayme(object):